@@ -0,0 +1,112 @@
+"""
+    bench_batch_combine.py
+
+    Compares CombiningEngine (one lastname-group at a time)
+    with BatchCombiningEngine (batches of lastname-groups)
+
+    usage:
+        python benchmark/bench_batch_combine.py [num_pairs] [batch_size]
+"""
+import datetime
+import sys
+import time
+from frivenmeld.batch_combining_engine import BatchCombiningEngine
+from frivenmeld.combining_engine import CombiningEngine
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.normalizer import RecordNormalizer
+
+USERS_PER_GROUP = 4
+
+# pylint: disable=too-few-public-methods
+class CountingWriter():
+    """
+        Writer that only counts records
+        so the benchmark measures matching
+    """
+    def __init__(self):
+        self.count = 0
+
+    def add_record(self, match_record):
+        """
+            mimicks MysqlWriter.add_record()
+        """
+        self.count += 1
+
+    def add_records(self, match_records):
+        """
+            mimicks MysqlWriter.add_records()
+        """
+        self.count += len(match_records)
+
+def make_groups(num_pairs):
+    """
+        returns lastname-groups of normalized users
+        with num_pairs matching pairs in total
+    """
+    normalizer = RecordNormalizer()
+    groups = []
+    for group_number in range(num_pairs // USERS_PER_GROUP):
+        lastname = "name{}".format(group_number)
+        friven_list = []
+        mysql_list = []
+        for index in range(USERS_PER_GROUP):
+            user_id = group_number * USERS_PER_GROUP + index
+            friven_list.append(normalizer.normalize_friven_user({
+                'firstname': 'first{}'.format(index),
+                'id': user_id,
+                'last_active_date': '2017-01-{:02d}'.format(index + 1),
+                'lastname': lastname,
+                'practice_location': 'arab',
+                'specialty': 'Family Medicine',
+                'user_type_classification': 'Contributor',
+                'friendly_vendor_page': group_number // 250,
+                'friendly_vendor_row': group_number % 250}))
+            mysql_list.append(normalizer.normalize_mysql_user({
+                'classification': 'popular',
+                'firstname': 'First{}'.format(index),
+                'id': user_id,
+                'last_active_date': datetime.date(2016, 12, index + 1),
+                'lastname': lastname,
+                'location': 'Arab',
+                'specialty': 'Cardiology'}))
+        groups.append((friven_list, mysql_list))
+    return groups
+
+def run_engine(engine, groups):
+    """
+        feeds all groups to the engine and returns the seconds spent
+    """
+    start = time.perf_counter()
+    for friven_list, mysql_list in groups:
+        engine.combine(friven_user_list=friven_list, mysql_user_list=mysql_list)
+    engine.flush()
+    return time.perf_counter() - start
+
+def main(num_pairs, batch_size):
+    """
+        Runs both engines and prints pairs/sec
+    """
+    groups = make_groups(num_pairs)
+
+    writer = CountingWriter()
+    seconds = run_engine(CombiningEngine(metrics_collector=MetricsCollector(),
+                                         report_date="2017-02-02",
+                                         mysql_writer=writer),
+                         groups)
+    print("per-group engine: {} pairs in {:.2f}s ({:.0f} pairs/sec)".format(
+        writer.count, seconds, writer.count / seconds))
+
+    writer = CountingWriter()
+    seconds = run_engine(BatchCombiningEngine(metrics_collector=MetricsCollector(),
+                                              report_date="2017-02-02",
+                                              mysql_writer=writer,
+                                              batch_size=batch_size),
+                         groups)
+    print("batch engine:     {} pairs in {:.2f}s ({:.0f} pairs/sec)".format(
+        writer.count, seconds, writer.count / seconds))
+
+if __name__ == "__main__":
+    main(num_pairs=int(sys.argv[1]) if len(sys.argv) > 1 else 2000000,
+         batch_size=int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
+
+# end
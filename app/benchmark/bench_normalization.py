@@ -0,0 +1,110 @@
+"""
+    bench_normalization.py
+
+    Micro-benchmark for ingest-time normalization
+
+    Compares the per-record CPU cost of the old
+    approach (lower/strip/format on every dequeue and
+    every match) with reading the keys that
+    RecordNormalizer attaches once at ingest.
+
+    usage:
+        python benchmark/bench_normalization.py [num_records]
+"""
+import sys
+import timeit
+from frivenmeld.normalizer import RecordNormalizer
+
+def _make_users(num_records):
+    """
+        returns matching lists of friven and mysql users
+    """
+    friven_users = []
+    mysql_users = []
+    for index in range(num_records):
+        friven_users.append({'firstname': 'Kyle{}'.format(index % 500),
+                             'id': index,
+                             'last_active_date': '2017-01-05',
+                             'lastname': ' Nistler{} '.format(index % 2000),
+                             'practice_location': 'arab',
+                             'specialty': 'Family Medicine',
+                             'user_type_classification': 'Contributor'})
+        mysql_users.append({'classification': 'contributor',
+                            'firstname': 'kyle{}'.format(index % 500),
+                            'id': index,
+                            'lastname': 'Nistler{}'.format(index % 2000),
+                            'location': 'Arab',
+                            'specialty': 'family_medicine'})
+    return friven_users, mysql_users
+
+def _old_per_record(friven_users, mysql_users):
+    """
+        What the Melder and CombiningEngine used to do per record
+    """
+    def norm(value):
+        return value.lower().strip().replace('_', ' ')
+
+    for friven_user, mysql_user in zip(friven_users, mysql_users):
+        # melder: at least one lastname compare per dequeue on each side
+        _ = friven_user['lastname'].lower().strip() == mysql_user['lastname'].lower().strip()
+        # combining engine: match keys on both sides
+        _ = "{}::{}".format(friven_user['firstname'].lower().strip(),
+                            friven_user['lastname'].lower().strip())
+        _ = "{}::{}".format(mysql_user['firstname'].lower().strip(),
+                            mysql_user['lastname'].lower().strip())
+        # combining engine: three string comparisons
+        _ = norm(friven_user['practice_location']) == norm(mysql_user['location'])
+        _ = norm(friven_user['specialty']) == norm(mysql_user['specialty'])
+        _ = (norm(friven_user['user_type_classification'])
+             == norm(mysql_user['classification']))
+
+def _new_per_record(friven_users, mysql_users):
+    """
+        Same work using the keys attached at ingest
+    """
+    for friven_user, mysql_user in zip(friven_users, mysql_users):
+        _ = friven_user['sort_key'] == mysql_user['sort_key']
+        _ = friven_user['match_key']
+        _ = mysql_user['match_key']
+        _ = friven_user['location_code'] == mysql_user['location_code']
+        _ = friven_user['specialty_code'] == mysql_user['specialty_code']
+        _ = friven_user['classification_code'] == mysql_user['classification_code']
+
+def main(num_records):
+    """
+        Runs the benchmark and prints per-record timings
+    """
+    friven_users, mysql_users = _make_users(num_records)
+    normalizer = RecordNormalizer()
+
+    old_seconds = min(timeit.repeat(lambda: _old_per_record(friven_users, mysql_users),
+                                    number=1, repeat=3))
+
+    def ingest():
+        # the normalizer replaces the categorical strings,
+        # so work on copies of the raw records
+        normalized = []
+        for friven_user, mysql_user in zip(friven_users, mysql_users):
+            normalized.append((normalizer.normalize_friven_user(dict(friven_user)),
+                               normalizer.normalize_mysql_user(dict(mysql_user))))
+        return normalized
+
+    ingest_seconds = min(timeit.repeat(ingest, number=1, repeat=3))
+    friven_users, mysql_users = zip(*ingest())
+    new_seconds = min(timeit.repeat(lambda: _new_per_record(friven_users, mysql_users),
+                                    number=1, repeat=3))
+
+    def per_record(seconds):
+        return seconds / num_records * 1e6
+
+    print("records:                  {}".format(num_records))
+    print("old per-record path:      {:.3f} us/record".format(per_record(old_seconds)))
+    print("ingest normalization:     {:.3f} us/record (once)".format(per_record(ingest_seconds)))
+    print("new per-record path:      {:.3f} us/record".format(per_record(new_seconds)))
+    print("saved per downstream use: {:.3f} us/record".format(
+        per_record(old_seconds - new_seconds)))
+
+if __name__ == "__main__":
+    main(num_records=int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+
+# end
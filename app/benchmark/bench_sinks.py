@@ -0,0 +1,58 @@
+"""
+    bench_sinks.py
+
+    Compares rows/sec of the database-free sinks
+    (null and the gzip file sinks) on synthetic rows
+
+    usage:
+        python benchmark/bench_sinks.py [num_rows] [batchsize]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from frivenmeld.loggingsetup import init_logging
+from frivenmeld.sinks.file_sink import FILE_SINKS
+from frivenmeld.sinks.null_sink import NullSink
+
+def write_rows(sink, num_rows, batchsize):
+    """
+        writes num_rows synthetic match records,
+        returns the seconds it took
+    """
+    sink.init_queue(batchsize=batchsize)
+    start = time.perf_counter()
+    for index in range(num_rows):
+        sink.add_record(match_record=(index, index, 1, 0, 1, 1, 0,
+                                      '2017-02-02', '2017-01-02', '2017-01-04',
+                                      index // 1000, index % 1000))
+    sink.finish()
+    return time.perf_counter() - start
+
+def main(num_rows, batchsize):
+    """
+        writes num_rows to each sink and prints rows/sec
+    """
+    init_logging(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sinks = [("null", NullSink(), None)]
+        for name, sink_class in sorted(FILE_SINKS.items()):
+            path = os.path.join(temp_dir, "bench" + sink_class.extension)
+            sinks.append((name, sink_class(path=path), path))
+
+        for name, sink, path in sinks:
+            seconds = write_rows(sink=sink, num_rows=num_rows, batchsize=batchsize)
+            size = os.path.getsize(path) if path else 0
+            print("{:<9} {} rows in {:.2f}s ({:.0f} rows/sec) {} bytes".format(name,
+                                                                                num_rows,
+                                                                                seconds,
+                                                                                num_rows / seconds,
+                                                                                size))
+
+if __name__ == "__main__":
+    main(num_rows=int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         batchsize=int(sys.argv[2]) if len(sys.argv) > 2 else 10000)
+
+# end
@@ -0,0 +1,67 @@
+"""
+    bench_writer_modes.py
+
+    Compares rows/sec of the MysqlWriter write modes
+    against a real target table.
+
+    Writes synthetic rows for a scratch report_date
+    (9999-12-31) and deletes them afterwards.
+    You'll need to source local_env.sh first, and the
+    server needs local_infile enabled for the 'load' mode.
+
+    usage:
+        python benchmark/bench_writer_modes.py [num_rows] [batchsize]
+"""
+import logging
+import os
+import sys
+import time
+from frivenmeld.doximity.mysql_writer import MysqlWriter
+from frivenmeld.doximity.mysql_writer import WRITE_MODES
+from frivenmeld.loggingsetup import init_logging
+
+SCRATCH_REPORT_DATE = "9999-12-31"
+
+def make_writer(batchsize):
+    """
+        returns a MysqlWriter configured from the environment
+    """
+    writer = MysqlWriter(host=os.getenv("WRITE_MYSQL_HOST"),
+                         port=int(os.getenv("WRITE_MYSQL_PORT")),
+                         database=os.getenv("WRITE_MYSQL_SCHEMA"),
+                         username=os.getenv("WRITE_MYSQL_USER"),
+                         password=os.getenv("WRITE_MYSQL_PASS"))
+    writer.set_friendly_vendor_match_table(tablename=os.getenv("WRITE_MYSQL_FQ_MATCH_TABLE"))
+    writer.init_queue(batchsize=batchsize)
+    return writer
+
+def main(num_rows, batchsize):
+    """
+        writes num_rows with each mode and prints rows/sec
+    """
+    init_logging(logging.WARNING)
+
+    for write_mode in WRITE_MODES:
+        writer = make_writer(batchsize=batchsize)
+        writer.set_write_mode(write_mode=write_mode)
+        writer.remove_records_for_date(SCRATCH_REPORT_DATE)
+
+        start = time.perf_counter()
+        for index in range(num_rows):
+            writer.add_record(match_record=(index, index, 1, 0, 1, 1, 0,
+                                            SCRATCH_REPORT_DATE, '2017-01-02', '2017-01-04',
+                                            index // 1000, index % 1000))
+        writer.finish()
+        seconds = time.perf_counter() - start
+
+        print("{:<8} {} rows in {:.2f}s ({:.0f} rows/sec)".format(write_mode,
+                                                                   num_rows,
+                                                                   seconds,
+                                                                   num_rows / seconds))
+        writer.remove_records_for_date(SCRATCH_REPORT_DATE)
+
+if __name__ == "__main__":
+    main(num_rows=int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         batchsize=int(sys.argv[2]) if len(sys.argv) > 2 else 10000)
+
+# end
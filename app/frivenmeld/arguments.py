@@ -0,0 +1,622 @@
+"""
+    arguments.py
+
+    Command line arguments of the driver
+
+    The arguments are added in groups, one per feature, and
+    each group has a check for the combinations of its
+    arguments (and the others) that can not work together.
+"""
+import argparse
+import datetime
+from frivenmeld.fuzzy_combining_engine import DEFAULT_THRESHOLD
+from frivenmeld.queue_sampler import DEFAULT_SAMPLE_INTERVAL
+from frivenmeld.report_dates import parse_report_dates
+from frivenmeld.work_queue import DEFAULT_CHUNK_PAGES
+from frivenmeld.work_queue import DEFAULT_LEASE_SECONDS
+from frivenmeld.profiler import DEFAULT_STACK_INTERVAL
+from frivenmeld.profiler import PROFILE_MODES
+from frivenmeld.profiler import parse_profile_modes
+from frivenmeld.orchestrator import DEFAULT_MAX_ATTEMPTS
+from frivenmeld.orchestrator import MAX_WORKERS
+from frivenmeld.orchestrator import PARTITION_BY
+from frivenmeld.orchestrator import PARTITION_BY_PAGES
+from frivenmeld.normalizer import make_sort_key
+from frivenmeld.doximity.mysql_writer import WRITE_MODES
+from frivenmeld.doximity.mysql_writer import WRITE_MODE_INSERT
+from frivenmeld.doximity.mysql_writer import WRITE_MODE_UPSERT
+from frivenmeld.doximity.mysql_writer import DEFAULT_DELETE_CHUNKSIZE
+from frivenmeld.doximity.mysql_writer import DEFAULT_DELETE_PAUSE_SECONDS
+from frivenmeld.doximity.staging_table import PUBLISH_MODES
+from frivenmeld.doximity.staging_table import PUBLISH_EXCHANGE
+from frivenmeld.sinks.file_sink import FILE_SINKS
+from frivenmeld.sinks.null_sink import SINK_NULL
+from frivenmeld.sinks.sink import SINK_MYSQL
+
+SINKS = [SINK_MYSQL] + sorted(FILE_SINKS) + [SINK_NULL]
+
+def valid_date(date_as_string):
+    """
+        Used to validate the report_date
+        argument parsed by the argparser
+    """
+    try:
+        # don't convert date_as_string, just make sure
+        # it's in the right format
+        datetime.datetime.strptime(date_as_string, "%Y-%m-%d")
+        return date_as_string
+    except ValueError:
+        msg = "Date is not in YYYY-MM-DD format: '{0}'.".format(date_as_string)
+        raise argparse.ArgumentTypeError(msg)
+
+def valid_report_dates(report_dates_as_string):
+    """
+        Used to validate the report_dates
+        argument parsed by the argparser
+    """
+    try:
+        return parse_report_dates(report_dates_as_string)
+    except ValueError as error:
+        msg = "Report dates are not YYYY-MM-DD dates or first:last ranges: '{0}' ({1})".format(
+            report_dates_as_string, error)
+        raise argparse.ArgumentTypeError(msg)
+
+def valid_profile_modes(profile_modes_as_string):
+    """
+        Used to validate the profile_modes
+        argument parsed by the argparser
+    """
+    try:
+        return parse_profile_modes(profile_modes_as_string)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+def _add_run_arguments(parser):
+    """
+        -v, --dryrun, --timeout and the report dates
+    """
+    group = parser.add_argument_group("run")
+
+    group.add_argument('-v',
+                       action="store_true",
+                       dest="verbose",
+                       required=False,
+                       help="Debug output")
+
+    group.add_argument('--dryrun',
+                       action="store_true",
+                       dest="dry_run",
+                       required=False,
+                       help="Don't connect or write to Target MySQL server")
+
+    group.add_argument("--timeout",
+                       dest="timeout",
+                       default=20,
+                       type=int,
+                       required=False,
+                       help="Set the timeout for reading from queues. "
+                            "You can decrease this to around 2 seconds on fast networks")
+
+    # --report-dates is used instead of --report-date
+    dates = group.add_mutually_exclusive_group()
+
+    dates.add_argument("--report-date",
+                       dest="report_date",
+                       default='2017-02-02',
+                       type=valid_date,
+                       help="(YYYY-MM-DD) The date to store as "
+                            "report_date and to compare last active dates to.")
+
+    dates.add_argument("--report-dates",
+                       dest="report_dates",
+                       default=None,
+                       type=valid_report_dates,
+                       help="(YYYY-MM-DD,YYYY-MM-DD:YYYY-MM-DD) Match once and write "
+                            "records for all of these report dates (comma separated dates "
+                            "and inclusive ranges), instead of --report-date")
+
+def _add_range_arguments(parser):
+    """
+        the pages and lastnames to match
+    """
+    group = parser.add_argument_group("page and lastname range")
+
+    group.add_argument("--startpage",
+                       dest="start_page",
+                       default=1,
+                       type=int,
+                       required=False,
+                       help="Start with this page of the Friendly Vendor Users api")
+
+    group.add_argument('--endpage',
+                       dest="end_page",
+                       default=None,
+                       type=int,
+                       required=False,
+                       help="Stop after reaching this page of the Friendly Vendor Users api")
+
+    group.add_argument("--lastname-start",
+                       dest="first_lastname",
+                       default=None,
+                       type=make_sort_key,
+                       required=False,
+                       help="Only match lastnames from this one on. Without --endpage "
+                            "the pages are looked up from the lastname range")
+
+    group.add_argument("--lastname-end",
+                       dest="end_lastname",
+                       default=None,
+                       type=make_sort_key,
+                       required=False,
+                       help="Only match lastnames before this one")
+
+def _add_parallel_arguments(parser):
+    """
+        --workers, --work-queue and their settings
+    """
+    group = parser.add_argument_group("parallel runs")
+
+    group.add_argument("--workerid",
+                       dest="worker_id",
+                       default=0,
+                       required=False,
+                       type=(int),
+                       help="Worker ID to associate with records written to the Table")
+
+    # the orchestrator and the work queue both split the pages
+    split = group.add_mutually_exclusive_group()
+
+    split.add_argument("--workers",
+                       dest="workers",
+                       default=0,
+                       required=False,
+                       type=int,
+                       help="Split the pages into this many balanced partitions and run "
+                            "them in a pool of worker processes (worker ids 1-N). "
+                            "0 runs a single worker in this process")
+
+    split.add_argument("--work-queue",
+                       dest="work_queue",
+                       default=None,
+                       required=False,
+                       help="Claim small page chunks from this SQLite work queue file "
+                            "until none are left.  Start any number of drivers with "
+                            "the same file (and their own --workerid)")
+
+    group.add_argument("--partition-by",
+                       dest="partition_by",
+                       default=PARTITION_BY_PAGES,
+                       choices=PARTITION_BY,
+                       required=False,
+                       help="With --workers: split the work into page ranges, or into "
+                            "lastname ranges so no lastname is split between workers and "
+                            "each worker only reads its own slice of the Doximity users")
+
+    group.add_argument("--max-attempts",
+                       dest="max_attempts",
+                       default=DEFAULT_MAX_ATTEMPTS,
+                       required=False,
+                       type=int,
+                       help="With --workers or --work-queue: run a failed partition "
+                            "or chunk up to this many times")
+
+    group.add_argument("--chunk-pages",
+                       dest="chunk_pages",
+                       default=DEFAULT_CHUNK_PAGES,
+                       required=False,
+                       type=int,
+                       help="With --work-queue: number of pages per chunk")
+
+    group.add_argument("--lease-seconds",
+                       dest="lease_seconds",
+                       default=DEFAULT_LEASE_SECONDS,
+                       required=False,
+                       type=float,
+                       help="With --work-queue: a chunk is dispatched again if its "
+                            "worker stops renewing its lease for this long")
+
+def _add_output_arguments(parser):
+    """
+        the sink and how it writes
+    """
+    group = parser.add_argument_group("output")
+
+    group.add_argument('--sink',
+                       dest="sink",
+                       default=SINK_MYSQL,
+                       choices=SINKS,
+                       required=False,
+                       help="Where to write the matches. mysql: the target table. "
+                            "csv / jsonl / columnar: a gzip compressed file "
+                            "(see --sink-path). null: serialize, time and discard")
+
+    group.add_argument('--sink-path',
+                       dest="sink_path",
+                       default=None,
+                       required=False,
+                       help="Output file of a file sink. Defaults to "
+                            "friendly_vendor_match_<report_date>_w<workerid> "
+                            "plus the sink's extension")
+
+    group.add_argument('--output-batchsize',
+                       dest="output_batchsize",
+                       default=10000,
+                       required=False,
+                       type=int,
+                       help="Flush the writer every this many records. Inserts are split "
+                            "into statements that fit the server's max_allowed_packet")
+
+    group.add_argument('--write-mode',
+                       dest="write_mode",
+                       default=WRITE_MODE_INSERT,
+                       choices=WRITE_MODES,
+                       required=False,
+                       help="insert: multi-row INSERT statements. "
+                            "load: LOAD DATA LOCAL INFILE per batch "
+                            "(the server needs local_infile enabled). "
+                            "upsert: INSERT ... ON DUPLICATE KEY UPDATE, "
+                            "so reruns do not need --delete-existing")
+
+    group.add_argument('--writer-in-flight',
+                       dest="writer_in_flight",
+                       default=2,
+                       required=False,
+                       type=int,
+                       help="Write batches on a background thread with up to this many "
+                            "full batches waiting. 0 writes on the main thread")
+
+    group.add_argument('--writer-connections',
+                       dest="writer_connections",
+                       default=1,
+                       required=False,
+                       type=int,
+                       help="With --writer-in-flight: write this many batches at the same "
+                            "time, each on its own thread and connection")
+
+def _add_replace_arguments(parser):
+    """
+        how records of previous or interrupted runs are replaced
+    """
+    group = parser.add_argument_group("replacing records")
+
+    group.add_argument("--delete-existing",
+                       dest="delete_existing",
+                       default=False,
+                       action="store_true",
+                       help="Delete all records for the report_date for "
+                            "this worker from the target table before loading")
+
+    group.add_argument("--cleanup-stale",
+                       dest="cleanup_stale",
+                       default=False,
+                       action="store_true",
+                       help="With --write-mode upsert: after the run, delete (in chunks) "
+                            "the records for the report_date and this worker "
+                            "that this run did not write")
+
+    group.add_argument("--delete-chunksize",
+                       dest="delete_chunksize",
+                       default=DEFAULT_DELETE_CHUNKSIZE,
+                       type=int,
+                       required=False,
+                       help="Delete existing, stale or resumed records in primary key "
+                            "order, this many rows per statement")
+
+    group.add_argument("--delete-pause",
+                       dest="delete_pause",
+                       default=DEFAULT_DELETE_PAUSE_SECONDS,
+                       type=float,
+                       required=False,
+                       help="Seconds to sleep between delete chunks, to limit lock "
+                            "contention and replication lag")
+
+    group.add_argument("--staging",
+                       dest="staging",
+                       default=None,
+                       choices=PUBLISH_MODES,
+                       required=False,
+                       help="Write into a staging table for this run and publish it when "
+                            "the run is complete. exchange: swap it with the target's "
+                            "partition p<YYYYMMDD> in one step (worker 0 only). copy: "
+                            "slow fallback for unpartitioned targets, deletes this "
+                            "worker's report_date rows and copies the staging rows in "
+                            "throttled chunks (see --delete-chunksize)")
+
+    group.add_argument("--staging-drop-indexes",
+                       dest="staging_drop_indexes",
+                       default=False,
+                       action="store_true",
+                       help="With --staging: load without secondary indexes and "
+                            "build them once before publishing")
+
+    group.add_argument("--checkpoint-dir",
+                       dest="checkpoint_dir",
+                       default=None,
+                       required=False,
+                       help="Save the last fully written Friendly Vendor page for this "
+                            "report_date and worker in this directory after every batch")
+
+    group.add_argument("--resume",
+                       dest="resume",
+                       default=False,
+                       action="store_true",
+                       help="With --checkpoint-dir: continue an interrupted run after its "
+                            "last fully written page, removing the rows it wrote past it")
+
+def _add_matching_arguments(parser):
+    """
+        the combining engine and the vendors
+    """
+    group = parser.add_argument_group("matching")
+
+    group.add_argument('--combine-batchsize',
+                       dest="combine_batchsize",
+                       default=0,
+                       required=False,
+                       type=int,
+                       help="Match lastname-groups in batches of this many "
+                            "Friendly Vendor users (a few thousand is fastest). "
+                            "0 matches one group at a time")
+
+    group.add_argument('--fuzzy-match',
+                       dest="fuzzy_match",
+                       default=False,
+                       action="store_true",
+                       help="Pair the users of a lastname-group by blocking keys and "
+                            "firstname similarity instead of exact firstnames "
+                            "(lastnames still have to match exactly)")
+
+    group.add_argument('--fuzzy-threshold',
+                       dest="fuzzy_threshold",
+                       default=DEFAULT_THRESHOLD,
+                       required=False,
+                       type=float,
+                       help="Minimum firstname similarity (0.0 - 1.0) for --fuzzy-match")
+
+    group.add_argument('--incremental-state',
+                       dest="incremental_state",
+                       default=None,
+                       required=False,
+                       help="Keep the fingerprint of every lastname-group in this SQLite "
+                            "file and copy the records of groups that did not change "
+                            "since the previous run from its report_date")
+
+    group.add_argument('--vendors-file',
+                       dest="vendors_file",
+                       default=None,
+                       required=False,
+                       help="JSON list of other vendors shaped like Friendly Vendor "
+                            "(name, api_url, table and optionally their own matcher "
+                            "settings) to match against the same Doximity scan")
+
+def _add_metrics_arguments(parser):
+    """
+        metrics and profiling
+    """
+    group = parser.add_argument_group("metrics and profiling")
+
+    group.add_argument('--metrics-report',
+                       dest="metrics_report",
+                       default=None,
+                       required=False,
+                       help="Write the throughput, latency percentiles and queue "
+                            "blocked time of every stage to this JSON file")
+
+    group.add_argument('--metrics-prometheus',
+                       dest="metrics_prometheus",
+                       default=None,
+                       required=False,
+                       help="Write the same metrics to this file in the Prometheus "
+                            "text format, labeled with the worker id, page range "
+                            "and report date")
+
+    group.add_argument('--queue-sample-interval',
+                       dest="queue_sample_interval",
+                       default=DEFAULT_SAMPLE_INTERVAL,
+                       required=False,
+                       type=float,
+                       help="Record the depth, blocked time and memory of the loader "
+                            "and writer queues every this many seconds. 0 turns it off")
+
+    group.add_argument('--profile',
+                       dest="profile",
+                       default=None,
+                       required=False,
+                       help="Profile the run and write per-thread profiles, the top "
+                            "allocation sites, sampled stacks and a summary.txt to "
+                            "this directory")
+
+    group.add_argument('--profile-modes',
+                       dest="profile_modes",
+                       default=PROFILE_MODES,
+                       required=False,
+                       type=valid_profile_modes,
+                       help="With --profile: comma separated {}. cpu (cProfile per "
+                            "thread) slows the run down the most".format(
+                                ",".join(PROFILE_MODES)))
+
+    group.add_argument('--profile-interval',
+                       dest="profile_interval",
+                       default=DEFAULT_STACK_INTERVAL,
+                       required=False,
+                       type=float,
+                       help="With --profile: seconds between stack samples")
+
+def _check_report_dates(results):
+    """
+        several report dates are written by one fan out sink
+    """
+    if len(results.report_dates) > 1:
+        if (results.staging or results.checkpoint_dir or results.work_queue
+                or results.incremental_state):
+            return ("--report-dates with more than one date can not be combined with "
+                    "--staging, --checkpoint-dir, --work-queue or --incremental-state")
+    return None
+
+def _check_workers(results):
+    """
+        --workers
+    """
+    if not results.workers:
+        return None
+    if results.first_lastname or results.end_lastname:
+        return "use --partition-by lastnames to split --workers by lastname"
+    if not 0 < results.workers <= MAX_WORKERS:
+        return "--workers must be between 1 and {}".format(MAX_WORKERS)
+    if results.worker_id:
+        return "--workers assigns the worker ids, do not use --workerid"
+    if results.sink_path:
+        return "--sink-path can not be combined with --workers"
+    if results.staging == PUBLISH_EXCHANGE:
+        return "--staging exchange can not be combined with --workers"
+    if results.max_attempts < 1:
+        return "--max-attempts must be at least 1"
+    return None
+
+def _check_work_queue(results):
+    """
+        --work-queue
+    """
+    if not results.work_queue:
+        return None
+    if results.checkpoint_dir or results.staging:
+        # chunks are small and rerun whole, and every
+        # chunk would publish the date's staging table
+        return "--work-queue can not be combined with --checkpoint-dir or --staging"
+    if results.sink in FILE_SINKS:
+        return "--work-queue can not be combined with a file sink"
+    if results.delete_existing or results.cleanup_stale:
+        return "--work-queue can not be combined with --delete-existing or --cleanup-stale"
+    if results.chunk_pages < 1 or results.lease_seconds <= 0 or results.max_attempts < 1:
+        return "--chunk-pages, --lease-seconds and --max-attempts must be positive"
+    return None
+
+def _check_output(results):
+    """
+        --sink and the writer settings
+    """
+    if results.sink != SINK_MYSQL:
+        if (results.delete_existing or results.cleanup_stale or results.staging
+                or results.checkpoint_dir or results.write_mode != WRITE_MODE_INSERT):
+            return ("--delete-existing, --cleanup-stale, --staging, --checkpoint-dir "
+                    "and --write-mode require --sink mysql")
+    if results.sink_path and results.sink not in FILE_SINKS:
+        return "--sink-path requires a file sink"
+    if results.writer_connections < 1:
+        return "--writer-connections must be at least 1"
+    if results.writer_connections > 1 and not results.writer_in_flight:
+        return "--writer-connections requires --writer-in-flight"
+    return None
+
+def _check_replace(results):
+    """
+        --cleanup-stale and --resume
+    """
+    if results.cleanup_stale and results.write_mode != WRITE_MODE_UPSERT:
+        return "--cleanup-stale requires --write-mode upsert"
+    if results.resume and not results.checkpoint_dir:
+        return "--resume requires --checkpoint-dir"
+    if results.resume and (results.delete_existing or results.cleanup_stale):
+        # both would remove the rows written before the checkpoint
+        return "--resume can not be combined with --delete-existing or --cleanup-stale"
+    return None
+
+def _check_staging(results):
+    """
+        --staging
+    """
+    if not results.staging:
+        if results.staging_drop_indexes:
+            return "--staging-drop-indexes requires --staging"
+        return None
+    if results.delete_existing or results.cleanup_stale or results.checkpoint_dir:
+        # publishing replaces the date's rows, and the
+        # staging table does not survive an interrupted run
+        return ("--staging can not be combined with --delete-existing, "
+                "--cleanup-stale or --checkpoint-dir")
+    if results.staging_drop_indexes and results.write_mode == WRITE_MODE_UPSERT:
+        return "--staging-drop-indexes can not be combined with --write-mode upsert"
+    if results.staging == PUBLISH_EXCHANGE and results.worker_id:
+        return "--staging exchange replaces all workers' rows, use --workerid 0"
+    return None
+
+def _check_matching(results):
+    """
+        the combining engine, --incremental-state and --vendors-file
+    """
+    if results.fuzzy_match and results.combine_batchsize:
+        return "--fuzzy-match can not be combined with --combine-batchsize"
+    if results.incremental_state:
+        if results.sink != SINK_MYSQL:
+            return "--incremental-state requires --sink mysql"
+        if results.workers or results.work_queue or results.checkpoint_dir:
+            # the state holds the groups of one whole run
+            return ("--incremental-state can not be combined with --workers, "
+                    "--work-queue or --checkpoint-dir")
+    if results.vendors_file:
+        if (results.workers or results.work_queue or results.checkpoint_dir
+                or results.staging or results.incremental_state or results.sink_path):
+            # the other vendors are read in full, and only
+            # the Friendly Vendor records are checkpointed
+            return ("--vendors-file can not be combined with --workers, --work-queue, "
+                    "--checkpoint-dir, --staging, --incremental-state or --sink-path")
+    return None
+
+def _check_metrics(results):
+    """
+        --queue-sample-interval and --profile
+    """
+    if results.queue_sample_interval < 0:
+        return "--queue-sample-interval can not be negative"
+    if results.profile:
+        if results.workers:
+            return ("--profile can not be combined with --workers, "
+                    "profile one worker with --workerid")
+        if results.profile_interval <= 0:
+            return "--profile-interval must be positive"
+    return None
+
+# each adds an argument group
+ARGUMENT_GROUPS = [_add_run_arguments,
+                   _add_range_arguments,
+                   _add_parallel_arguments,
+                   _add_output_arguments,
+                   _add_replace_arguments,
+                   _add_matching_arguments,
+                   _add_metrics_arguments]
+
+# each returns the error of an invalid
+# combination of its arguments, or None
+ARGUMENT_CHECKS = [_check_report_dates,
+                   _check_workers,
+                   _check_work_queue,
+                   _check_output,
+                   _check_replace,
+                   _check_staging,
+                   _check_matching,
+                   _check_metrics]
+
+def parse_args(argv=None):
+    """
+        Parse command line args
+    """
+    parser = argparse.ArgumentParser(description="Main Driver for Frivenmeld")
+    for add_arguments in ARGUMENT_GROUPS:
+        add_arguments(parser)
+
+    results = parser.parse_args(argv)
+
+    if results.report_dates:
+        # the users are matched for the first date
+        results.report_date = results.report_dates[0]
+    else:
+        results.report_dates = [results.report_date]
+
+    for check in ARGUMENT_CHECKS:
+        error = check(results)
+        if error:
+            parser.error(error)
+
+    return results
+
+# end
@@ -0,0 +1,163 @@
+"""
+    batch_combining_engine.py
+
+    Batched version of the CombiningEngine
+
+    The Melder still hands over one lastname-group at a time,
+    but instead of matching each group immediately, the
+    BatchCombiningEngine keeps the groups (by reference, the
+    users are not copied) and matches many groups at once:
+
+        - match keys are joined with one dictionary build and lookup
+        - last active dates are factorized: each distinct date
+          is parsed, compared to the report_date and formatted
+          once per batch, through the shared DateCache
+        - one tight loop builds the match record tuples (see
+          match_record.py): per pair, it only does dictionary
+          lookups and code comparisons, no method calls
+        - the records go to the writer in a single add_records() call
+
+    Users are dictionaries, so the loop goes row by row: one pass
+    per field over a batch of scattered dicts (column at a time)
+    costs more in cache misses than it saves.  For the same reason,
+    batches of a few thousand users are faster than huge ones
+    (see benchmark/bench_batch_combine.py).
+"""
+import itertools
+import logging
+import datetime
+from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.date_cache import DateCache
+
+# pylint: disable=too-many-instance-attributes
+class BatchCombiningEngine():
+    """
+        Drop-in replacement for CombiningEngine
+        that buffers lastname-groups and matches
+        them in batches
+
+        Call flush() when the Melder is done
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, metrics_collector, report_date, mysql_writer, batch_size,
+                 date_cache=None):
+        """
+            report_date: 2019-02-01
+            batch_size: number of friendly vendor users to buffer
+                        before matching the batch
+            date_cache: optional DateCache for report_date
+                        shared with other parts of the run
+        """
+        assert batch_size > 0
+
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._mysql_writer = mysql_writer
+        self._metrics_collector = metrics_collector
+        self._report_date = datetime.datetime.strptime(report_date, "%Y-%m-%d").date()
+        if date_cache is None:
+            date_cache = DateCache(report_date=self._report_date)
+        assert date_cache.get_report_date() == self._report_date
+        self._date_cache = date_cache
+        self._report_date_string = date_cache.format(self._report_date)
+        self._batch_size = batch_size
+        # lastname-groups as handed over by the Melder
+        self._friven_lists = []
+        self._mysql_lists = []
+        self._num_friven = 0
+
+    def combine(self, friven_user_list, mysql_user_list):
+        """
+            Buffers a lastname-group.
+            Same arguments as CombiningEngine.combine()
+        """
+        self._friven_lists.append(friven_user_list)
+        self._mysql_lists.append(mysql_user_list)
+        self._num_friven += len(friven_user_list)
+
+        if self._num_friven >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+            Matches everything that is buffered
+            and sends the records to the writer
+        """
+        if not self._friven_lists:
+            return
+
+        friven_users = list(itertools.chain.from_iterable(self._friven_lists))
+        mysql_users = list(itertools.chain.from_iterable(self._mysql_lists))
+        self._logger.debug("Batch combining %s groups: %s friven with %s mysql",
+                           len(self._friven_lists),
+                           len(friven_users),
+                           len(mysql_users))
+
+        self._friven_lists = []
+        self._mysql_lists = []
+        self._num_friven = 0
+
+        match_records = self.combine_users(friven_users=friven_users,
+                                           mysql_users=mysql_users)
+
+        for match_record in match_records[:10]:
+            self._metrics_collector.add_sample_record(match_record=match_record)
+        self._metrics_collector.increment_matches(count=len(match_records))
+        self._mysql_writer.add_records(match_records=match_records)
+
+    def combine_users(self, friven_users, mysql_users):
+        """
+            Matches two lists of users and returns a list
+            of match records ready for the writer
+        """
+        # match keys include the lastname, so many lastname-groups
+        # can be joined with a single dictionary
+        mysql_index = {mysql_user['match_key']: mysql_user for mysql_user in mysql_users}
+        assert len(mysql_index) == len(mysql_users)
+
+        date_cache = self._date_cache
+        report_date_string = self._report_date_string
+        # last active date -> (is active, formatted date)
+        mysql_dates = {}
+        friven_dates = {}
+
+        match_records = []
+        for friven_user in friven_users:
+            mysql_user = mysql_index.get(friven_user['match_key'])
+            if mysql_user is None:
+                continue
+
+            mysql_date = mysql_user['last_active_date']
+            mysql_date_info = mysql_dates.get(mysql_date)
+            if mysql_date_info is None:
+                mysql_date_info = (date_cache.is_active(mysql_date),
+                                   date_cache.format(mysql_date))
+                mysql_dates[mysql_date] = mysql_date_info
+
+            friven_date = friven_user['last_active_date']
+            friven_date_info = friven_dates.get(friven_date)
+            if friven_date_info is None:
+                parsed_date = date_cache.parse(friven_date)
+                friven_date_info = (date_cache.is_active(parsed_date),
+                                    date_cache.format(parsed_date))
+                friven_dates[friven_date] = friven_date_info
+
+            # values in MATCH_RECORD_FIELDS order
+            match_records.append((
+                mysql_user['id'],
+                friven_user['id'],
+                mysql_date_info[0],
+                friven_date_info[0],
+                int(mysql_user['classification_code'] == friven_user['classification_code']),
+                int(mysql_user['location_code'] == friven_user['location_code']),
+                int(mysql_user['specialty_code'] == friven_user['specialty_code']),
+                report_date_string,
+                mysql_date_info[1],
+                friven_date_info[1],
+                friven_user['friendly_vendor_page'],
+                friven_user['friendly_vendor_row'],
+            ))
+
+        return match_records
+
+# end
@@ -0,0 +1,107 @@
+"""
+    category_encoder.py
+
+    Dictionary encoder for low cardinality fields
+
+    Location, specialty and classification only have a handful
+    of distinct values, so instead of carrying (and comparing)
+    the strings, each normalized value is mapped to a small
+    integer code.  The same encoder is shared by both loaders,
+    so equal values from Friendly Vendor and Doximity get the
+    same code and a match flag is just an integer comparison.
+
+    Raw values are looked up in a bounded cache first, which
+    skips normalization for values we have already seen.
+    The code table itself is not bounded: the fields are
+    low cardinality by definition.
+"""
+import sys
+import threading
+
+DEFAULT_CACHE_SIZE = 10000
+
+def normalize_value(value):
+    """
+        Magic juiciness to see if values are the same.
+        lower case / underscores / strippin'
+    """
+    return sys.intern(value.lower().strip().replace('_', ' '))
+
+class CategoryEncoder():
+    """
+        Maps raw string values to integer codes
+        of their normalized value
+    """
+
+    def __init__(self, name, max_cache_size=DEFAULT_CACHE_SIZE):
+        assert max_cache_size > 0
+
+        self._name = name
+        self._max_cache_size = max_cache_size
+
+        # normalized value -> code and code -> normalized value
+        self._codes = {}
+        self._values = []
+
+        # raw value -> code
+        self._cache = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        # the cache is read without the lock (a dict lookup
+        # is atomic), but both loader threads add codes
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "CategoryEncoder(name='{}')".format(self._name)
+
+    def encode(self, raw_value):
+        """
+            returns the code for raw_value
+        """
+        code = self._cache.get(raw_value)
+        if code is not None:
+            self._hits += 1
+            return code
+
+        with self._lock:
+            self._misses += 1
+            normalized = normalize_value(raw_value)
+            code = self._codes.get(normalized)
+            if code is None:
+                code = len(self._values)
+                self._codes[normalized] = code
+                self._values.append(normalized)
+
+            if len(self._cache) >= self._max_cache_size:
+                # dicts are ordered, so this drops the oldest entry
+                del self._cache[next(iter(self._cache))]
+                self._evictions += 1
+            self._cache[raw_value] = code
+
+        return code
+
+    def decode(self, code):
+        """
+            returns the normalized value for code
+        """
+        return self._values[code]
+
+    def get_stats(self):
+        """
+            returns a dictionary of cache statistics
+            (hit counts are not locked, so they are approximate
+            when both loaders are running)
+        """
+        lookups = self._hits + self._misses
+        hit_rate = self._hits / lookups if lookups else 0.0
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(hit_rate, 4),
+                'evictions': self._evictions,
+                'cache_size': len(self._cache),
+                'distinct_values': len(self._values)}
+
+# end
@@ -0,0 +1,124 @@
+"""
+    checkpoint.py
+
+    Durable per-worker progress for resumable runs
+
+    Match records reach the writer in Friendly Vendor page order
+    (the Melder consumes the vendor queue in order and the engines
+    keep that order).  So once a batch whose last record came from
+    page N has been written, every match from pages before N is in
+    the target table, and N - 1 is the last fully written page.
+
+    The Checkpoint listens to the MysqlWriter and saves that page
+    to a small JSON file per (report_date, worker_id) after every
+    written batch.  A rerun with --resume starts the FrivenLoader
+    at the page after it (the MysqlLoader follows, because the
+    Melder starts it at the first vendor lastname).
+"""
+import json
+import logging
+import os
+from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.match_record import FIELD_INDEX
+
+PAGE_INDEX = FIELD_INDEX["_friendly_vendor_page"]
+
+class CheckpointException(Exception):
+    """
+        Raised when a checkpoint does not fit the run
+    """
+    pass
+
+class Checkpoint():
+    """
+        Last fully written vendor page for one worker
+    """
+
+    def __init__(self, checkpoint_dir, report_date, worker_id, start_page, end_page):
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._path = os.path.join(checkpoint_dir,
+                                  "frivenmeld_{}_worker{}.json".format(report_date, worker_id))
+        self._state = {'report_date': report_date,
+                       'worker_id': worker_id,
+                       'start_page': start_page,
+                       'end_page': end_page,
+                       'last_complete_page': start_page - 1,
+                       'complete': False}
+
+    def get_path(self):
+        """
+            Accessor for the checkpoint file name
+        """
+        return self._path
+
+    def load(self):
+        """
+            Reads the saved checkpoint, if any
+
+            returns True if a checkpoint was found
+            raises CheckpointException if it belongs to a different page range
+        """
+        if not os.path.exists(self._path):
+            self._logger.info("No checkpoint at %s", self._path)
+            return False
+
+        with open(self._path) as checkpoint_file:
+            saved_state = json.load(checkpoint_file)
+
+        for key in ['report_date', 'worker_id', 'start_page', 'end_page']:
+            if saved_state[key] != self._state[key]:
+                raise CheckpointException("Checkpoint {} has {}={}, this run has {}".format(
+                    self._path, key, saved_state[key], self._state[key]))
+
+        self._state = saved_state
+        self._logger.info("Loaded checkpoint %s: last complete page %s, complete: %s",
+                          self._path,
+                          self._state['last_complete_page'],
+                          self._state['complete'])
+        return True
+
+    def get_last_complete_page(self):
+        """
+            last vendor page whose matches are all written
+        """
+        return self._state['last_complete_page']
+
+    def is_complete(self):
+        """
+            True if the run finished
+        """
+        return self._state['complete']
+
+    def _save(self):
+        """
+            writes the state atomically
+        """
+        temp_path = self._path + ".tmp"
+        with open(temp_path, "w") as checkpoint_file:
+            json.dump(self._state, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_path, self._path)
+
+    def batch_written(self, match_records):
+        """
+            MysqlWriter calls this after a batch is committed
+        """
+        if not match_records:
+            return
+
+        last_complete_page = match_records[-1][PAGE_INDEX] - 1
+        if last_complete_page > self._state['last_complete_page']:
+            self._state['last_complete_page'] = last_complete_page
+            self._save()
+            self._logger.debug("Checkpoint: page %s complete", last_complete_page)
+
+    def mark_complete(self):
+        """
+            Call when the run finished and everything is written
+        """
+        self._state['complete'] = True
+        self._save()
+        self._logger.info("Checkpoint %s marked complete", self._path)
+
+# end
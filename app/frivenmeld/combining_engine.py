@@ -4,6 +4,7 @@
 import logging
 import datetime
 from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.date_cache import DateCache
 
 class CombiningEngine():
     """
@@ -13,20 +14,30 @@ class CombiningEngine():
         Gets fed data by the Melder, which calls combine()
     """
 
-    def __init__(self, metrics_collector, report_date, mysql_writer):
+    def __init__(self, metrics_collector, report_date, mysql_writer, date_cache=None):
         """
             report_date: 2019-02-01
+            date_cache: optional DateCache for report_date
+                        shared with other parts of the run
         """
         self._logger = logging.getLogger(APP_LOGNAME)
         self._mysql_writer = mysql_writer
         self._metrics_collector = metrics_collector
         self._report_date = datetime.datetime.strptime(report_date, "%Y-%m-%d").date()
+        if date_cache is None:
+            date_cache = DateCache(report_date=self._report_date)
+        assert date_cache.get_report_date() == self._report_date
+        self._date_cache = date_cache
+        self._report_date_string = date_cache.format(self._report_date)
 
     def combine(self, friven_user_list, mysql_user_list):
         """
             Takes a list of friven_users and mysql_users
             and matches them up
 
+            Users are expected to carry the keys attached
+            by RecordNormalizer (match_key, location_code, etc.)
+
             Sends matches to the writer
 
             Example friven_user_list:
@@ -84,8 +95,7 @@ class CombiningEngine():
         mysql_dict = self._build_mysql_dict(user_list=mysql_user_list)
 
         for friven_user in friven_user_list:
-            friven_user_key = self._make_match_key(firstname=friven_user['firstname'],
-                                                   lastname=friven_user['lastname'])
+            friven_user_key = friven_user['match_key']
             if friven_user_key in mysql_dict:
                 self._process_match(mysql_user=mysql_dict[friven_user_key]['mysql_user'],
                                     friven_user=friven_user)
@@ -98,6 +108,14 @@ class CombiningEngine():
                     self._logger.info("Found multi-match: %s", mysql_dict[friven_user_key])
 
 
+    def flush(self):
+        """
+            Matches are sent to the writer as soon
+            as they are found, so there is nothing
+            buffered here. See BatchCombiningEngine
+        """
+        pass
+
     def _process_match(self, mysql_user, friven_user):
         """
             We have a single mysql (Doximity) user paired
@@ -108,7 +126,7 @@ class CombiningEngine():
         """
         match_record = self._create_match_record(mysql_user=mysql_user,
                                                  friven_user=friven_user)
-        self._metrics_collector.add_sample_row(row_dict=match_record)
+        self._metrics_collector.add_sample_record(match_record=match_record)
         self._metrics_collector.increment_matches()
         self._mysql_writer.add_record(match_record=match_record)
 
@@ -116,50 +134,45 @@ class CombiningEngine():
     def _create_match_record(self, mysql_user, friven_user):
         """
             Assemble the data that will end up as a record in the target table
+
+            returns a tuple in MATCH_RECORD_FIELDS order
         """
 
+        date_cache = self._date_cache
         mysql_last_active_date = mysql_user['last_active_date']
-        friven_last_active_date = datetime.datetime.strptime(friven_user['last_active_date'],
-                                                             "%Y-%m-%d").date()
+        friven_last_active_date = date_cache.parse(friven_user['last_active_date'])
 
         # active if within 30 days
-        is_mysql_user_active = self._user_is_active(last_active_date=mysql_last_active_date)
-        is_friven_user_active = self._user_is_active(last_active_date=friven_last_active_date)
-
-        match_record = {
-            'report_date': str(self._report_date),
-            'doximity_user_id': mysql_user['id'],
-            'friendly_vendor_user_id': friven_user['id'],
-            'location_match': self._strings_are_equal(mysql_user['location'],
-                                                      friven_user['practice_location']),
-            'specialty_match': self._strings_are_equal(mysql_user['specialty'],
-                                                       friven_user['specialty']),
-            'classification_match': self._strings_are_equal(mysql_user['classification'],
-                                                            friven_user['user_type_classification']),
-            'doximity_last_active_date': str(mysql_last_active_date),
-            'friendly_vendor_last_active_date': str(friven_last_active_date),
-            'is_doximity_user_active': int(is_mysql_user_active),
-            'is_friendly_vendor_user_active': int(is_friven_user_active),
-            '_friendly_vendor_page': friven_user['friendly_vendor_page'],
-            '_friendly_vendor_row': friven_user['friendly_vendor_row'],
-        }
+        is_mysql_user_active = date_cache.is_active(mysql_last_active_date)
+        is_friven_user_active = date_cache.is_active(friven_last_active_date)
+
+        # values in MATCH_RECORD_FIELDS order (see match_record.py)
+        match_record = (
+            mysql_user['id'],
+            friven_user['id'],
+            is_mysql_user_active,
+            is_friven_user_active,
+            self._codes_are_equal(mysql_user['classification_code'],
+                                  friven_user['classification_code']),
+            self._codes_are_equal(mysql_user['location_code'],
+                                  friven_user['location_code']),
+            self._codes_are_equal(mysql_user['specialty_code'],
+                                  friven_user['specialty_code']),
+            self._report_date_string,
+            date_cache.format(mysql_last_active_date),
+            date_cache.format(friven_last_active_date),
+            friven_user['friendly_vendor_page'],
+            friven_user['friendly_vendor_row'],
+        )
         return match_record
 
 
-    def _user_is_active(self, last_active_date):
+    def _codes_are_equal(self, value1, value2):
         """
-            A user is active if the last_active_date is within 30 days
-            of the report date
+            Compares two category codes that were
+            assigned at ingest (see category_encoder.py)
         """
-        delta = self._report_date - last_active_date
-        return delta.days <= 30
-
-    def _strings_are_equal(self, value1, value2):
-        """
-            Magic juiciness to see if values are the same.
-            lower case / underscores / strippin'
-        """
-        if value1.lower().strip().replace('_', ' ') == value2.lower().strip().replace('_', ' '):
+        if value1 == value2:
             return 1
         return 0
 
@@ -176,19 +189,10 @@ class CombiningEngine():
         """
         return_dict = {}
         for user in user_list:
-            user_key = self._make_match_key(firstname=user['firstname'],
-                                            lastname=user['lastname'])
+            user_key = user['match_key']
             assert user_key not in return_dict
             return_dict[user_key] = {'mysql_user': user,
                                      'friven_matched_users': []
                                     }
         return return_dict
-
-    def _make_match_key(self, firstname, lastname):
-        """
-            returns some unique value based on
-            firstname and lastname
-            something we can use as a dict key
-        """
-        return "{}::{}".format(firstname.lower().strip(), lastname.lower().strip())
 #
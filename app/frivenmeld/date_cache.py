@@ -0,0 +1,140 @@
+"""
+    date_cache.py
+
+    Memoized date handling for the combining engines
+
+    There are only a few hundred distinct last_active_dates
+    per run, yet every match used to call strptime() on the
+    vendor date, compare both dates to the report_date and
+    format both dates back into strings.
+
+    DateCache remembers the result of each of those steps
+    in a bounded dictionary, so each distinct date is parsed,
+    evaluated and formatted once per run.
+"""
+import datetime
+
+DEFAULT_MAX_SIZE = 5000
+
+# a user is active if the last_active_date is
+# within this many days of the report date
+ACTIVE_DAYS = 30
+
+class BoundedMemo():
+    """
+        Dictionary based memo for a single argument function
+        Drops the oldest entry when max_size is reached
+    """
+
+    def __init__(self, function, max_size):
+        assert max_size > 0
+        self._function = function
+        self._max_size = max_size
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key):
+        """
+            returns function(key), computing it on a miss
+        """
+        try:
+            value = self._values[key]
+            self.hits += 1
+            return value
+        except KeyError:
+            pass
+
+        self.misses += 1
+        value = self._function(key)
+        if len(self._values) >= self._max_size:
+            # dicts are ordered, so this drops the oldest entry
+            del self._values[next(iter(self._values))]
+            self.evictions += 1
+        self._values[key] = value
+        return value
+
+
+class DateCache():
+    """
+        Parses, evaluates and formats dates
+        for a single report_date
+
+        One instance is shared by everything that
+        builds match records during a run
+    """
+
+    def __init__(self, report_date, max_size=DEFAULT_MAX_SIZE):
+        """
+            report_date: datetime.date
+        """
+        self._report_date = report_date
+        self._parse_memo = BoundedMemo(function=self._parse, max_size=max_size)
+        self._active_memo = BoundedMemo(function=self._is_active, max_size=max_size)
+        self._format_memo = BoundedMemo(function=str, max_size=max_size)
+
+    def get_report_date(self):
+        """
+            Accessor for the report_date
+        """
+        return self._report_date
+
+    @staticmethod
+    def _parse(date_string):
+        """
+            'YYYY-MM-DD' -> datetime.date
+        """
+        return datetime.datetime.strptime(date_string, "%Y-%m-%d").date()
+
+    def _is_active(self, last_active_date):
+        """
+            A user is active if the last_active_date is within 30 days
+            of the report date
+        """
+        delta = self._report_date - last_active_date
+        return int(delta.days <= ACTIVE_DAYS)
+
+    def parse(self, date_string):
+        """
+            returns the datetime.date for a 'YYYY-MM-DD' string
+        """
+        return self._parse_memo.get(date_string)
+
+    def is_active(self, last_active_date):
+        """
+            returns 1 if last_active_date (datetime.date)
+            is within ACTIVE_DAYS of the report date, else 0
+        """
+        return self._active_memo.get(last_active_date)
+
+    def format(self, value):
+        """
+            returns the 'YYYY-MM-DD' string for a datetime.date
+        """
+        return self._format_memo.get(value)
+
+    def get_stats(self):
+        """
+            returns a dictionary of cache statistics
+        """
+        memos = {'parse': self._parse_memo,
+                 'active': self._active_memo,
+                 'format': self._format_memo}
+        hits = sum(memo.hits for memo in memos.values())
+        misses = sum(memo.misses for memo in memos.values())
+        lookups = hits + misses
+        stats = {'hits': hits,
+                 'misses': misses,
+                 'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                 'evictions': sum(memo.evictions for memo in memos.values())}
+        for name, memo in memos.items():
+            stats['{}_hits'.format(name)] = memo.hits
+            stats['{}_misses'.format(name)] = memo.misses
+            stats['{}_size'.format(name)] = len(memo)
+        return stats
+
+# end
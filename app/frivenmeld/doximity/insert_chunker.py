@@ -0,0 +1,163 @@
+"""
+   insert_chunker.py
+
+   Splits a batch of match records into multi-row
+   INSERT statements that fit the server's packet limit
+
+   - rows per statement never exceed what fits in
+     max_allowed_packet (estimated from a sample of rows)
+   - the rendered statement for a given row count is cached,
+     so the interpolation template is built once, not per flush
+   - rows per statement are tuned from the observed execution
+     time: statements that finish well under target_seconds grow,
+     statements that take much longer shrink
+
+   One InsertChunker is shared by all writer connections.
+"""
+import logging
+import threading
+from frivenmeld.loggingsetup import APP_LOGNAME
+
+# MySQL 5.7 default, used until the server tells us otherwise
+DEFAULT_MAX_PACKET_BYTES = 4 * 1024 * 1024
+
+# only fill this fraction of max_allowed_packet
+PACKET_FILL_RATIO = 0.8
+
+# bytes per rendered value on top of the value itself: quotes, comma, space
+VALUE_OVERHEAD_BYTES = 4
+
+# number of rows used to estimate the rendered row size
+ROW_SIZE_SAMPLE = 20
+
+DEFAULT_INITIAL_ROWS = 1000
+DEFAULT_MIN_ROWS = 50
+DEFAULT_MAX_ROWS = 50000
+DEFAULT_TARGET_SECONDS = 0.5
+
+# number of distinct row counts to keep rendered statements for
+STATEMENT_CACHE_SIZE = 16
+
+# pylint: disable=too-many-instance-attributes
+class InsertChunker():
+    """
+        Builds and sizes multi-row INSERT statements
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 statement_prefix,
+                 row_template,
+                 statement_suffix="",
+                 initial_rows=DEFAULT_INITIAL_ROWS,
+                 min_rows=DEFAULT_MIN_ROWS,
+                 max_rows=DEFAULT_MAX_ROWS,
+                 target_seconds=DEFAULT_TARGET_SECONDS):
+        """
+            statement_prefix: INSERT INTO table (a, b, c) values
+            row_template: (%s, %s, %s)
+            statement_suffix: e.g. ON DUPLICATE KEY UPDATE ...
+        """
+        assert 0 < min_rows <= initial_rows <= max_rows
+
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._statement_prefix = statement_prefix
+        self._row_template = row_template
+        self._statement_suffix = statement_suffix
+        self._rows_per_statement = initial_rows
+        self._min_rows = min_rows
+        self._max_rows = max_rows
+        self._target_seconds = target_seconds
+        self._max_packet_bytes = DEFAULT_MAX_PACKET_BYTES
+        self._statements = {}
+        # the statement cache and the tuning are
+        # updated from several writer threads
+        self._lock = threading.Lock()
+
+    def set_max_packet_bytes(self, max_packet_bytes):
+        """
+            use the server's max_allowed_packet
+        """
+        self._max_packet_bytes = int(max_packet_bytes)
+        self._logger.info("InsertChunker max_allowed_packet is %s bytes",
+                          self._max_packet_bytes)
+
+    def get_rows_per_statement(self):
+        """
+            Accessor for the current (tuned) rows per statement
+        """
+        return self._rows_per_statement
+
+    def get_statement(self, num_rows):
+        """
+            returns the INSERT statement for num_rows rows
+        """
+        with self._lock:
+            statement = self._statements.get(num_rows)
+            if statement is None:
+                if len(self._statements) >= STATEMENT_CACHE_SIZE:
+                    # dicts are ordered, so this drops the oldest entry
+                    del self._statements[next(iter(self._statements))]
+                statement = "{}\n{}{}".format(self._statement_prefix,
+                                              ",\n".join([self._row_template] * num_rows),
+                                              self._statement_suffix)
+                self._statements[num_rows] = statement
+            return statement
+
+    def _estimate_row_bytes(self, match_records):
+        """
+            rendered size of the largest row in a sample
+        """
+        template_bytes = len(self._row_template) + 2
+        largest = 0
+        for match_record in match_records[:ROW_SIZE_SAMPLE]:
+            row_bytes = sum(len(str(value)) + VALUE_OVERHEAD_BYTES for value in match_record)
+            largest = max(largest, row_bytes)
+        return template_bytes + largest
+
+    def _get_packet_rows(self, match_records):
+        """
+            most rows that fit into one packet
+        """
+        available = (self._max_packet_bytes * PACKET_FILL_RATIO
+                     - len(self._statement_prefix)
+                     - len(self._statement_suffix))
+        return max(1, int(available // self._estimate_row_bytes(match_records)))
+
+    def chunks(self, match_records):
+        """
+            yields slices of match_records, one per statement
+        """
+        packet_rows = self._get_packet_rows(match_records)
+        start = 0
+        while start < len(match_records):
+            # rows_per_statement may change between chunks
+            num_rows = min(self._rows_per_statement, packet_rows)
+            yield match_records[start:start + num_rows]
+            start += num_rows
+
+    def record_execution(self, num_rows, seconds):
+        """
+            tune rows per statement from how long
+            a statement of num_rows took
+        """
+        with self._lock:
+            if num_rows < self._rows_per_statement:
+                # a short tail chunk says little about the full size
+                return
+
+            if seconds < self._target_seconds / 2:
+                new_rows = min(self._max_rows, self._rows_per_statement * 2)
+            elif seconds > self._target_seconds * 2:
+                new_rows = max(self._min_rows, self._rows_per_statement // 2)
+            else:
+                return
+
+            if new_rows != self._rows_per_statement:
+                self._logger.debug("InsertChunker %s rows took %.3f seconds, now using %s rows",
+                                   num_rows,
+                                   seconds,
+                                   new_rows)
+                self._rows_per_statement = new_rows
+
+# end
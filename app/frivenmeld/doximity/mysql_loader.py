@@ -8,10 +8,14 @@ import os
 import logging
 import queue
 import threading
+import time
 # pylint: disable=import-error
 import pymysql
 import pymysql.cursors
 from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.normalizer import RecordNormalizer
+from frivenmeld.timed_queue import END_OF_DATA
+from frivenmeld.timed_queue import TimedQueue
 
 class MysqlLoaderException(Exception):
     """
@@ -47,10 +51,28 @@ class MysqlLoader(threading.Thread):
         # say "flood", then mysql will skip
         # all the lastnames that come before "flood"
         self._initial_lastname = ""
+        # see set_final_lastname()
+        self._end_lastname = None
+        self._normalizer = RecordNormalizer()
+        self._metrics_collector = None
         self._logger = logging.getLogger(APP_LOGNAME)
 
         super(MysqlLoader, self).__init__()
 
+    def set_normalizer(self, normalizer):
+        """
+            Replace the default RecordNormalizer
+            so both loaders can share one instance
+        """
+        self._normalizer = normalizer
+
+    def set_metrics_collector(self, metrics_collector):
+        """
+            Report the batch query latency
+            and the loaded users
+        """
+        self._metrics_collector = metrics_collector
+
     def set_initial_lastname(self, lastname):
         """
             override the default initial
@@ -67,6 +89,16 @@ class MysqlLoader(threading.Thread):
         self._logger.info("MysqlLoader configured to start with lastname '%s'",
                           self._initial_lastname)
 
+    def set_final_lastname(self, end_lastname):
+        """
+            stop before this lastname, so a worker that
+            is responsible for a lastname range only reads
+            its own slice of the user table
+        """
+        self._end_lastname = end_lastname
+        self._logger.info("MysqlLoader configured to stop before lastname '%s'",
+                          self._end_lastname)
+
     def get_connection(self):
         """
             Connects to mysql and returns the
@@ -141,7 +173,7 @@ class MysqlLoader(threading.Thread):
         assert queue_maxsize > 0
         assert db_batch_size > 0
 
-        self._user_queue = queue.Queue(maxsize=queue_maxsize)
+        self._user_queue = TimedQueue(maxsize=queue_maxsize)
         self._batch_size = db_batch_size
         self._logger.info("MysqlLoader configured with queue size %s and DB batch size %s",
                           queue_maxsize,
@@ -220,13 +252,16 @@ class MysqlLoader(threading.Thread):
               from {user_table} as user
              inner join {user_practice_table} as user_practice
                 on user.practice_id=user_practice.id
-             where user.lastname > %s
-               or  (user.lastname = %s and user.id > %s)
+             where (user.lastname > %s
+               or  (user.lastname = %s and user.id > %s))
+               {end_condition}
              order by user.lastname, user.id
              limit {batchsize};
         """.format(user_table=self._fq_user_table,
                    user_practice_table=self._fq_user_practice_table,
+                   end_condition="and user.lastname < %s" if self._end_lastname else "",
                    batchsize=batchsize)
+        end_params = [self._end_lastname] if self._end_lastname else []
 
         current_lastname = self._initial_lastname
         current_id = 0
@@ -242,10 +277,18 @@ class MysqlLoader(threading.Thread):
                               batchsize)
 
             next_id = current_id
+            start_time = time.perf_counter()
             results = self._query_dictionary(sql,
                                              current_lastname,
                                              current_lastname,
-                                             current_id)
+                                             current_id,
+                                             *end_params)
+            if self._metrics_collector:
+                seconds = time.perf_counter() - start_time
+                self._metrics_collector.add_latency(name="mysql_batch_query", seconds=seconds)
+                self._metrics_collector.add_throughput(name="mysql_loader",
+                                                       count=len(results),
+                                                       seconds=seconds)
             if results:
                 self._logger.info("MysqlLoader selected %s records from %s to %s",
                                   len(results), results[0]['lastname'],
@@ -258,6 +301,7 @@ class MysqlLoader(threading.Thread):
                 #sys.stdout.flush()
                 current_lastname = row['lastname']
                 next_id = row['id']
+                self._normalizer.normalize_mysql_user(row)
                 self._user_queue.put(row)
 
             if next_id == current_id:
@@ -267,6 +311,9 @@ class MysqlLoader(threading.Thread):
 
             current_id = next_id
 
+        # tell the Melder there are no more users
+        self._user_queue.put(END_OF_DATA)
+
 
 if __name__ == "__main__":
     #
@@ -5,13 +5,53 @@
 """
 import os
 import logging
-import queue
+import tempfile
+import threading
+import time
 # pylint: disable=import-error
 import pymysql
 import pymysql.cursors
 from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.date_cache import ACTIVE_DAYS
+from frivenmeld.match_record import MATCH_RECORD_FIELDS
+from frivenmeld.match_record import UNIQUE_KEY
+from frivenmeld.match_record import UNIQUE_KEY_FIELDS
+from frivenmeld.doximity.insert_chunker import InsertChunker
+from frivenmeld.sinks.sink import Sink
+from frivenmeld.sinks.sink import SinkException
+from frivenmeld.doximity.staging_table import PUBLISH_EXCHANGE
+from frivenmeld.doximity.staging_table import PUBLISH_MODES
+from frivenmeld.doximity.staging_table import partition_name
+from frivenmeld.doximity.staging_table import secondary_indexes
+from frivenmeld.doximity.staging_table import staging_table_name
+
+# multi-row INSERT statements
+WRITE_MODE_INSERT = "insert"
+# LOAD DATA LOCAL INFILE from a temp file per batch
+WRITE_MODE_LOAD = "load"
+# multi-row INSERT ... ON DUPLICATE KEY UPDATE on the
+# unique(report_date, doximity_user_id, friendly_vendor_user_id) key.
+# _create_time is refreshed on every write, so it marks the
+# last run that wrote the row (see remove_stale_records())
+WRITE_MODE_UPSERT = "upsert"
+
+WRITE_MODES = [WRITE_MODE_INSERT, WRITE_MODE_LOAD, WRITE_MODE_UPSERT]
+
+DEFAULT_DELETE_CHUNKSIZE = 5000
+DEFAULT_DELETE_PAUSE_SECONDS = 0.0
+
+def format_load_value(value):
+    """
+        Renders a value for MySQL's default
+        LOAD DATA format (tab separated, backslash escaped)
+    """
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n"))
 
-class MysqlWriterException(Exception):
+class MysqlWriterException(SinkException):
     """
         Exception to raise when things go South
     """
@@ -19,16 +59,20 @@ class MysqlWriterException(Exception):
 
 # pylint: disable=too-many-instance-attributes
 # pylint: disable=too-many-arguments
-class MysqlWriter():
+class MysqlWriter(Sink):
     """
         Writes records to friendly_vendor_match table
     """
+
+    exception_class = MysqlWriterException
+
     def __init__(self,
                  host,
                  port,
                  database,
                  username,
                  password):
+        super(MysqlWriter, self).__init__()
 
         self._host = host
         self._port = port
@@ -36,43 +80,30 @@ class MysqlWriter():
         self._username = username
         self._password = password
 
-        self._write_queue = None
-        self._worker_id = 0
         self._fq_friendly_vendor_match = "friendly_vendor_match"
 
         self._dry_run = False
+        self._write_mode = WRITE_MODE_INSERT
 
-        self._logger = logging.getLogger(APP_LOGNAME)
+        # see set_delete_throttle()
+        self._delete_chunksize = DEFAULT_DELETE_CHUNKSIZE
+        self._delete_pause_seconds = DEFAULT_DELETE_PAUSE_SECONDS
 
-        self._fields = [
-            "doximity_user_id",
-            "friendly_vendor_user_id",
-            "is_doximity_user_active",
-            "is_friendly_vendor_user_active",
-            "classification_match",
-            "location_match",
-            "specialty_match",
-            "report_date",
-            "doximity_last_active_date",
-            "friendly_vendor_last_active_date",
-            "_worker_id",
-            "_friendly_vendor_page",
-            "_friendly_vendor_row",
-        ]
+        # set by start_staging()
+        self._target_table = None
+        self._publish_mode = None
+        self._dropped_indexes = []
 
+        # built on the first insert, see _get_insert_chunker()
+        self._insert_chunker = None
+        self._insert_chunker_lock = threading.Lock()
+        self._max_packet_checked = False
 
-    def set_worker_id(self, worker_id):
-        """
-            set the worker ID associated
-            with records created
+        # match records are tuples in MATCH_RECORD_FIELDS order.
+        # _worker_id is the same for every row, so it is
+        # written as a literal in the values template
+        self._fields = list(MATCH_RECORD_FIELDS) + ["_worker_id"]
 
-            use worker_id = 0 (default)
-            if you are not using multiple workers
-        """
-
-        self._worker_id = int(worker_id)
-
-        self._logger.info("MysqlWriter _worker_id set to %s", self._worker_id)
 
     def set_friendly_vendor_match_table(self, tablename):
         """
@@ -86,6 +117,14 @@ class MysqlWriter():
         """
         self._dry_run = is_dry_run
 
+    def set_write_mode(self, write_mode):
+        """
+            choose how batches are written (one of WRITE_MODES)
+        """
+        assert write_mode in WRITE_MODES
+        self._write_mode = write_mode
+        self._logger.info("MysqlWriter write mode set to '%s'", self._write_mode)
+
     def _get_connection(self):
         """
             Connects to mysql and returns the
@@ -99,6 +138,7 @@ class MysqlWriter():
                                          password=self._password,
                                          db=self._database,
                                          charset='utf8mb4',
+                                         local_infile=self._write_mode == WRITE_MODE_LOAD,
                                          cursorclass=pymysql.cursors.DictCursor)
 
             return connection
@@ -107,16 +147,21 @@ class MysqlWriter():
             self._logger.error(error)
             raise MysqlWriterException(error)
 
-    def init_queue(self, batchsize):
+    def set_delete_throttle(self, chunksize, pause_seconds):
         """
-            Instantiates the queue,
-            setting the maxsize to batchsize
+            Deletes run in primary key order, chunksize
+            rows per statement, sleeping pause_seconds
+            between statements so concurrent inserts
+            (and replicas) can keep up
         """
-        assert batchsize > 0
+        assert chunksize > 0
+        assert pause_seconds >= 0
 
-        self._write_queue = queue.Queue(maxsize=batchsize)
-        self._logger.info("MysqlWriter configured with queue size %s",
-                          batchsize)
+        self._delete_chunksize = chunksize
+        self._delete_pause_seconds = pause_seconds
+        self._logger.info("MysqlWriter deleting %s rows per chunk with %s second pauses",
+                          chunksize,
+                          pause_seconds)
 
     def remove_records_for_date(self, date_string):
         """
@@ -128,117 +173,665 @@ class MysqlWriter():
 
             If we don't have a worker_id
             we delete all workers' data
-        """
-        sql = """
-              delete from {friendly_vendor_match}
-               where report_date = %s
-        """.format(friendly_vendor_match=self._fq_friendly_vendor_match)
 
+            Deletes in chunks, see set_delete_throttle()
+        """
+        where_sql = "report_date = %s"
         params = [date_string]
 
         # if worker ID is greater than 0
         # we only delete our own records
         if self._worker_id:
-            sql += " and _worker_id = %s"
+            where_sql += " and _worker_id = %s"
             params.append(self._worker_id)
-        self._execute(sql=sql, param_list=params)
 
-    def add_record(self, match_record):
+        total_deleted = self._delete_in_chunks(where_sql=where_sql, params=params)
+
+        self._logger.info("MysqlWriter removed %s records for %s",
+                          total_deleted,
+                          date_string)
+        return total_deleted
+
+    def get_server_time(self):
         """
-            Add a record to the write queue
-            if the queue is full (batchsize reached)
-            then run inserts
+            returns the current_timestamp of the target server
+            (None in dry run mode)
+
+            Take this before writing, then pass it to
+            remove_stale_records() when the run is complete
         """
+        if self._dry_run:
+            return None
 
+        connection = self._get_connection()
         try:
-            self._write_queue.put(match_record, block=False)
-        except queue.Full:
-            self._logger.debug("MysqlWriter Queue is full. Running inserts.")
-            self.run_inserts()
-            # don't leave this guy out!
-            self._write_queue.put(match_record, block=False)
+            with connection.cursor() as cursor:
+                cursor.execute("select current_timestamp as server_time")
+                return cursor.fetchone()['server_time']
+        finally:
+            connection.close()
 
-    def run_inserts(self):
+    def remove_stale_records(self, date_string, written_since):
         """
-            Reads the queue completely
-            and creates a multi-insert sql statment
+            After an upsert run, remove the records for the date
+            that this run did not write (they were written before
+            written_since, see get_server_time()).
+
+            Like remove_records_for_date(), only our own
+            records if we have a worker_id, in chunks
         """
+        assert self._write_mode == WRITE_MODE_UPSERT
 
-        self._logger.info("MysqlWriter running inserts for all data in the queue.")
-        # doximity_user_id, friendly_vendor_user_id, is_doximity_user_active, etc...
-        field_list = ", ".join(self._fields)
+        if written_since is None:
+            self._logger.warning("DRY RUN - Skipping stale record cleanup")
+            return 0
 
-        # ['%s', '%s', '%s']
-        interpolation_list = ["%s" for _ in range(len(self._fields))]
+        where_sql = "report_date = %s and _create_time < %s"
+        params = [date_string, written_since]
+        if self._worker_id:
+            where_sql += " and _worker_id = %s"
+            params.append(self._worker_id)
 
-        # ( %s, %s, %s )
-        interpolation_string = "(%s)" % ", ".join(interpolation_list)
+        total_deleted = self._delete_in_chunks(where_sql=where_sql, params=params)
+
+        self._logger.info("MysqlWriter removed %s stale records for %s",
+                          total_deleted,
+                          date_string)
+        return total_deleted
+
+    def remove_records_after_page(self, date_string, page):
+        """
+            Remove the records for the date that came from
+            Friendly Vendor pages after page, e.g. the partial
+            output of an interrupted run that is being resumed
+            from a checkpoint.
+
+            Like remove_records_for_date(), only our
+            own records if we have a worker_id
+        """
+        where_sql = "report_date = %s and _friendly_vendor_page > %s"
+        params = [date_string, page]
+        if self._worker_id:
+            where_sql += " and _worker_id = %s"
+            params.append(self._worker_id)
 
-        sql = "INSERT INTO %s (%s) values \n" % (self._fq_friendly_vendor_match, field_list)
+        total_deleted = self._delete_in_chunks(where_sql=where_sql, params=params)
 
-        value_list = []
-        param_list = []
-        # build an insert statement
-        # with multiple (e.g. 100) (value1, value2) insert things
+        self._logger.info("MysqlWriter removed %s records after page %s for %s",
+                          total_deleted,
+                          page,
+                          date_string)
+        return total_deleted
+
+    def remove_records_for_pages(self, date_string, first_page, last_page):
+        """
+            Remove the records for the date that came from
+            Friendly Vendor pages first_page - last_page,
+            whichever worker wrote them, e.g. what a failed
+            attempt at a work queue chunk left behind
+        """
+        where_sql = "report_date = %s and _friendly_vendor_page between %s and %s"
+        params = [date_string, first_page, last_page]
+
+        total_deleted = self._delete_in_chunks(where_sql=where_sql, params=params)
+
+        self._logger.info("MysqlWriter removed %s records from pages %s-%s for %s",
+                          total_deleted,
+                          first_page,
+                          last_page,
+                          date_string)
+        return total_deleted
+
+    def _next_id_range(self, table, where_sql, params, after_id):
+        """
+            returns (first id, last id, number of rows) of the
+            next delete_chunksize rows of table matching where_sql
+            with friendly_vendor_match_id > after_id, None at the end
+        """
+        select_sql = """
+              select friendly_vendor_match_id
+                from {table}
+               where {where_sql}
+                 and friendly_vendor_match_id > %s
+               order by friendly_vendor_match_id
+               limit %s
+        """.format(table=table, where_sql=where_sql)
+
+        rows = self._query(select_sql, list(params) + [after_id, self._delete_chunksize])
+        if not rows:
+            return None
+        return (rows[0]['friendly_vendor_match_id'],
+                rows[-1]['friendly_vendor_match_id'],
+                len(rows))
+
+    def _delete_in_chunks(self, where_sql, params, table=None):
+        """
+            Deletes the rows matching where_sql (from table,
+            the table we write to by default) in
+            friendly_vendor_match_id order: each chunk selects
+            the next delete_chunksize ids, then deletes that id
+            range, so every statement locks few rows and no
+            transaction builds up a large undo log
+
+            returns the number of deleted rows
+        """
+        table = table or self._fq_friendly_vendor_match
+        delete_sql = """
+              delete from {friendly_vendor_match}
+               where {where_sql}
+                 and friendly_vendor_match_id between %s and %s
+        """.format(friendly_vendor_match=table,
+                   where_sql=where_sql)
+
+        last_id = 0
+        total_deleted = 0
+        while True:
+            id_range = self._next_id_range(table=table,
+                                           where_sql=where_sql,
+                                           params=params,
+                                           after_id=last_id)
+            if id_range is None:
+                break
+            first_id, last_id, num_rows = id_range
+
+            start_time = time.perf_counter()
+            deleted = self._execute(delete_sql, list(params) + [first_id, last_id])
+            seconds = time.perf_counter() - start_time
+            total_deleted += deleted
+
+            self._logger.info("MysqlWriter deleted %s rows in %.3f seconds, "
+                              "%s so far (through id %s)",
+                              deleted,
+                              seconds,
+                              total_deleted,
+                              last_id)
+            if self._metrics_collector:
+                self._metrics_collector.add_throughput(name="writer_delete",
+                                                       count=deleted,
+                                                       seconds=seconds)
+
+            if num_rows < self._delete_chunksize:
+                break
+            if self._delete_pause_seconds:
+                time.sleep(self._delete_pause_seconds)
+
+        return total_deleted
+
+    def _copy_in_chunks(self, source_table):
+        """
+            Copies the rows of source_table into the target
+            table like _delete_in_chunks() deletes: one bounded
+            friendly_vendor_match_id range per statement
+
+            returns the number of copied rows
+        """
+        field_list = ", ".join(self._fields + ["_create_time"])
+        insert_sql = """
+              insert into {target} ({field_list})
+              select {field_list}
+                from {source}
+               where friendly_vendor_match_id between %s and %s
+        """.format(target=self._target_table, field_list=field_list, source=source_table)
+
+        last_id = 0
+        total_copied = 0
         while True:
-            try:
-                match_record = self._write_queue.get(block=False)
-
-                # add worker_id
-                match_record["_worker_id"] = self._worker_id
-
-                # (%s, %s, %s)
-                value_list.append(interpolation_string)
-
-                try:
-                    # [ 3, 'john', 23 ]
-                    arg_list = [match_record[fieldname] for fieldname in self._fields]
-                    # ... '3', 'john', 23
-                    param_list.extend(arg_list)
-                except KeyError:
-                    self._logger.error("Configured Fields: %s", field_list)
-                    self._logger.error("Row being processed: %s", match_record)
-                    raise
-
-            except queue.Empty:
-                self._logger.debug("MysqlLoader queue is empty.")
+            id_range = self._next_id_range(table=source_table,
+                                           where_sql="1 = 1",
+                                           params=[],
+                                           after_id=last_id)
+            if id_range is None:
                 break
+            first_id, last_id, num_rows = id_range
+
+            start_time = time.perf_counter()
+            copied = self._execute(insert_sql, [first_id, last_id])
+            seconds = time.perf_counter() - start_time
+            total_copied += copied
+
+            self._logger.info("MysqlWriter copied %s rows in %.3f seconds, %s so far",
+                              copied,
+                              seconds,
+                              total_copied)
+            if self._metrics_collector:
+                self._metrics_collector.add_throughput(name="writer_publish_copy",
+                                                       count=copied,
+                                                       seconds=seconds)
+
+            if num_rows < self._delete_chunksize:
+                break
+            if self._delete_pause_seconds:
+                time.sleep(self._delete_pause_seconds)
+
+        return total_copied
+
+    def copy_records_from_date(self, from_date_string, date_string, doximity_user_ids):
+        """
+            Copies the from_date records of the Doximity users
+            to date_string, recomputing the activity flags for
+            date_string from the stored last active dates
+            (see IncrementalCombiningEngine)
+
+            The rows keep the page and row they were matched
+            on, and get our worker_id.  Reads from the target
+            table and writes where our batches go (the staging
+            table while staging)
+
+            returns the number of copied records
+        """
+        if not doximity_user_ids:
+            return 0
+
+        source_table = self._target_table or self._fq_friendly_vendor_match
+        values = {'doximity_user_id': "doximity_user_id",
+                  'friendly_vendor_user_id': "friendly_vendor_user_id",
+                  'is_doximity_user_active':
+                      "datediff(%s, doximity_last_active_date) <= {}".format(ACTIVE_DAYS),
+                  'is_friendly_vendor_user_active':
+                      "datediff(%s, friendly_vendor_last_active_date) <= {}".format(ACTIVE_DAYS),
+                  'report_date': "%s",
+                  '_worker_id': str(int(self._worker_id))}
+        select_list = ", ".join(values.get(field, field) for field in self._fields)
+
+        sql = """
+            insert into {friendly_vendor_match} ({field_list})
+            select {select_list}
+              from {source_table}
+             where report_date = %s
+               and doximity_user_id in ({id_list})
+        """.format(friendly_vendor_match=self._fq_friendly_vendor_match,
+                   field_list=", ".join(self._fields),
+                   select_list=select_list,
+                   source_table=source_table,
+                   id_list=", ".join("%s" for _ in doximity_user_ids))
+        if self._write_mode == WRITE_MODE_UPSERT:
+            updates = ["{0} = values({0})".format(field)
+                       for field in self._fields if field not in UNIQUE_KEY_FIELDS]
+            updates.append("_create_time = current_timestamp")
+            sql += "on duplicate key update " + ", ".join(updates)
+
+        params = [date_string, date_string, date_string, from_date_string]
+        params.extend(doximity_user_ids)
+
+        start_time = time.perf_counter()
+        copied = self._execute(sql, params)
+        seconds = time.perf_counter() - start_time
+
+        self._logger.debug("MysqlWriter copied %s records of %s users from %s in %.3f seconds",
+                           copied,
+                           len(doximity_user_ids),
+                           from_date_string,
+                           seconds)
+        if self._metrics_collector:
+            self._metrics_collector.add_throughput(name="writer_copy",
+                                                   count=copied,
+                                                   seconds=seconds)
+        return copied
+
+    def _check_partition(self, date_string):
+        """
+            raises MysqlWriterException unless the target table
+            has the report date's partition to exchange with
+        """
+        schema, _, table = self._fq_friendly_vendor_match.rpartition(".")
+        partition = partition_name(date_string)
+        rows = self._query("""
+            select partition_method, partition_description
+              from information_schema.partitions
+             where table_schema = coalesce(%s, database())
+               and table_name = %s
+               and partition_name = %s
+        """, [schema or None, table, partition])
+
+        if not rows:
+            raise MysqlWriterException(
+                "{} has no partition {}, add it before publishing with {}: alter table {} "
+                "add partition (partition {} values in ('{}')), see "
+                "schema/friendly_vendor_match.ddl.sql".format(self._fq_friendly_vendor_match,
+                                                              partition,
+                                                              PUBLISH_EXCHANGE,
+                                                              self._fq_friendly_vendor_match,
+                                                              partition,
+                                                              date_string))
+        self._logger.info("MysqlWriter will exchange partition %s (%s %s) of %s",
+                          partition,
+                          rows[0]['partition_method'],
+                          rows[0]['partition_description'],
+                          self._fq_friendly_vendor_match)
+
+    def start_staging(self, date_string, publish_mode, drop_secondary_indexes=False):
+        """
+            Write into a new staging table for this run
+            instead of the target table, until publish_staging()
+            or rollback_staging() is called.
+
+            drop_secondary_indexes: load without the secondary
+            indexes and build them once in publish_staging()
+        """
+        assert self._target_table is None
+        assert publish_mode in PUBLISH_MODES
+        # upserts need the unique key while loading
+        assert not (drop_secondary_indexes and self._write_mode == WRITE_MODE_UPSERT)
+        # an exchanged partition holds every worker's rows
+        assert not (publish_mode == PUBLISH_EXCHANGE and self._worker_id)
+
+        if publish_mode == PUBLISH_EXCHANGE and not self._dry_run:
+            # fail now, not after loading the staging table
+            self._check_partition(date_string=date_string)
+
+        self._target_table = self._fq_friendly_vendor_match
+        self._publish_mode = publish_mode
+        staging_table = staging_table_name(target_table=self._target_table,
+                                           date_string=date_string,
+                                           worker_id=self._worker_id,
+                                           run_id=int(time.time()))
+
+        self._execute("create table {} like {}".format(staging_table, self._target_table))
+        if publish_mode == PUBLISH_EXCHANGE:
+            # only a non-partitioned table can be exchanged
+            # with a partition of the target
+            self._execute("alter table {} remove partitioning".format(staging_table))
+        else:
+            self._logger.warning("MysqlWriter will publish %s by copying rows (slow path, "
+                                 "not atomic). Partition %s by report_date and use "
+                                 "exchange to publish in one step.",
+                                 staging_table,
+                                 self._target_table)
+
+        if drop_secondary_indexes:
+            self._dropped_indexes = secondary_indexes(
+                self._query("show index from {}".format(staging_table)))
+            if self._dropped_indexes:
+                self._execute("alter table {} {}".format(
+                    staging_table,
+                    ", ".join("drop index `{}`".format(name)
+                              for name, _ in self._dropped_indexes)))
+
+        # the table name is part of the cached insert statements
+        self._fq_friendly_vendor_match = staging_table
+        self._insert_chunker = None
+        self._logger.info("MysqlWriter writing to staging table %s (%s secondary indexes dropped)",
+                          staging_table,
+                          len(self._dropped_indexes))
+
+    def publish_staging(self, date_string):
+        """
+            Replaces the report date's records in the target table
+            (only ours if we have a worker_id) with the staging table
+            and drops the staging table.
+
+            exchange does it in one step, copy in throttled
+            chunks (see staging_table.py)
 
-        if not value_list:
-            # nothing in queue?
+            Call finish() first.
+        """
+        assert self._target_table is not None
+        assert self._writer_pool is None and not self._write_buffer
+
+        staging_table = self._fq_friendly_vendor_match
+        start_time = time.perf_counter()
+
+        if self._dropped_indexes:
+            self._execute("alter table {} {}".format(
+                staging_table,
+                ", ".join(definition for _, definition in self._dropped_indexes)))
+            self._logger.info("MysqlWriter built %s indexes on %s in %.3f seconds",
+                              len(self._dropped_indexes),
+                              staging_table,
+                              time.perf_counter() - start_time)
+
+        if self._publish_mode == PUBLISH_EXCHANGE:
+            self._execute("alter table {} exchange partition {} with table {}".format(
+                self._target_table,
+                partition_name(date_string),
+                staging_table))
+        else:
+            self._logger.info("MysqlWriter publishing %s by copying rows (slow path)",
+                              staging_table)
+            where_sql = "report_date = %s"
+            params = [date_string]
+            if self._worker_id:
+                where_sql += " and _worker_id = %s"
+                params.append(self._worker_id)
+
+            deleted = self._delete_in_chunks(where_sql=where_sql,
+                                             params=params,
+                                             table=self._target_table)
+            copied = self._copy_in_chunks(source_table=staging_table)
+            self._logger.info("MysqlWriter replaced %s records with %s for %s",
+                              deleted,
+                              copied,
+                              date_string)
+
+        self._logger.info("MysqlWriter published %s to %s using %s in %.3f seconds",
+                          staging_table,
+                          self._target_table,
+                          self._publish_mode,
+                          time.perf_counter() - start_time)
+        # after an exchange, this holds the replaced rows
+        self.rollback_staging()
+
+    def rollback_staging(self):
+        """
+            Drops the staging table and writes
+            to the target table again
+        """
+        if self._target_table is None:
             return
 
-        # (%s, %s),
-        # (%s, %s),
-        # (%s %s)
-        sql += ",\n".join(value_list)
+        self._execute("drop table if exists {}".format(self._fq_friendly_vendor_match))
+        self._logger.info("MysqlWriter dropped staging table %s", self._fq_friendly_vendor_match)
+
+        self._fq_friendly_vendor_match = self._target_table
+        self._insert_chunker = None
+        self._target_table = None
+        self._publish_mode = None
+        self._dropped_indexes = []
+
+    def _get_throughput_name(self):
+        """
+            e.g. writer_upsert
+        """
+        return "writer_{}".format(self._write_mode)
+
+    def _write_records(self, match_records):
+        """
+            Writes a batch using the configured write mode
+        """
+        if self._num_connections > 1:
+            # sorted by the unique key; the listeners
+            # still get the batch in the original order
+            match_records = sorted(match_records, key=UNIQUE_KEY)
+
+        if self._write_mode == WRITE_MODE_LOAD:
+            self._load_batch(match_records)
+        else:
+            # insert and upsert only differ in the statement suffix
+            self._insert_batch(match_records)
+
+    def _load_batch(self, match_records):
+        """
+            Writes the match records to a temp file in
+            MySQL's LOAD DATA format and bulk loads it
+            with LOAD DATA LOCAL INFILE
+        """
+        self._logger.info("MysqlWriter loading %s records.", len(match_records))
 
-        self._execute(sql, param_list)
+        # _worker_id is not in the file, it is set for every row
+        sql = """
+            LOAD DATA LOCAL INFILE %s
+            INTO TABLE {friendly_vendor_match}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+            LINES TERMINATED BY '\\n'
+            ({field_list})
+            SET _worker_id = {worker_id}
+        """.format(friendly_vendor_match=self._fq_friendly_vendor_match,
+                   field_list=", ".join(MATCH_RECORD_FIELDS),
+                   worker_id=self._worker_id)
+
+        with tempfile.NamedTemporaryFile(mode="w",
+                                         encoding="utf8",
+                                         prefix="friendly_vendor_match_",
+                                         suffix=".tsv",
+                                         delete=False) as load_file:
+            for match_record in match_records:
+                load_file.write("\t".join(map(format_load_value, match_record)))
+                load_file.write("\n")
+
+        try:
+            self._execute(sql, [load_file.name])
+        finally:
+            os.remove(load_file.name)
+
+    def _get_insert_chunker(self):
+        """
+            returns the InsertChunker for the target table,
+            creating it the first time
+        """
+        with self._insert_chunker_lock:
+            if self._insert_chunker is None:
+                self._insert_chunker = self._create_insert_chunker()
+        return self._insert_chunker
+
+    def _create_insert_chunker(self):
+        """
+            returns a new InsertChunker for the target table
+        """
+        # doximity_user_id, friendly_vendor_user_id, ..., _worker_id
+        field_list = ", ".join(self._fields)
+
+        # ( %s, %s, %s, 3 )
+        interpolation_list = ["%s" for _ in MATCH_RECORD_FIELDS]
+        interpolation_list.append(str(self._worker_id))
+        interpolation_string = "(%s)" % ", ".join(interpolation_list)
+
+        statement_prefix = "INSERT INTO %s (%s) values" % (self._fq_friendly_vendor_match,
+                                                            field_list)
+
+        statement_suffix = ""
+        if self._write_mode == WRITE_MODE_UPSERT:
+            # update everything but the unique key
+            updates = ["{0} = values({0})".format(field)
+                       for field in self._fields if field not in UNIQUE_KEY_FIELDS]
+            updates.append("_create_time = current_timestamp")
+            statement_suffix = "\non duplicate key update " + ", ".join(updates)
+
+        return InsertChunker(statement_prefix=statement_prefix,
+                             row_template=interpolation_string,
+                             statement_suffix=statement_suffix)
+
+    def _get_max_packet_bytes(self, connection):
+        """
+            returns the server's max_allowed_packet
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("select @@max_allowed_packet as max_packet")
+            return int(cursor.fetchone()['max_packet'])
+
+    def _insert_batch(self, match_records):
+        """
+            Creates multi-insert sql statments
+            for the match records and runs them
+
+            The batch is split into statements that fit
+            max_allowed_packet (see InsertChunker)
+        """
+        self._logger.info("MysqlWriter running inserts for %s records.", len(match_records))
+
+        for match_record in match_records:
+            if len(match_record) != len(MATCH_RECORD_FIELDS):
+                self._logger.error("Configured Fields: %s", self._fields)
+                self._logger.error("Row being processed: %s", match_record)
+                raise MysqlWriterException("Malformed match record")
+
+        chunker = self._get_insert_chunker()
+
+        connection = None
+        if not self._dry_run:
+            connection = self._get_connection()
+            if not self._max_packet_checked:
+                chunker.set_max_packet_bytes(self._get_max_packet_bytes(connection))
+                self._max_packet_checked = True
+
+        try:
+            for chunk in chunker.chunks(match_records):
+                # (%s, %s, 3),
+                # (%s, %s, 3),
+                # (%s %s, 3)
+                sql = chunker.get_statement(len(chunk))
+
+                # the records are already in column order
+                param_list = []
+                for match_record in chunk:
+                    param_list.extend(match_record)
+
+                start_time = time.perf_counter()
+                self._execute_on_connection(connection, sql, param_list)
+                chunker.record_execution(num_rows=len(chunk),
+                                         seconds=time.perf_counter() - start_time)
+        finally:
+            if connection:
+                connection.close()
 
     def _execute(self, sql, param_list=None):
         """
             Utility method
             to execute DML
+
+            returns the number of affected rows
+        """
+        if self._dry_run:
+            return self._execute_on_connection(None, sql, param_list)
+
+        connection = self._get_connection()
+        try:
+            return self._execute_on_connection(connection, sql, param_list)
+        finally:
+            connection.close()
+
+    def _query(self, sql, param_list=None):
+        """
+            Utility method
+            returns all rows of a query
+            ([] in dry run mode)
+        """
+        if self._dry_run:
+            self._logger.warning("DRY RUN - Skipping query")
+            return []
+
+        connection = self._get_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, param_list or [])
+                return cursor.fetchall()
+        finally:
+            connection.close()
+
+    def _execute_on_connection(self, connection, sql, param_list=None):
+        """
+            Executes and commits DML
+            on an open connection
+
+            returns the number of affected rows
         """
         if not param_list:
             param_list = []
 
         if self._dry_run:
             self._logger.warning("DRY RUN - Skipping actual inserts")
-            return
+            return 0
 
-        connection = self._get_connection()
         try:
             with connection.cursor() as cursor:
-                cursor.execute(sql, param_list)
+                affected_rows = cursor.execute(sql, param_list)
                 cursor.execute("commit")
+                return affected_rows
 
         except pymysql.err.InternalError as error:
             self._logger.error("SQL ERROR: %s", error)
             self._logger.error("Truncated SQL (2000 chars): %s", sql[:2000])
             raise MysqlWriterException(error)
-        finally:
-            connection.close()
 
 
 if __name__ == "__main__":
@@ -270,24 +863,25 @@ if __name__ == "__main__":
         dox_id = x
         friven_id = x
 
-        test_match_record = {
-            'report_date': '2017-05-02',
-            'doximity_user_id': dox_id,
-            'friendly_vendor_user_id': friven_id,
-            'location_match': 1,
-            'specialty_match': 0,
-            'classification_match': 1,
-            'doximity_last_active_date': '2017-01-02',
-            'friendly_vendor_last_active_date': '2017-04-04',
-            'is_doximity_user_active': 1,
-            'is_friendly_vendor_user_active': 0,
-            '_friendly_vendor_page': 18,
-            '_friendly_vendor_row': 204,
-        }
+        # in MATCH_RECORD_FIELDS order
+        test_match_record = (
+            dox_id,         # doximity_user_id
+            friven_id,      # friendly_vendor_user_id
+            1,              # is_doximity_user_active
+            0,              # is_friendly_vendor_user_active
+            1,              # classification_match
+            1,              # location_match
+            0,              # specialty_match
+            '2017-05-02',   # report_date
+            '2017-01-02',   # doximity_last_active_date
+            '2017-04-04',   # friendly_vendor_last_active_date
+            18,             # _friendly_vendor_page
+            204,            # _friendly_vendor_row
+        )
 
         test_mysql_writer.add_record(match_record=test_match_record)
 
-    test_mysql_writer.run_inserts()
+    test_mysql_writer.finish()
     print(count)
 
 # end
@@ -0,0 +1,85 @@
+"""
+   staging_table.py
+
+   Names and DDL for loading a report date into a
+   per-run staging table (see MysqlWriter.start_staging())
+
+   The staging table is created like the target table,
+   optionally without its secondary indexes, which are
+   then built once when the load is complete.  An aborted
+   run only leaves a table to drop.
+
+   Publishing with exchange swaps the staging table with
+   the report date's partition of the target: a metadata
+   change, so readers never see a partial load.  The target
+   holds every report date, so a RENAME TABLE swap of the
+   whole table is not an option.
+
+   Publishing with copy is the slow fallback for a target
+   that is not partitioned by report date: the date's rows
+   are deleted and the staging rows copied in bounded
+   primary key chunks (throttled like every delete, see
+   MysqlWriter.set_delete_throttle()).  Readers see the
+   date partially published while it runs.
+"""
+import re
+
+# alter table ... exchange partition: the target must be
+# partitioned by list columns(report_date) with one partition
+# per date named p<YYYYMMDD> (see partition_name() and
+# schema/friendly_vendor_match.ddl.sql)
+PUBLISH_EXCHANGE = "exchange"
+# chunked delete of the date's rows, then chunked
+# insert ... select of the staging rows
+PUBLISH_COPY = "copy"
+
+PUBLISH_MODES = [PUBLISH_EXCHANGE, PUBLISH_COPY]
+
+def staging_table_name(target_table, date_string, worker_id, run_id):
+    """
+        friendly_vendor_match -> friendly_vendor_match_stg_20170202_w3_1550000000
+    """
+    return "{}_stg_{}_w{}_{}".format(target_table,
+                                     date_string.replace("-", ""),
+                                     worker_id,
+                                     run_id)
+
+def partition_name(date_string):
+    """
+        2017-02-02 -> p20170202
+    """
+    return "p{}".format(date_string.replace("-", ""))
+
+def _quote_name(name):
+    """
+        backtick quotes an index or column name
+    """
+    assert re.match(r"^\w+$", name), name
+    return "`{}`".format(name)
+
+def secondary_indexes(index_rows):
+    """
+        Turns SHOW INDEX rows into
+        [(index name, "add unique key `name` (a, b)"), ...]
+        for every index but the primary key, in table order
+    """
+    indexes = {}
+    for row in index_rows:
+        if row['Key_name'] == 'PRIMARY':
+            continue
+        index = indexes.setdefault(row['Key_name'], {'unique': not int(row['Non_unique']),
+                                                     'columns': []})
+        column = _quote_name(row['Column_name'])
+        if row.get('Sub_part'):
+            column += "({})".format(int(row['Sub_part']))
+        index['columns'].append((int(row['Seq_in_index']), column))
+
+    definitions = []
+    for name, index in indexes.items():
+        columns = ", ".join(column for _, column in sorted(index['columns']))
+        definitions.append((name, "add {}key {} ({})".format("unique " if index['unique'] else "",
+                                                             _quote_name(name),
+                                                             columns)))
+    return definitions
+
+# end
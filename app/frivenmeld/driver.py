@@ -8,104 +8,47 @@
 import logging
 import datetime
 import argparse
+import json
 import os
+import socket
 from frivenmeld.loggingsetup import APP_LOGNAME
 from frivenmeld.loggingsetup import init_logging
+from frivenmeld.arguments import parse_args
 from frivenmeld.combining_engine import CombiningEngine
+from frivenmeld.batch_combining_engine import BatchCombiningEngine
+from frivenmeld.fuzzy_combining_engine import FuzzyCombiningEngine
 from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.metrics_export import write_prometheus
+from frivenmeld.queue_sampler import QueueSampler
+from frivenmeld.date_cache import DateCache
+from frivenmeld.checkpoint import Checkpoint
+from frivenmeld.group_state import GroupState
+from frivenmeld.report_dates import ReportDateFanOut
+from frivenmeld.incremental_combining_engine import IncrementalCombiningEngine
+from frivenmeld.work_queue import WorkQueue
+from frivenmeld.work_queue import WorkQueueException
+from frivenmeld.work_queue import LeaseKeeper
+from frivenmeld.work_queue import STATUS_FAILED
+from frivenmeld.profiler import Profiler
+from frivenmeld.orchestrator import Orchestrator
 from frivenmeld.melder import Melder
+from frivenmeld.fan_out_melder import FanOutMelder
+from frivenmeld.fan_out_melder import Vendor
+from frivenmeld.normalizer import RecordNormalizer
 from frivenmeld.friendly_vendor.friven_loader import FrivenLoader
+from frivenmeld.friendly_vendor.friendly_vendor_api import FriendlyVendorApi
+from frivenmeld.friendly_vendor.page_index import PageIndex
 from frivenmeld.doximity.mysql_loader import MysqlLoader
 from frivenmeld.doximity.mysql_writer import MysqlWriter
+from frivenmeld.doximity.mysql_writer import WRITE_MODE_UPSERT
+from frivenmeld.sinks.file_sink import FILE_SINKS
+from frivenmeld.sinks.null_sink import NullSink
+from frivenmeld.sinks.null_sink import SINK_NULL
+from frivenmeld.sinks.sink import SINK_MYSQL
 
 DOXIMITY_WORKING_DATA_PERCENT = 10
 FRIENDLY_WORKING_DATA_PERCENT = 10
 
-def valid_date(date_as_string):
-    """
-        Used to validate the report_date
-        argument parsed by the argparser
-    """
-    try:
-        # don't convert date_as_string, just make sure
-        # it's in the right format
-        datetime.datetime.strptime(date_as_string, "%Y-%m-%d")
-        return date_as_string
-    except ValueError:
-        msg = "Date is not in YYYY-MM-DD format: '{0}'.".format(date_as_string)
-        raise argparse.ArgumentTypeError(msg)
-
-def parse_args(argv=None):
-    """
-        Parse command line args
-    """
-    parser = argparse.ArgumentParser(description="Main Driver for Frivenmeld")
-
-    parser.add_argument('-v',
-                        action="store_true",
-                        dest="verbose",
-                        required=False,
-                        help="Debug output")
-
-    parser.add_argument('--dryrun',
-                        action="store_true",
-                        dest="dry_run",
-                        required=False,
-                        help="Don't connect or write to Target MySQL server")
-
-    parser.add_argument("--delete-existing",
-                        dest="delete_existing",
-                        default=False,
-                        action="store_true",
-                        help="Delete all records for the report_date for "
-                             "this worker from the target table before loading")
-
-    parser.add_argument("--report-date",
-                        dest="report_date",
-                        default='2017-02-02',
-                        type=valid_date,
-                        help="(YYYY-MM-DD) The date to store as "
-                             "report_date and to compare last active dates to.")
-
-    parser.add_argument("--workerid",
-                        dest="worker_id",
-                        default=0,
-                        required=False,
-                        type=(int),
-                        help="Worker ID to associate with records written to the Table")
-
-    parser.add_argument("--startpage",
-                        dest="start_page",
-                        default=1,
-                        type=int,
-                        required=False,
-                        help="Start with this page of the Friendly Vendor Users api")
-
-    parser.add_argument('--endpage',
-                        dest="end_page",
-                        default=None,
-                        type=int,
-                        required=False,
-                        help="Stop after reaching this page of the Friendly Vendor Users api")
-
-    parser.add_argument("--timeout",
-                        dest="timeout",
-                        default=20,
-                        type=int,
-                        required=False,
-                        help="Set the timeout for reading from queues. "
-                             "You can decrease this to around 2 seconds on fast networks")
-
-    parser.add_argument('--output-batchsize',
-                        dest="output_batchsize",
-                        default=10000,
-                        required=False,
-                        type=int,
-                        help="Batch inserts into this many statements")
-
-    results = parser.parse_args(argv)
-    return results
-
 def load_config():
     """
         Loads environment variables
@@ -145,7 +88,7 @@ def print_ddl():
     """
 
     create_ddl = """ create table friendly_vendor_match (
-    friendly_vendor_match_id           bigint unsigned not null auto_increment primary key,
+    friendly_vendor_match_id           bigint unsigned not null auto_increment,
     doximity_user_id                      int unsigned not null,
     friendly_vendor_user_id               int unsigned not null,
     is_doximity_user_active           tinyint unsigned not null,
@@ -160,83 +103,614 @@ def print_ddl():
     _friendly_vendor_page                  int unsigned not null,
     _friendly_vendor_row                   int unsigned not null,
     _create_time                     timestamp not null default current_timestamp,
+    primary key(friendly_vendor_match_id, report_date),
     index(report_date, _worker_id),
     unique(report_date, doximity_user_id, friendly_vendor_user_id)
+)
+partition by list columns(report_date) (
+    partition p20170202 values in ('2017-02-02')
 );
 
+-- add each report date's partition before loading it
+alter table friendly_vendor_match add partition (partition p20170203 values in ('2017-02-03'));
+
     """
     print("SQL DDL: {}".format(create_ddl))
 
 
-def main():
+def create_sink(arg_object, config, table_name=None):
     """
-        Entry point to program
+        returns the Sink selected by --sink
+
+        table_name: write to this table instead of the
+        configured WRITE_MYSQL_FQ_MATCH_TABLE (another vendor's)
     """
-    arg_object = parse_args()
+    if table_name is None:
+        table_name = config["WRITE_MYSQL_FQ_MATCH_TABLE"]
+
+    if arg_object.sink == SINK_NULL:
+        return NullSink()
+
+    if arg_object.sink in FILE_SINKS:
+        sink_class = FILE_SINKS[arg_object.sink]
+        path = arg_object.sink_path
+        if not path:
+            path = "{}_{}_w{}{}".format(table_name.split(".")[-1],
+                                        arg_object.report_date,
+                                        arg_object.worker_id,
+                                        sink_class.extension)
+        return sink_class(path=path)
 
-    if arg_object.verbose:
-        init_logging(loglevel=logging.DEBUG)
-    else:
-        init_logging(loglevel=logging.INFO)
+    mysql_writer = MysqlWriter(host=config["WRITE_MYSQL_HOST"],
+                               port=config["WRITE_MYSQL_PORT"],
+                               database=config["WRITE_MYSQL_SCHEMA"],
+                               username=config["WRITE_MYSQL_USER"],
+                               password=config["WRITE_MYSQL_PASS"])
 
-    mcollector = MetricsCollector()
+    mysql_writer.set_friendly_vendor_match_table(tablename=table_name)
+    mysql_writer.set_write_mode(write_mode=arg_object.write_mode)
+    mysql_writer.set_delete_throttle(chunksize=arg_object.delete_chunksize,
+                                     pause_seconds=arg_object.delete_pause)
 
-    config = load_config()
+    if arg_object.dry_run:
+        mysql_writer.set_dry_run(is_dry_run=arg_object.dry_run)
 
-    # Configure the FrivenLoader
-    #
-    api_url = config["FRIENDLY_VENDOR_API_URL"]
-    friven_loader = FrivenLoader(friven_api_url=api_url)
+    return mysql_writer
 
-    friven_loader.init_queue_data_percent(percent=FRIENDLY_WORKING_DATA_PERCENT)
+def load_vendors(path):
+    """
+        Loads the vendors shaped like Friendly Vendor
+        to match in the same run from a JSON file:
+
+        [{"name": "other_vendor",
+          "api_url": "http://...",
+          "table": "data_engineer.other_vendor_match",
+          "fuzzy_match": false,          (optional, these
+          "fuzzy_threshold": 0.85,        three default to
+          "combine_batchsize": 0},        the command line)
+         ...]
+
+        returns [argparse.Namespace, ...] and raises
+        an exception if a setting is missing
+    """
+    with open(path) as vendors_file:
+        vendor_list = json.load(vendors_file)
+
+    vendors = []
+    for vendor in vendor_list:
+        for item in ["name", "api_url", "table"]:
+            if not vendor.get(item):
+                raise Exception("Vendor setting {} is not configured in {}".format(item, path))
+        vendors.append(argparse.Namespace(**vendor))
+    return vendors
+
+def open_sink(arg_object, config, mcollector, table_name=None):
+    """
+        returns the Sink selected by --sink, ready to
+        take records (after removing the ones it replaces)
+    """
+    sink = create_sink(arg_object=arg_object, config=config, table_name=table_name)
+    sink.init_queue(batchsize=arg_object.output_batchsize)
+    sink.set_worker_id(worker_id=arg_object.worker_id)
+    sink.set_metrics_collector(metrics_collector=mcollector)
 
-    friven_loader.set_page_range(first_page_number=arg_object.start_page,
-                                 last_page_number=arg_object.end_page)
+    if arg_object.delete_existing:
+        for report_date in arg_object.report_dates:
+            sink.remove_records_for_date(report_date)
+    return sink
 
-    # Configure the MysqlLoader
-    #
+def create_combining_engine(arg_object, engine_settings, mcollector, sink, date_cache):
+    """
+        returns the combining engine selected by the
+        fuzzy_match and combine_batchsize settings
+        (the command line or a vendor's settings)
+    """
+    fuzzy_match = getattr(engine_settings, "fuzzy_match", arg_object.fuzzy_match)
+    combine_batchsize = getattr(engine_settings, "combine_batchsize",
+                                arg_object.combine_batchsize)
+
+    # the engine matches for the first report date
+    # and the fan out adds the records of the others
+    record_sink = sink
+    if len(arg_object.report_dates) > 1:
+        record_sink = ReportDateFanOut(sink=sink, report_dates=arg_object.report_dates)
+
+    if fuzzy_match:
+        return FuzzyCombiningEngine(metrics_collector=mcollector,
+                                    report_date=arg_object.report_date,
+                                    mysql_writer=record_sink,
+                                    threshold=getattr(engine_settings, "fuzzy_threshold",
+                                                      arg_object.fuzzy_threshold),
+                                    date_cache=date_cache)
+    if combine_batchsize:
+        return BatchCombiningEngine(metrics_collector=mcollector,
+                                    report_date=arg_object.report_date,
+                                    mysql_writer=record_sink,
+                                    batch_size=combine_batchsize,
+                                    date_cache=date_cache)
+    return CombiningEngine(metrics_collector=mcollector,
+                           report_date=arg_object.report_date,
+                           mysql_writer=record_sink,
+                           date_cache=date_cache)
+
+def set_lastname_pages(arg_object, config):
+    """
+        sets start_page / end_page to the pages
+        that hold the lastname range
+
+        returns False if no page holds it
+    """
+    page_index = PageIndex(friven_api=FriendlyVendorApi(
+        api_url=config["FRIENDLY_VENDOR_API_URL"]))
+    page_range = page_index.get_page_range(first_lastname=arg_object.first_lastname,
+                                           end_lastname=arg_object.end_lastname,
+                                           first_page=arg_object.start_page,
+                                           last_page=page_index.get_total_pages())
+    if page_range is None:
+        return False
+
+    arg_object.start_page, arg_object.end_page = page_range
+    logging.getLogger(APP_LOGNAME).info("Lastnames '%s' up to '%s' are on pages %s-%s",
+                                        arg_object.first_lastname,
+                                        arg_object.end_lastname,
+                                        arg_object.start_page,
+                                        arg_object.end_page)
+    return True
+
+def get_match_settings(arg_object, config):
+    """
+        what decides the match records of a lastname-group,
+        besides its users: an incremental run only copies
+        records that were matched the same way
+    """
+    matcher = "exact"
+    if arg_object.fuzzy_match:
+        matcher = "fuzzy:{}".format(arg_object.fuzzy_threshold)
+    return "{} {}".format(config["WRITE_MYSQL_FQ_MATCH_TABLE"], matcher)
+
+def open_checkpoint(arg_object):
+    """
+        returns the Checkpoint of the run (None without
+        --checkpoint-dir) and the page to start at: after
+        the last complete page with --resume, None if the
+        checkpoint says the run is complete
+    """
+    if not arg_object.checkpoint_dir:
+        return None, arg_object.start_page
+
+    checkpoint = Checkpoint(checkpoint_dir=arg_object.checkpoint_dir,
+                            report_date=arg_object.report_date,
+                            worker_id=arg_object.worker_id,
+                            start_page=arg_object.start_page,
+                            end_page=arg_object.end_page)
+    if arg_object.resume and checkpoint.load():
+        if checkpoint.is_complete():
+            return checkpoint, None
+        return checkpoint, checkpoint.get_last_complete_page() + 1
+    return checkpoint, arg_object.start_page
+
+def create_friven_loader(arg_object, api_url, normalizer, mcollector, queue_name,
+                         total_pages=None):
+    """
+        returns a FrivenLoader for the lastname range of the run
+        (all pages, see set_page_range() for fewer)
+    """
+    # pylint: disable=too-many-arguments
+    friven_loader = FrivenLoader(friven_api_url=api_url)
+    friven_loader.set_normalizer(normalizer=normalizer)
+    friven_loader.init_queue_data_percent(percent=FRIENDLY_WORKING_DATA_PERCENT,
+                                          total_pages=total_pages)
+    friven_loader.set_metrics_collector(metrics_collector=mcollector)
+    mcollector.register_queue(name=queue_name, timed_queue=friven_loader.get_queue())
+    if arg_object.first_lastname or arg_object.end_lastname:
+        friven_loader.set_lastname_range(first_lastname=arg_object.first_lastname,
+                                         end_lastname=arg_object.end_lastname)
+    return friven_loader
+
+def create_mysql_loader(arg_object, config, normalizer, mcollector):
+    """
+        returns a MysqlLoader for the lastname range of the run
+    """
     mysql_loader = MysqlLoader(host=config["MYSQL_HOST"],
                                port=config["MYSQL_PORT"],
                                database=config["MYSQL_SCHEMA"],
                                username=config["MYSQL_USER"],
                                password=config["MYSQL_PASS"])
+    mysql_loader.set_normalizer(normalizer=normalizer)
     mysql_loader.init_queue_data_percent(percent=DOXIMITY_WORKING_DATA_PERCENT)
+    mysql_loader.set_metrics_collector(metrics_collector=mcollector)
+    mcollector.register_queue(name="mysql_queue", timed_queue=mysql_loader.get_queue())
+    if arg_object.first_lastname:
+        mysql_loader.set_initial_lastname(lastname=arg_object.first_lastname)
+    if arg_object.end_lastname:
+        mysql_loader.set_final_lastname(end_lastname=arg_object.end_lastname)
+    return mysql_loader
+
+def create_incremental_engine(arg_object, config, combining_engine, normalizer,
+                              mcollector, sink):
+    """
+        wraps combining_engine in an IncrementalCombiningEngine
+        (--incremental-state) and returns it with its GroupState
+        and the match settings to save with it
+    """
+    # pylint: disable=too-many-arguments
+    group_state = GroupState(path=arg_object.incremental_state)
+    previous_date, previous_settings = group_state.load()
+    match_settings = get_match_settings(arg_object=arg_object, config=config)
+    if previous_settings != match_settings or previous_date == arg_object.report_date:
+        logging.getLogger(APP_LOGNAME).info("No previous run to copy from (%s, '%s'), "
+                                            "combining every group",
+                                            previous_date,
+                                            previous_settings)
+        previous_date = None
+    combining_engine = IncrementalCombiningEngine(combining_engine=combining_engine,
+                                                  group_state=group_state,
+                                                  encoders=normalizer.get_encoders(),
+                                                  metrics_collector=mcollector,
+                                                  mysql_writer=sink,
+                                                  report_date=arg_object.report_date,
+                                                  previous_report_date=previous_date)
+    return combining_engine, group_state, match_settings
+
+def create_other_vendors(arg_object, config, normalizer, mcollector, date_cache):
+    """
+        returns a Vendor (with its own loader for all pages,
+        engine and sink) for each vendor of --vendors-file,
+        and their sinks
+    """
+    vendors = []
+    sinks = []
+    for vendor_settings in load_vendors(path=arg_object.vendors_file):
+        vendor_loader = create_friven_loader(arg_object=arg_object,
+                                             api_url=vendor_settings.api_url,
+                                             normalizer=normalizer,
+                                             mcollector=mcollector,
+                                             queue_name="{}_queue".format(vendor_settings.name))
+        vendor_sink = open_sink(arg_object=arg_object,
+                                config=config,
+                                mcollector=mcollector,
+                                table_name=vendor_settings.table)
+        sinks.append(vendor_sink)
+        vendors.append(Vendor(name=vendor_settings.name,
+                              loader=vendor_loader,
+                              combining_engine=create_combining_engine(
+                                  arg_object=arg_object,
+                                  engine_settings=vendor_settings,
+                                  mcollector=mcollector,
+                                  sink=vendor_sink,
+                                  date_cache=date_cache)))
+    return vendors, sinks
+
+def create_melder(arg_object, vendors, mysql_loader, mcollector):
+    """
+        returns the Melder, or the FanOutMelder
+        if there is more than one vendor
+    """
+    if len(vendors) > 1:
+        return FanOutMelder(vendors=vendors,
+                            mysql_loader=mysql_loader,
+                            vendor_timeout=arg_object.timeout,
+                            mysql_timeout=arg_object.timeout,
+                            metrics_collector=mcollector)
+    return Melder(friven_loader=vendors[0].loader,
+                  mysql_loader=mysql_loader,
+                  combining_engine=vendors[0].combining_engine,
+                  friven_timeout=arg_object.timeout,
+                  mysql_timeout=arg_object.timeout,
+                  metrics_collector=mcollector)
+
+def open_job_sink(arg_object, config, mcollector, checkpoint, start_page):
+    """
+        returns the Friendly Vendor sink, checkpointed
+        and writing to a staging table if configured
+    """
+    # pylint: disable=too-many-arguments
+    sink = open_sink(arg_object=arg_object, config=config, mcollector=mcollector)
+    if checkpoint:
+        if start_page != arg_object.start_page:
+            # rows from the page that was in progress
+            sink.remove_records_after_page(date_string=arg_object.report_date,
+                                           page=start_page - 1)
+        sink.add_batch_listener(listener=checkpoint)
+    if arg_object.staging:
+        sink.start_staging(date_string=arg_object.report_date,
+                           publish_mode=arg_object.staging,
+                           drop_secondary_indexes=arg_object.staging_drop_indexes)
+    return sink
+
+def meld(arg_object, melder, vendors, sinks, mcollector):
+    """
+        Runs the melder, flushes the engines and sinks,
+        then publishes the staging table and removes
+        stale records (sinks[0] is Friendly Vendor's)
+    """
+    # pylint: disable=too-many-arguments
+    if arg_object.writer_in_flight:
+        for each_sink in sinks:
+            each_sink.start_background(max_in_flight=arg_object.writer_in_flight,
+                                       num_connections=arg_object.writer_connections)
+
+    # rows written before this are stale once the run is complete
+    run_start_time = None
+    if arg_object.cleanup_stale:
+        run_start_time = sinks[0].get_server_time()
+
+    queue_sampler = None
+    if arg_object.queue_sample_interval:
+        queue_sampler = QueueSampler(metrics_collector=mcollector,
+                                     interval=arg_object.queue_sample_interval)
+        queue_sampler.start()
 
-    # Configure MysqlWriter
+    # Do the work
+    try:
+        melder.meld()
+        for vendor in vendors:
+            vendor.combining_engine.flush()
+        for each_sink in sinks:
+            each_sink.finish()
+    except Exception:
+        if arg_object.staging:
+            # nothing was published, just drop the staging table
+            sinks[0].rollback_staging()
+        raise
+    finally:
+        if queue_sampler:
+            queue_sampler.stop()
+
+    if arg_object.staging:
+        sinks[0].publish_staging(date_string=arg_object.report_date)
+
+    if arg_object.cleanup_stale:
+        for each_sink in sinks:
+            for report_date in arg_object.report_dates:
+                each_sink.remove_stale_records(date_string=report_date,
+                                               written_since=run_start_time)
+
+def run_job(arg_object, config, total_pages=None):
+    """
+        Runs the meld for one worker
+        (page range, worker_id) and
+        returns its MetricsCollector
+
+        total_pages: the Friendly Vendor page count,
+                     if the caller already knows it
+    """
+    logger = logging.getLogger(APP_LOGNAME)
+    mcollector = MetricsCollector()
+
+    has_lastname_range = arg_object.first_lastname or arg_object.end_lastname
+    if has_lastname_range and not arg_object.end_page:
+        if not set_lastname_pages(arg_object=arg_object, config=config):
+            logger.info("No Friendly Vendor users in the lastname range. Nothing to do.")
+            return mcollector
+
+    # Pick up where an interrupted run stopped
     #
-    mysql_writer = MysqlWriter(host=config["WRITE_MYSQL_HOST"],
-                               port=config["WRITE_MYSQL_PORT"],
-                               database=config["WRITE_MYSQL_SCHEMA"],
-                               username=config["WRITE_MYSQL_USER"],
-                               password=config["WRITE_MYSQL_PASS"])
+    checkpoint, start_page = open_checkpoint(arg_object=arg_object)
+    if start_page is None:
+        logger.info("Checkpoint says the run is complete. Nothing to resume.")
+        return mcollector
+
+    # Both loaders share one normalizer so keys
+    # are computed once per record at ingest
+    normalizer = RecordNormalizer()
+    for name, encoder in normalizer.get_encoders().items():
+        mcollector.register_cache(name="{}_encoder".format(name), cache=encoder)
+
+    friven_loader = create_friven_loader(arg_object=arg_object,
+                                         api_url=config["FRIENDLY_VENDOR_API_URL"],
+                                         normalizer=normalizer,
+                                         mcollector=mcollector,
+                                         queue_name="friven_queue",
+                                         total_pages=total_pages)
+    friven_loader.set_page_range(first_page_number=start_page,
+                                 last_page_number=arg_object.end_page)
+    mysql_loader = create_mysql_loader(arg_object=arg_object,
+                                       config=config,
+                                       normalizer=normalizer,
+                                       mcollector=mcollector)
+
+    sink = open_job_sink(arg_object=arg_object,
+                         config=config,
+                         mcollector=mcollector,
+                         checkpoint=checkpoint,
+                         start_page=start_page)
+
+    # Configure the combining engines
+    #
+    date_cache = DateCache(report_date=datetime.datetime.strptime(arg_object.report_date,
+                                                                  "%Y-%m-%d").date())
+    mcollector.register_cache(name="date_cache", cache=date_cache)
+
+    combining_engine = create_combining_engine(arg_object=arg_object,
+                                               engine_settings=arg_object,
+                                               mcollector=mcollector,
+                                               sink=sink,
+                                               date_cache=date_cache)
+    group_state = None
+    if arg_object.incremental_state:
+        combining_engine, group_state, match_settings = create_incremental_engine(
+            arg_object=arg_object,
+            config=config,
+            combining_engine=combining_engine,
+            normalizer=normalizer,
+            mcollector=mcollector,
+            sink=sink)
+
+    vendors = [Vendor(name="friendly_vendor",
+                      loader=friven_loader,
+                      combining_engine=combining_engine)]
+    sinks = [sink]
+    if arg_object.vendors_file:
+        other_vendors, other_sinks = create_other_vendors(arg_object=arg_object,
+                                                          config=config,
+                                                          normalizer=normalizer,
+                                                          mcollector=mcollector,
+                                                          date_cache=date_cache)
+        vendors.extend(other_vendors)
+        sinks.extend(other_sinks)
+
+    meld(arg_object=arg_object,
+         melder=create_melder(arg_object=arg_object,
+                              vendors=vendors,
+                              mysql_loader=mysql_loader,
+                              mcollector=mcollector),
+         vendors=vendors,
+         sinks=sinks,
+         mcollector=mcollector)
+
+    if checkpoint:
+        checkpoint.mark_complete()
+    if group_state and not arg_object.dry_run:
+        group_state.save(report_date=arg_object.report_date, settings=match_settings)
+
+    return mcollector
+
+def run_queue_worker(arg_object, config):
+    """
+        Runs chunks from the --work-queue until none
+        are left and returns the merged MetricsCollector
+    """
+    logger = logging.getLogger(APP_LOGNAME)
+    work_queue = WorkQueue(path=arg_object.work_queue,
+                           max_attempts=arg_object.max_attempts)
+
+    # every worker adds the chunks, the queue keeps the first ones
+    page_index = PageIndex(friven_api=FriendlyVendorApi(
+        api_url=config["FRIENDLY_VENDOR_API_URL"]))
+    total_pages = page_index.get_total_pages()
+    last_page = arg_object.end_page or total_pages
+    work_queue.add_chunks(report_date=arg_object.report_date,
+                          first_page=arg_object.start_page,
+                          last_page=last_page,
+                          chunk_pages=arg_object.chunk_pages)
+
+    owner = "{}:{}:w{}".format(socket.gethostname(), os.getpid(), arg_object.worker_id)
+    mcollector = MetricsCollector()
+    while True:
+        chunk = work_queue.claim(report_date=arg_object.report_date,
+                                 owner=owner,
+                                 lease_seconds=arg_object.lease_seconds)
+        if chunk is None:
+            break
+
+        chunk_args = argparse.Namespace(**vars(arg_object))
+        chunk_args.start_page = chunk.start_page
+        chunk_args.end_page = chunk.end_page
+        # stop reading Doximity users after the chunk's last lastname
+        end_lastname = page_index.get_next_lastname(page=chunk.end_page)
+        if end_lastname is not None and (arg_object.end_lastname is None
+                                         or end_lastname < arg_object.end_lastname):
+            chunk_args.end_lastname = end_lastname
+
+        lease_keeper = LeaseKeeper(work_queue=work_queue,
+                                   chunk=chunk,
+                                   owner=owner,
+                                   lease_seconds=arg_object.lease_seconds)
+        lease_keeper.start()
+        try:
+            if (chunk.attempt > 1 and arg_object.sink == SINK_MYSQL
+                    and arg_object.write_mode != WRITE_MODE_UPSERT):
+                # whoever ran the chunk before may have written part of it
+                sink = create_sink(arg_object=arg_object, config=config)
+                sink.remove_records_for_pages(date_string=arg_object.report_date,
+                                              first_page=chunk.start_page,
+                                              last_page=chunk.end_page)
+            chunk_collector = run_job(arg_object=chunk_args,
+                                      config=config,
+                                      total_pages=total_pages)
+        # pylint: disable=broad-except
+        except Exception as error:
+            lease_keeper.stop()
+            logger.exception("Pages %s-%s failed", chunk.start_page, chunk.end_page)
+            # give it back and carry on with the next chunk: the
+            # queue fails the chunk after max_attempts and the
+            # run fails at the end (see below)
+            work_queue.release(chunk=chunk, owner=owner, error=error)
+            mcollector.observe(name="work_queue_failed_attempts", value=1)
+            continue
+        lease_keeper.stop()
+
+        if not work_queue.complete(chunk=chunk, owner=owner):
+            # the lease expired and the chunk was dispatched again:
+            # its records and metrics belong to the new owner's run
+            mcollector.observe(name="work_queue_lost_leases", value=1)
+            continue
+        mcollector.merge_state(chunk_collector.get_state())
+        mcollector.observe(name="work_queue_chunk_pages",
+                           value=chunk.end_page - chunk.start_page + 1)
+
+    progress = work_queue.get_progress(report_date=arg_object.report_date)
+    logger.info("WorkQueue progress for %s: %s", arg_object.report_date, progress)
+    if progress.get(STATUS_FAILED):
+        raise WorkQueueException("{} chunks failed {} times, see {}".format(
+            progress[STATUS_FAILED], arg_object.max_attempts, work_queue.get_path()))
+    return mcollector
+
+def get_metric_labels(arg_object):
+    """
+        labels of the metrics of this run
+    """
+    if arg_object.workers:
+        worker_id = "1-{}".format(arg_object.workers)
+    else:
+        worker_id = str(arg_object.worker_id)
+    return {'worker_id': worker_id,
+            'first_page': str(arg_object.start_page),
+            'last_page': str(arg_object.end_page or ""),
+            'report_date': ",".join(arg_object.report_dates)}
 
-    mysql_writer.set_friendly_vendor_match_table(tablename=config["WRITE_MYSQL_FQ_MATCH_TABLE"])
-    mysql_writer.init_queue(batchsize=arg_object.output_batchsize)
-    mysql_writer.set_worker_id(worker_id=arg_object.worker_id)
-    if arg_object.delete_existing:
-        mysql_writer.remove_records_for_date(arg_object.report_date)
+def run(arg_object, config):
+    """
+        runs the job in this process, on parallel
+        workers or from a work queue
 
-    if arg_object.dry_run:
-        mysql_writer.set_dry_run(is_dry_run=arg_object.dry_run)
+        returns the MetricsCollector
+    """
+    if arg_object.workers:
+        orchestrator = Orchestrator(job_function=run_job,
+                                    arg_object=arg_object,
+                                    config=config)
+        return orchestrator.run()
+    if arg_object.work_queue:
+        return run_queue_worker(arg_object=arg_object, config=config)
+    return run_job(arg_object=arg_object, config=config)
+
+def main():
+    """
+        Entry point to program
+    """
+    arg_object = parse_args()
+
+    if arg_object.verbose:
+        init_logging(loglevel=logging.DEBUG)
+    else:
+        init_logging(loglevel=logging.INFO)
 
-    combining_engine = CombiningEngine(metrics_collector=mcollector,
-                                       report_date=arg_object.report_date,
-                                       mysql_writer=mysql_writer)
+    config = load_config()
 
-    # Configure the Melder
-    #
-    melder = Melder(friven_loader=friven_loader,
-                    mysql_loader=mysql_loader,
-                    combining_engine=combining_engine,
-                    friven_timeout=arg_object.timeout,
-                    mysql_timeout=arg_object.timeout)
-    # Do the work
-    melder.meld()
-    mysql_writer.run_inserts()
+    profiler = None
+    if arg_object.profile:
+        profiler = Profiler(output_dir=arg_object.profile,
+                            modes=arg_object.profile_modes,
+                            stack_interval=arg_object.profile_interval)
+        profiler.start()
+
+    try:
+        mcollector = run(arg_object=arg_object, config=config)
+    finally:
+        # a failed run is the one to look at
+        if profiler:
+            profiler.stop()
 
     # Gather results
     mcollector.mark_end_time()
+    mcollector.set_labels(get_metric_labels(arg_object))
     mcollector.print_summary()
+    if arg_object.metrics_report:
+        mcollector.write_report(path=arg_object.metrics_report)
+    if arg_object.metrics_prometheus:
+        write_prometheus(reports=[mcollector.get_report()], path=arg_object.metrics_prometheus)
 
     # Print the DDL
     print_ddl()
@@ -0,0 +1,248 @@
+"""
+    fan_out_melder.py
+
+    Merges one Doximity user stream against the
+    user streams of several vendors (--vendors-file)
+
+    Like the Melder, but every vendor shaped like Friendly
+    Vendor (its own loader, sorted by lastname) has its own
+    combining engine, and the engines have their own sinks.
+    The MysqlLoader starts at the smallest first lastname of
+    all vendors, and each Doximity lastname-group is read once
+    and combined with the group of every vendor that has the
+    lastname.  So the Doximity user table is scanned once per
+    run, not once per vendor.
+
+    Each Doximity group is added to the backlog of every vendor,
+    and the vendors work through their backlogs with whatever
+    users are already in their queues, without waiting.  So a
+    slow vendor only holds up the scan (and the other vendors)
+    once it is max_lag_groups behind.
+
+    A vendor is done when its loader ends its queue
+    (END_OF_DATA, see timed_queue.py).  A vendor that times
+    out is only dropped if its loader is no longer running;
+    a loader that is just slow is waited for.  The meld ends
+    when all vendors or the Doximity users are done.
+"""
+import collections
+import logging
+import queue
+import time
+from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.timed_queue import EndOfData
+from frivenmeld.timed_queue import get_item
+
+DEFAULT_MAX_LAG_GROUPS = 1000
+
+# name: for logging
+# loader: a FrivenLoader (start(), stop(), is_alive(), get_queue())
+# combining_engine: gets the vendor's lastname-groups
+Vendor = collections.namedtuple("Vendor", ["name", "loader", "combining_engine"])
+
+# pylint: disable=too-few-public-methods
+class VendorState():
+    """
+        Where the merge of one vendor is
+    """
+
+    def __init__(self, vendor):
+        self.vendor = vendor
+        # the vendor's next user, None to read one
+        self.user = None
+        # the vendor's users with the lastname of backlog[0]
+        self.group = []
+        # (lastname, Doximity users) not combined yet
+        self.backlog = collections.deque()
+
+# pylint: disable=too-many-arguments
+class FanOutMelder():
+    """
+        Combines Doximity users with the users
+        of several vendors
+    """
+
+    def __init__(self,
+                 vendors,
+                 mysql_loader,
+                 vendor_timeout,
+                 mysql_timeout,
+                 metrics_collector=None,
+                 max_lag_groups=DEFAULT_MAX_LAG_GROUPS):
+        """
+            vendors: [Vendor, ...]
+            metrics_collector: optional, gets the
+                               latency of every combine
+            max_lag_groups: Doximity groups a vendor may fall
+                            behind before the scan waits for it
+        """
+        assert vendors
+        assert max_lag_groups > 0
+
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._vendors = vendors
+        self._mysql_loader = mysql_loader
+        self._vendor_timeout = vendor_timeout
+        self._mysql_timeout = mysql_timeout
+        self._metrics_collector = metrics_collector
+        self._max_lag_groups = max_lag_groups
+        # vendor index -> VendorState, for
+        # the vendors that still have users
+        self._states = {}
+
+    def _stop_vendor(self, index):
+        """
+            stops a vendor whose users are done
+        """
+        vendor = self._states.pop(index).vendor
+        self._logger.info("FanOutMelder is done with vendor %s", vendor.name)
+        vendor.loader.stop()
+
+    def _is_stalled(self, index):
+        """
+            called when the vendor timed out: True (and logged)
+            if its loader died without ending its queue
+        """
+        vendor = self._states[index].vendor
+        if vendor.loader.is_alive():
+            self._logger.warning("Vendor %s is slow, still waiting for it", vendor.name)
+            return False
+        self._logger.error("The loader of vendor %s stopped without "
+                           "finishing its users, dropping it", vendor.name)
+        return True
+
+    def _next_user(self, state, timeout):
+        """
+            returns the vendor's next user
+
+            raises queue.Empty if there is none within timeout
+            (0: do not wait) and EndOfData at the end of its users
+        """
+        if state.user is None:
+            state.user = get_item(state.vendor.loader.get_queue(), timeout=timeout)
+        return state.user
+
+    def _advance(self, index, timeout):
+        """
+            works through the vendor's backlog as far as
+            its users allow, waiting up to timeout for each
+        """
+        state = self._states[index]
+        try:
+            while state.backlog:
+                lastname, mysql_list = state.backlog[0]
+                user = self._next_user(state, timeout)
+                if user['sort_key'] <= lastname:
+                    if user['sort_key'] == lastname:
+                        state.group.append(user)
+                    state.user = None
+                    continue
+
+                # the vendor is past lastname
+                state.backlog.popleft()
+                if state.group:
+                    self._combine(index, state.group, mysql_list)
+                    state.group = []
+
+        except EndOfData:
+            if state.group:
+                self._combine(index, state.group, state.backlog[0][1])
+            self._stop_vendor(index)
+        except queue.Empty:
+            if timeout and self._is_stalled(index):
+                # like the Melder, combine what we have
+                if state.group:
+                    self._combine(index, state.group, state.backlog[0][1])
+                self._stop_vendor(index)
+
+    def _combine(self, index, vendor_list, mysql_list):
+        """
+            sends one lastname-group to the vendor's engine
+        """
+        start_time = time.perf_counter()
+        self._states[index].vendor.combining_engine.combine(friven_user_list=vendor_list,
+                                                            mysql_user_list=mysql_list)
+        if self._metrics_collector:
+            seconds = time.perf_counter() - start_time
+            self._metrics_collector.add_latency(name="combine", seconds=seconds)
+            self._metrics_collector.add_throughput(name="combine",
+                                                   count=len(vendor_list) + len(mysql_list),
+                                                   seconds=seconds)
+
+    def _start_vendors(self):
+        """
+            starts all loaders, then waits
+            for the first user of each
+        """
+        for index, vendor in enumerate(self._vendors):
+            vendor.loader.start()
+            self._states[index] = VendorState(vendor)
+
+        for index in list(self._states):
+            state = self._states[index]
+            while index in self._states and state.user is None:
+                try:
+                    self._next_user(state, timeout=self._vendor_timeout)
+                except EndOfData:
+                    self._logger.info("There is no data from vendor %s.", state.vendor.name)
+                    self._stop_vendor(index)
+                except queue.Empty:
+                    if self._is_stalled(index):
+                        self._stop_vendor(index)
+
+    def meld(self):
+        """
+            Groups the users by lastname and sends
+            each vendor's groups to its engine
+        """
+        self._logger.info("Starting FanOutMeld with %s vendors", len(self._vendors))
+
+        self._start_vendors()
+        if not self._states:
+            self._logger.info("There is no vendor data available.")
+            return
+
+        # start at the first lastname of any vendor
+        first_lastname = min(state.user['sort_key'] for state in self._states.values())
+        self._mysql_loader.set_initial_lastname(first_lastname)
+        self._mysql_loader.start()
+        mysql_queue = self._mysql_loader.get_queue()
+
+        try:
+            mysql_user = get_item(mysql_queue, timeout=self._mysql_timeout)
+        except queue.Empty:
+            self._logger.info("No Doximity data (or timed out waiting for it, "
+                              "increase mysql_timeout).")
+            mysql_user = None
+
+        while mysql_user is not None and self._states:
+            # all the Doximity users with the current lastname
+            working_lastname = mysql_user['sort_key']
+            mysql_list = []
+            try:
+                while mysql_user['sort_key'] == working_lastname:
+                    mysql_list.append(mysql_user)
+                    mysql_user = get_item(mysql_queue, timeout=self._mysql_timeout)
+            except queue.Empty:
+                self._logger.info("No more mysql data after '%s'", working_lastname)
+                mysql_user = None
+
+            for index in list(self._states):
+                state = self._states[index]
+                state.backlog.append((working_lastname, mysql_list))
+                self._advance(index, timeout=0)
+                # only a vendor that is too far behind holds up the scan
+                while index in self._states and len(state.backlog) > self._max_lag_groups:
+                    self._advance(index, timeout=self._vendor_timeout)
+
+        # no more Doximity groups, let the vendors catch up
+        while any(state.backlog for state in self._states.values()):
+            for index in list(self._states):
+                self._advance(index, timeout=self._vendor_timeout)
+
+        self._logger.info("Please wait a few seconds for things to wrap up.")
+        for index in list(self._states):
+            self._stop_vendor(index)
+        self._mysql_loader.stop()
+
+# end
@@ -8,8 +8,12 @@ import logging
 import os
 import queue
 import threading
+import time
 from frivenmeld.loggingsetup import APP_LOGNAME
 from frivenmeld.friendly_vendor.friendly_vendor_api import FriendlyVendorApi
+from frivenmeld.normalizer import RecordNormalizer
+from frivenmeld.timed_queue import END_OF_DATA
+from frivenmeld.timed_queue import TimedQueue
 
 USERS_PER_PAGE = 1000
 
@@ -27,19 +31,39 @@ class FrivenLoader(threading.Thread):
         self._thread_plunger = None
         self._page_range_start = 1
         self._page_range_end = None
+        # see set_lastname_range()
+        self._first_lastname = None
+        self._end_lastname = None
+        self._normalizer = RecordNormalizer()
+        self._metrics_collector = None
         super(FrivenLoader, self).__init__()
 
-    def _get_percentage_count(self, percent):
+    def set_normalizer(self, normalizer):
+        """
+            Replace the default RecordNormalizer
+            so both loaders can share one instance
+        """
+        self._normalizer = normalizer
+
+    def set_metrics_collector(self, metrics_collector):
+        """
+            Report the page fetch latency
+            and the loaded users
+        """
+        self._metrics_collector = metrics_collector
+
+    def _get_percentage_count(self, percent, total_pages=None):
         """
             Queries the API for the number of
-            pages and assuming USERS_PER_PAGE,
-            returns the number representing
-            PERCENT users from the entire
-            collection.
+            pages (unless given) and assuming
+            USERS_PER_PAGE, returns the number
+            representing PERCENT users from the
+            entire collection.
         """
         assert 1 <= percent <= 100
 
-        total_pages = self._friven_api.get_user_page_count()
+        if total_pages is None:
+            total_pages = self._friven_api.get_user_page_count()
         percent_as_float = percent / 100.0
         percentage_count = int(percent_as_float * total_pages * USERS_PER_PAGE)
         self._logger.debug("%s percent of (%s x %s) is %s",
@@ -65,14 +89,40 @@ class FrivenLoader(threading.Thread):
                            self._page_range_start,
                            self._page_range_end)
 
-    def init_queue_data_percent(self, percent):
+    def set_lastname_range(self, first_lastname, end_lastname):
+        """
+            Only queue users whose sort key is in
+            [first_lastname, end_lastname) (None: unbounded).
+            The first and last page of a lastname range
+            usually hold other lastnames too.
+        """
+        self._first_lastname = first_lastname
+        self._end_lastname = end_lastname
+        self._logger.info("FrivenLoader configured to process lastnames '%s' up to '%s'",
+                          first_lastname,
+                          end_lastname)
+
+    def _in_lastname_range(self, sort_key):
+        """
+            True if the sort key is in the lastname range
+        """
+        if self._first_lastname is not None and sort_key < self._first_lastname:
+            return False
+        if self._end_lastname is not None and sort_key >= self._end_lastname:
+            return False
+        return True
+
+    def init_queue_data_percent(self, percent, total_pages=None):
         """
             Initializes the queue with a maxsize
             that is PERCENT % of the total number
             of user records that are available
             from Friendly Vendor
+
+            total_pages: the API's page count, if known
         """
-        percentage_count = self._get_percentage_count(percent=percent)
+        percentage_count = self._get_percentage_count(percent=percent,
+                                                      total_pages=total_pages)
         self.init_queue(maxsize=percentage_count)
 
     def init_queue(self, maxsize):
@@ -82,7 +132,7 @@ class FrivenLoader(threading.Thread):
             data we store locally
         """
         self._logger.info("FrivenLoader queue size set to %s", maxsize)
-        self._user_queue = queue.Queue(maxsize=maxsize)
+        self._user_queue = TimedQueue(maxsize=maxsize)
 
     def get_queue(self):
         """
@@ -137,7 +187,14 @@ class FrivenLoader(threading.Thread):
                 return
 
             # Grab a full page of data
+            start_time = time.perf_counter()
             page, total_pages, users = self._friven_api.get_user_page(page_number=current_page)
+            if self._metrics_collector:
+                seconds = time.perf_counter() - start_time
+                self._metrics_collector.add_latency(name="friven_page_fetch", seconds=seconds)
+                self._metrics_collector.add_throughput(name="friven_loader",
+                                                       count=len(users),
+                                                       seconds=seconds)
             if users:
                 self._logger.info("FrivenLoader processing %s users from page %s/%s %s-%s",
                                   len(users),
@@ -157,16 +214,25 @@ class FrivenLoader(threading.Thread):
             for index, user in enumerate(users):
                 user['friendly_vendor_page'] = page
                 user['friendly_vendor_row'] = index + 1
-                self._user_queue.put(user)
+                self._normalizer.normalize_friven_user(user)
+                if self._in_lastname_range(user['sort_key']):
+                    self._user_queue.put(user)
 
             current_page += 1
 
+            if self._end_lastname is not None and users[-1]['sort_key'] >= self._end_lastname:
+                # the following pages are past the lastname range
+                break
+
             # usually _page_range_end will be None,
             # but it is configurable if we want
             # to process a smaller window of user pages
             if self._page_range_end and current_page > self._page_range_end:
                 break
 
+        # tell the Melder there are no more users
+        self._user_queue.put(END_OF_DATA)
+
 # pylint: disable=invalid-name
 if __name__ == "__main__":
     # Integration Testing
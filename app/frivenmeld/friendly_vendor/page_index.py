@@ -0,0 +1,149 @@
+"""
+    page_index.py
+
+    Maps lastname ranges to Friendly Vendor pages
+
+    The /users pages are sorted by lastname, so the first and
+    last lastname of each page are enough to binary search for
+    the pages that hold a lastname range.  Pages are fetched
+    on demand and their boundaries cached, so mapping a range
+    costs O(log total_pages) page requests.
+
+    Lastnames are compared as sort keys (see make_sort_key()).
+    A range is [first_lastname, end_lastname): end_lastname
+    is not part of it, and None means unbounded.
+"""
+import logging
+from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.normalizer import make_sort_key
+
+class PageIndex():
+    """
+        Lastname boundaries of the Friendly Vendor pages
+    """
+
+    def __init__(self, friven_api):
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._friven_api = friven_api
+        self._total_pages = None
+        # page -> (first sort key, last sort key)
+        self._boundaries = {}
+
+    def get_total_pages(self):
+        """
+            number of pages the API has
+        """
+        if self._total_pages is None:
+            self._total_pages = self._friven_api.get_user_page_count()
+        return self._total_pages
+
+    def get_boundaries(self, page):
+        """
+            returns (first sort key, last sort key) of the page
+        """
+        if page not in self._boundaries:
+            _, _, users = self._friven_api.get_user_page(page_number=page)
+            assert users, "page {} is empty".format(page)
+            self._boundaries[page] = (make_sort_key(users[0]['lastname']),
+                                      make_sort_key(users[-1]['lastname']))
+            self._logger.debug("PageIndex page %s: '%s' - '%s'",
+                               page,
+                               self._boundaries[page][0],
+                               self._boundaries[page][1])
+        return self._boundaries[page]
+
+    def find_first_page(self, first_lastname, first_page, last_page):
+        """
+            first page in first_page - last_page that can hold
+            first_lastname or anything after it, i.e. the first
+            page whose last lastname is >= first_lastname
+
+            returns None if there is no such page
+        """
+        low, high = first_page, last_page + 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_boundaries(middle)[1] >= first_lastname:
+                high = middle
+            else:
+                low = middle + 1
+        return low if low <= last_page else None
+
+    def find_last_page(self, end_lastname, first_page, last_page):
+        """
+            last page in first_page - last_page that holds
+            lastnames before end_lastname, i.e. the last
+            page whose first lastname is < end_lastname
+
+            returns None if there is no such page
+        """
+        low, high = first_page - 1, last_page
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.get_boundaries(middle)[0] < end_lastname:
+                low = middle
+            else:
+                high = middle - 1
+        return low if low >= first_page else None
+
+    def get_page_range(self, first_lastname, end_lastname, first_page, last_page):
+        """
+            returns (start page, end page) of the lastname range
+            within first_page - last_page, or None if no page holds it
+        """
+        start_page = first_page
+        if first_lastname is not None:
+            start_page = self.find_first_page(first_lastname, first_page, last_page)
+
+        end_page = last_page
+        if end_lastname is not None:
+            end_page = self.find_last_page(end_lastname, first_page, last_page)
+
+        if start_page is None or end_page is None or start_page > end_page:
+            return None
+        return start_page, end_page
+
+    def get_next_lastname(self, page):
+        """
+            returns the first sort key after the last lastname
+            of the page, None if no later page has one
+
+            used as the end_lastname that bounds the Doximity
+            read of a page range ending with this page
+        """
+        last_lastname = self.get_boundaries(page)[1]
+        for next_page in range(page + 1, self.get_total_pages() + 1):
+            first_lastname, page_last_lastname = self.get_boundaries(next_page)
+            if first_lastname > last_lastname:
+                return first_lastname
+            if page_last_lastname == last_lastname:
+                # the lastname fills the whole page
+                continue
+            # the lastname continues onto this page
+            _, _, users = self._friven_api.get_user_page(page_number=next_page)
+            for user in users:
+                sort_key = make_sort_key(user['lastname'])
+                if sort_key > last_lastname:
+                    return sort_key
+        return None
+
+    def split_lastnames(self, page_partitions):
+        """
+            turns balanced page partitions into lastname ranges
+            that do not split a lastname across partitions
+
+            page_partitions: [(start_page, end_page), ...]
+            returns [(first_lastname, end_lastname), ...]
+            (may be fewer, if one lastname fills several pages)
+        """
+        # the first lastname of each partition after the first
+        boundaries = [None]
+        for start_page, _ in page_partitions[1:]:
+            lastname = self.get_boundaries(start_page)[0]
+            if lastname != boundaries[-1]:
+                boundaries.append(lastname)
+        boundaries.append(None)
+
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+# end
@@ -0,0 +1,216 @@
+"""
+    fuzzy_combining_engine.py
+
+    Approximate matching version of the CombiningEngine
+
+    The exact engine only pairs users whose normalized
+    firstname/lastname are identical, and it cannot handle
+    two Doximity users with the same name.
+
+    The FuzzyCombiningEngine only fuzzes firstnames: the Melder
+    groups users by their exact lastname sort_key, so a lastname
+    typo puts a user in a group of its own that is never combined.
+
+    It indexes the Doximity users of a lastname-group by a few
+    cheap blocking keys:
+
+        (lastname sort_key, first initial of the firstname)
+        (lastname sort_key, location code)
+
+    Each Friendly Vendor user is only scored against the users
+    that share at least one blocking key with it (its candidate set),
+    so the work per group grows with the size of the blocks rather
+    than with friven users x mysql users.  A candidate set larger
+    than MAX_CANDIDATES keeps the candidates with the same canonical
+    firstname, then those with the closest firstname lengths
+    (see _cheap_rank()).
+
+    Candidates are scored with a bigram similarity of the firstnames
+    (after resolving common nicknames).  The best candidate at or above
+    the threshold is the match.
+"""
+import heapq
+import logging
+from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.combining_engine import CombiningEngine
+
+DEFAULT_THRESHOLD = 0.8
+
+# never score more than this many candidates for one user
+MAX_CANDIDATES = 50
+
+NICKNAMES = {
+    'al': 'albert',
+    'alex': 'alexander',
+    'andy': 'andrew',
+    'ben': 'benjamin',
+    'bill': 'william',
+    'bob': 'robert',
+    'chris': 'christopher',
+    'dan': 'daniel',
+    'dave': 'david',
+    'jim': 'james',
+    'joe': 'joseph',
+    'kate': 'katherine',
+    'liz': 'elizabeth',
+    'matt': 'matthew',
+    'mike': 'michael',
+    'nick': 'nicholas',
+    'rob': 'robert',
+    'sam': 'samuel',
+    'steve': 'steven',
+    'sue': 'susan',
+    'tom': 'thomas',
+    'tony': 'anthony',
+}
+
+def canonical_firstname(firstname):
+    """
+        lower case / stripped firstname
+        with nicknames replaced by the full name
+    """
+    firstname = firstname.lower().strip()
+    return NICKNAMES.get(firstname, firstname)
+
+def _bigrams(value):
+    """
+        set of character pairs in value
+    """
+    return {value[index:index + 2] for index in range(len(value) - 1)}
+
+def similarity(value1, value2):
+    """
+        Dice coefficient of the character bigrams (0.0 - 1.0)
+    """
+    if value1 == value2:
+        return 1.0
+    bigrams1 = _bigrams(value1)
+    bigrams2 = _bigrams(value2)
+    if not bigrams1 or not bigrams2:
+        return 0.0
+    return 2.0 * len(bigrams1 & bigrams2) / (len(bigrams1) + len(bigrams2))
+
+
+class FuzzyCombiningEngine(CombiningEngine):
+    """
+        CombiningEngine that pairs users by
+        blocking keys and firstname similarity
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, metrics_collector, report_date, mysql_writer,
+                 threshold=DEFAULT_THRESHOLD, date_cache=None):
+        """
+            report_date: 2019-02-01
+            threshold: minimum similarity (0.0 - 1.0) for a match
+        """
+        assert 0.0 < threshold <= 1.0
+        super(FuzzyCombiningEngine, self).__init__(metrics_collector=metrics_collector,
+                                                   report_date=report_date,
+                                                   mysql_writer=mysql_writer,
+                                                   date_cache=date_cache)
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._threshold = threshold
+
+    @staticmethod
+    def _blocking_keys(sort_key, firstname, location_code):
+        """
+            the blocks a user belongs to
+        """
+        return [(sort_key, firstname[:1]),
+                (sort_key, location_code)]
+
+    @staticmethod
+    def _cheap_rank(firstname, shared_keys, entry):
+        """
+            orders candidates before they are scored, the highest
+            first: the same firstname, then the most similar
+            firstname lengths (the similarity can not be higher
+            than 2 * shorter / (shorter + longer) bigram counts),
+            then the most shared blocking keys
+        """
+        position, candidate_firstname, _ = entry
+        lengths = sorted((len(firstname), len(candidate_firstname)))
+        return (candidate_firstname == firstname,
+                2.0 * lengths[0] / (sum(lengths) or 1),
+                shared_keys,
+                -position)
+
+    def combine(self, friven_user_list, mysql_user_list):
+        """
+            Same arguments as CombiningEngine.combine()
+
+            Pairs each friven user with its best scoring
+            mysql candidate.  Duplicate names are fine.
+        """
+        self._logger.debug("Fuzzy combining %s friven with %s mysql for '%s'",
+                           len(friven_user_list),
+                           len(mysql_user_list),
+                           friven_user_list[0]['lastname'])
+
+        # blocking key -> list of (position, canonical firstname, mysql user)
+        # (the Melder sends one lastname per group, but batches may not)
+        blocks = {}
+        for position, mysql_user in enumerate(mysql_user_list):
+            firstname = canonical_firstname(mysql_user['firstname'])
+            entry = (position, firstname, mysql_user)
+            for key in self._blocking_keys(mysql_user['sort_key'],
+                                           firstname,
+                                           mysql_user['location_code']):
+                blocks.setdefault(key, []).append(entry)
+
+        group_candidates = 0
+        for friven_user in friven_user_list:
+            firstname = canonical_firstname(friven_user['firstname'])
+
+            # position -> [entry, number of shared blocking keys]
+            candidates = {}
+            for key in self._blocking_keys(friven_user['sort_key'],
+                                           firstname,
+                                           friven_user['location_code']):
+                for entry in blocks.get(key, []):
+                    candidates.setdefault(entry[0], [entry, 0])[1] += 1
+
+            if len(candidates) > MAX_CANDIDATES:
+                self._metrics_collector.observe(name="fuzzy_truncated_candidates",
+                                                value=len(candidates) - MAX_CANDIDATES)
+                kept = heapq.nlargest(MAX_CANDIDATES,
+                                      candidates.values(),
+                                      key=lambda item: self._cheap_rank(firstname, item[1],
+                                                                        item[0]))
+            else:
+                kept = candidates.values()
+
+            group_candidates += len(kept)
+            best_match = self._best_candidate(friven_user=friven_user,
+                                              firstname=firstname,
+                                              candidates=[entry for entry, _ in kept])
+            if best_match:
+                self._process_match(mysql_user=best_match, friven_user=friven_user)
+
+        self._metrics_collector.observe(name="fuzzy_candidates_per_group",
+                                        value=group_candidates)
+
+    def _best_candidate(self, friven_user, firstname, candidates):
+        """
+            returns the mysql user with the highest score
+            at or above the threshold, or None
+
+            ties go to the candidate with the same location,
+            then to the earliest one in the group
+        """
+        best_match = None
+        best_rank = None
+        for position, candidate_firstname, mysql_user in candidates:
+            score = similarity(firstname, candidate_firstname)
+            if score < self._threshold:
+                continue
+            rank = (score,
+                    mysql_user['location_code'] == friven_user['location_code'],
+                    -position)
+            if best_rank is None or rank > best_rank:
+                best_rank = rank
+                best_match = mysql_user
+        return best_match
+
+# end
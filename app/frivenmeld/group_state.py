@@ -0,0 +1,168 @@
+"""
+    group_state.py
+
+    Fingerprints of the lastname-groups of the last
+    successful run, for incremental runs (--incremental-state)
+
+    Neither source has a change watermark (the /users api has
+    no modified-since filter and the Doximity user table no
+    update timestamp), so a group's change is detected from its
+    content: the fingerprint hashes every attribute of both
+    sides that goes into its match records, including the last
+    active dates.  A group whose fingerprint did not change since
+    the last run has the same matches as that run, and only its
+    activity flags depend on the new report_date (see
+    IncrementalCombiningEngine).
+
+    The state is an SQLite file holding the fingerprint of
+    every group of the last run, that run's report_date and
+    the settings that decide its matches (target table and
+    matcher).  save() replaces it as a whole, so a group is
+    only ever compared to the run that wrote its rows.
+"""
+import hashlib
+import logging
+import sqlite3
+from frivenmeld.loggingsetup import APP_LOGNAME
+
+# the user attributes that go into match records, in the
+# order they are hashed.  The categories are hashed as their
+# normalized values: the codes are only stable within a run
+FINGERPRINT_FIELDS = ("id", "firstname", "lastname", "last_active_date")
+FINGERPRINT_CATEGORIES = ("classification", "location", "specialty")
+
+# seconds to wait for another process's transaction
+SQLITE_TIMEOUT = 60
+
+def _add_users(digest, user_list, encoders):
+    """
+        adds the users, in id order, to the digest
+    """
+    rows = []
+    for user in user_list:
+        row = [str(user[field]) for field in FINGERPRINT_FIELDS]
+        row.extend(encoders[name].decode(user["{}_code".format(name)])
+                   for name in FINGERPRINT_CATEGORIES)
+        rows.append((user['id'], row))
+
+    for _, row in sorted(rows, key=lambda item: item[0]):
+        digest.update("\t".join(row).encode("utf-8"))
+        digest.update(b"\n")
+
+def group_fingerprint(friven_user_list, mysql_user_list, encoders):
+    """
+        returns a hex digest of a lastname-group
+        that changes when any user of it changes
+
+        encoders: RecordNormalizer.get_encoders()
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    _add_users(digest, friven_user_list, encoders)
+    digest.update(b"--\n")
+    _add_users(digest, mysql_user_list, encoders)
+    return digest.hexdigest()
+
+class GroupStateException(Exception):
+    """
+        Raised when the state file can not be used
+    """
+    pass
+
+class GroupState():
+    """
+        Group fingerprints of the previous run
+        and the ones seen by this run
+    """
+
+    def __init__(self, path):
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._path = path
+        self._report_date = None
+        self._settings = None
+        # sort_key -> fingerprint
+        self._previous = {}
+        self._current = {}
+
+    def get_path(self):
+        """
+            Accessor for the state file name
+        """
+        return self._path
+
+    def _connect(self):
+        """
+            returns a connection to the state file
+            and creates its tables if needed
+        """
+        try:
+            connection = sqlite3.connect(self._path, timeout=SQLITE_TIMEOUT)
+            connection.execute("""
+                create table if not exists group_fingerprint (
+                    sort_key text primary key,
+                    fingerprint text not null
+                )""")
+            connection.execute("""
+                create table if not exists run_state (
+                    name text primary key,
+                    value text not null
+                )""")
+            return connection
+        except sqlite3.Error as error:
+            raise GroupStateException("Can not open group state {}: {}".format(self._path,
+                                                                                error))
+
+    def load(self):
+        """
+            reads the previous run's state
+
+            returns (report_date, settings) of the
+            previous run, (None, None) if there is none
+        """
+        connection = self._connect()
+        try:
+            run_state = dict(connection.execute("select name, value from run_state"))
+            self._report_date = run_state.get("report_date")
+            self._settings = run_state.get("settings")
+            self._previous = dict(connection.execute(
+                "select sort_key, fingerprint from group_fingerprint"))
+        finally:
+            connection.close()
+
+        self._logger.info("GroupState loaded %s groups of %s from %s",
+                          len(self._previous),
+                          self._report_date,
+                          self._path)
+        return self._report_date, self._settings
+
+    def is_unchanged(self, sort_key, fingerprint):
+        """
+            records the group's fingerprint for this run
+
+            returns True if the previous run saw the
+            group with the same fingerprint
+        """
+        self._current[sort_key] = fingerprint
+        return self._previous.get(sort_key) == fingerprint
+
+    def save(self, report_date, settings):
+        """
+            replaces the state with this run's groups
+        """
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("delete from group_fingerprint")
+                connection.executemany("insert into group_fingerprint values (?, ?)",
+                                       self._current.items())
+                connection.executemany("insert or replace into run_state values (?, ?)",
+                                       [("report_date", report_date),
+                                        ("settings", settings)])
+        finally:
+            connection.close()
+
+        self._logger.info("GroupState saved %s groups of %s to %s",
+                          len(self._current),
+                          report_date,
+                          self._path)
+
+# end
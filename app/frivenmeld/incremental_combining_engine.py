@@ -0,0 +1,104 @@
+"""
+    incremental_combining_engine.py
+
+    Wraps a combining engine so that lastname-groups that
+    did not change since the previous run are not matched again
+
+    The fingerprint of every group is compared to the one the
+    previous run stored in the GroupState.  A changed (or new)
+    group goes to the wrapped engine as usual.  An unchanged
+    group has the same match records as in the previous run,
+    except for the report_date and the activity flags, so its
+    records are copied from the previous report_date on the
+    database server, which recomputes the flags from the stored
+    last active dates (MysqlWriter.copy_records_from_date()).
+
+    The copies are batched by Doximity user ids.  The records
+    of a user all belong to the user's lastname-group, so a
+    copied user id never picks up a record of a changed group.
+"""
+import logging
+from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.group_state import group_fingerprint
+
+DEFAULT_COPY_BATCHSIZE = 1000
+
+# pylint: disable=too-many-instance-attributes
+class IncrementalCombiningEngine():
+    """
+        Drop-in replacement for a combining engine
+        that only combines changed lastname-groups
+
+        Call flush() when the Melder is done
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, combining_engine, group_state, encoders, metrics_collector,
+                 mysql_writer, report_date, previous_report_date,
+                 copy_batchsize=DEFAULT_COPY_BATCHSIZE):
+        """
+            combining_engine: matches the changed groups
+            group_state: GroupState loaded with the previous run
+            encoders: RecordNormalizer.get_encoders() of the run
+            previous_report_date: the report_date of the previous
+                                  run, None to combine every group
+                                  (fingerprints are still recorded)
+        """
+        assert copy_batchsize > 0
+
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._combining_engine = combining_engine
+        self._group_state = group_state
+        self._encoders = encoders
+        self._metrics_collector = metrics_collector
+        self._mysql_writer = mysql_writer
+        self._report_date = report_date
+        self._previous_report_date = previous_report_date
+        self._copy_batchsize = copy_batchsize
+        # Doximity user ids of unchanged groups
+        self._copy_user_ids = []
+
+    def combine(self, friven_user_list, mysql_user_list):
+        """
+            Same arguments as CombiningEngine.combine()
+        """
+        fingerprint = group_fingerprint(friven_user_list=friven_user_list,
+                                        mysql_user_list=mysql_user_list,
+                                        encoders=self._encoders)
+        is_unchanged = self._group_state.is_unchanged(sort_key=friven_user_list[0]['sort_key'],
+                                                      fingerprint=fingerprint)
+
+        if is_unchanged and self._previous_report_date:
+            self._metrics_collector.observe(name="incremental_changed_groups", value=0)
+            self._copy_user_ids.extend(user['id'] for user in mysql_user_list)
+            if len(self._copy_user_ids) >= self._copy_batchsize:
+                self._copy_records()
+        else:
+            self._metrics_collector.observe(name="incremental_changed_groups", value=1)
+            self._combining_engine.combine(friven_user_list=friven_user_list,
+                                           mysql_user_list=mysql_user_list)
+
+    def flush(self):
+        """
+            Flushes the wrapped engine and
+            copies the remaining unchanged groups
+        """
+        self._combining_engine.flush()
+        self._copy_records()
+
+    def _copy_records(self):
+        """
+            copies the buffered users' records
+            from the previous report date
+        """
+        if not self._copy_user_ids:
+            return
+
+        copied = self._mysql_writer.copy_records_from_date(
+            from_date_string=self._previous_report_date,
+            date_string=self._report_date,
+            doximity_user_ids=self._copy_user_ids)
+        self._metrics_collector.increment_matches(count=copied)
+        self._copy_user_ids = []
+
+# end
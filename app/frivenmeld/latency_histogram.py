@@ -0,0 +1,94 @@
+"""
+    latency_histogram.py
+
+    Fixed-bucket histogram of operation latencies
+
+    The buckets double from 1 microsecond up to about a
+    minute, so recording a latency is a bisect into a short
+    list and the histograms of different threads, processes
+    or runs merge by adding their counts.  Percentiles are
+    reported as the upper bound of the bucket they fall in
+    (at most 2x the true value).
+"""
+import bisect
+
+# upper bounds in seconds: 1us, 2us, 4us ... ~67s, then overflow
+BUCKET_BOUNDS = [2 ** exponent / 1000000.0 for exponent in range(27)]
+
+class LatencyHistogram():
+    """
+        Counts, sum and max of the latencies of one operation
+        (not thread safe, see MetricsCollector.add_latency())
+    """
+
+    def __init__(self):
+        self._counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._maximum = 0.0
+
+    def add(self, seconds):
+        """
+            records one latency
+        """
+        self._counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self._count += 1
+        self._total += seconds
+        if seconds > self._maximum:
+            self._maximum = seconds
+
+    def get_count(self):
+        """
+            number of recorded latencies
+        """
+        return self._count
+
+    def get_percentile(self, percent):
+        """
+            returns the upper bound of the bucket that holds
+            the percentile (the maximum for the overflow bucket)
+        """
+        if not self._count:
+            return 0.0
+
+        rank = percent / 100.0 * self._count
+        cumulative = 0
+        for index, count in enumerate(self._counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                if index == len(BUCKET_BOUNDS):
+                    return self._maximum
+                return min(BUCKET_BOUNDS[index], self._maximum)
+        return self._maximum
+
+    def get_state(self):
+        """
+            returns the histogram as plain data
+        """
+        return {'counts': list(self._counts),
+                'count': self._count,
+                'total': self._total,
+                'max': self._maximum}
+
+    def merge_state(self, state):
+        """
+            adds another histogram's get_state()
+        """
+        for index, count in enumerate(state['counts']):
+            self._counts[index] += count
+        self._count += state['count']
+        self._total += state['total']
+        self._maximum = max(self._maximum, state['max'])
+
+    def get_summary(self):
+        """
+            returns count, mean, p50, p90, p99 and max in seconds
+        """
+        return {'count': self._count,
+                'mean': self._total / self._count if self._count else 0.0,
+                'p50': self.get_percentile(50),
+                'p90': self.get_percentile(90),
+                'p99': self.get_percentile(99),
+                'max': self._maximum}
+
+# end
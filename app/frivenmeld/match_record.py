@@ -0,0 +1,49 @@
+"""
+    match_record.py
+
+    Schema of the records written to friendly_vendor_match
+
+    A match record is a plain tuple whose values are already
+    in insert column order (MATCH_RECORD_FIELDS).  The combining
+    engines build them and the writer passes them straight
+    through as statement parameters - no dictionary is built
+    or looked up along the way.
+
+    _worker_id is not part of the record: it is the same for
+    every row a writer produces, so the writer adds it to the
+    statement itself (see MysqlWriter).
+"""
+import operator
+
+MATCH_RECORD_FIELDS = (
+    "doximity_user_id",
+    "friendly_vendor_user_id",
+    "is_doximity_user_active",
+    "is_friendly_vendor_user_active",
+    "classification_match",
+    "location_match",
+    "specialty_match",
+    "report_date",
+    "doximity_last_active_date",
+    "friendly_vendor_last_active_date",
+    "_friendly_vendor_page",
+    "_friendly_vendor_row",
+)
+
+# fieldname -> position in the tuple
+FIELD_INDEX = {fieldname: index for index, fieldname in enumerate(MATCH_RECORD_FIELDS)}
+
+# unique(report_date, doximity_user_id, friendly_vendor_user_id)
+UNIQUE_KEY_FIELDS = ("report_date", "doximity_user_id", "friendly_vendor_user_id")
+
+# match record -> its unique key, e.g. to sort by
+UNIQUE_KEY = operator.itemgetter(*[FIELD_INDEX[fieldname] for fieldname in UNIQUE_KEY_FIELDS])
+
+def match_record_as_dict(match_record):
+    """
+        returns {fieldname: value} for a match record
+        (for samples and logging, not the hot path)
+    """
+    return dict(zip(MATCH_RECORD_FIELDS, match_record))
+
+# end
@@ -18,6 +18,14 @@
     mysql_queue  --> ['fred asbury', 'helen asbury', 'bob allen'] -->
     friven_queue --> ['june asbury', 'fred asbury', 'judd arkin', 'bob allen'] -->
 
+    The loaders attach a precomputed 'sort_key' (see normalizer.py)
+    to every user, so lastnames are compared without being
+    lower-cased and stripped again on every dequeue.
+
+    A loader ends its queue with END_OF_DATA (see timed_queue.py),
+    so the meld ends as soon as either side is done; the timeouts
+    only catch loaders that stall.
+
     Only creates groups when the lastname is in both queues
     In this case, 'judd arkin' would be silently discarded
 
@@ -37,7 +45,9 @@
 """
 import logging
 import queue
+import time
 from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.timed_queue import get_item
 
 # pylint: disable=too-many-arguments
 # pylint: disable=too-few-public-methods
@@ -51,13 +61,19 @@ class Melder():
                  mysql_loader,
                  combining_engine,
                  friven_timeout,
-                 mysql_timeout):
+                 mysql_timeout,
+                 metrics_collector=None):
+        """
+            metrics_collector: optional, gets the
+                               latency of every combine
+        """
         self._logger = logging.getLogger(APP_LOGNAME)
         self._friven_loader = friven_loader
         self._mysql_loader = mysql_loader
         self._combining_engine = combining_engine
         self._friven_timeout = friven_timeout
         self._mysql_timeout = mysql_timeout
+        self._metrics_collector = metrics_collector
 
     def meld(self):
         """
@@ -74,13 +90,13 @@ class Melder():
 
         # Grab the first friven user
         try:
-            friven_user = friven_queue.get(timeout=self._friven_timeout)
+            friven_user = get_item(friven_queue, timeout=self._friven_timeout)
 
         except queue.Empty:
             self._logger.info("There is no api data available.")
             return
 
-        friven_lastname = friven_user['lastname'].lower().strip()
+        friven_lastname = friven_user['sort_key']
         self._logger.debug("first friven lastname is '%s'.",
                            friven_lastname)
 
@@ -96,12 +112,12 @@ class Melder():
 
         # grab the first mysql user
         try:
-            mysql_user = mysql_queue.get(timeout=self._mysql_timeout)
+            mysql_user = get_item(mysql_queue, timeout=self._mysql_timeout)
         except queue.Empty:
-            self._logger.info("Timed out waiting for Doximity data. "
-                              "Increase mysql_timeout.")
+            self._logger.info("No Doximity data (or timed out waiting for it, "
+                              "increase mysql_timeout).")
             return
-        mysql_lastname = mysql_user['lastname'].lower().strip()
+        mysql_lastname = mysql_user['sort_key']
         self._logger.debug("First mysql lastname is '%s'",
                            mysql_lastname)
 
@@ -119,8 +135,8 @@ class Melder():
                     self._logger.debug("mysql '%s' < friven '%s'",
                                        mysql_lastname,
                                        friven_lastname)
-                    mysql_user = mysql_queue.get(timeout=self._mysql_timeout)
-                    mysql_lastname = mysql_user['lastname'].lower().strip()
+                    mysql_user = get_item(mysql_queue, timeout=self._mysql_timeout)
+                    mysql_lastname = mysql_user['sort_key']
 
                 # if friven_lastname is behind,
                 # pull stuff off the queue until it matches or passes
@@ -130,11 +146,11 @@ class Melder():
                                        friven_lastname,
                                        mysql_lastname)
 
-                    friven_user = friven_queue.get(timeout=self._friven_timeout)
-                    friven_lastname = friven_user['lastname'].lower().strip()
+                    friven_user = get_item(friven_queue, timeout=self._friven_timeout)
+                    friven_lastname = friven_user['sort_key']
 
             except queue.Empty:
-                self._logger.info("Timed out trying to find common last names")
+                self._logger.info("No more common last names (a queue ended or timed out)")
                 self._logger.info("Please wait a few seconds for things to wrap up.")
                 # we're not finding anoy more matches.
                 # we can drain the queues
@@ -171,11 +187,11 @@ class Melder():
                     while friven_lastname == working_lastname:
 
                         friven_list.append(friven_user)
-                        friven_user = friven_queue.get(timeout=self._friven_timeout)
-                        friven_lastname = friven_user['lastname'].lower().strip()
+                        friven_user = get_item(friven_queue, timeout=self._friven_timeout)
+                        friven_lastname = friven_user['sort_key']
 
                 except queue.Empty:
-                    self._logger.info("Timed out getting more friven data for '%s'",
+                    self._logger.info("No more friven data after '%s'",
                                       working_lastname)
                     self._logger.info("Please wait a few seconds for things to wrap up.")
                     stop_the_madness = True
@@ -186,11 +202,11 @@ class Melder():
 
                         # yoyo: DRY this up
                         mysql_list.append(mysql_user)
-                        mysql_user = mysql_queue.get(timeout=self._mysql_timeout)
-                        mysql_lastname = mysql_user['lastname'].lower().strip()
+                        mysql_user = get_item(mysql_queue, timeout=self._mysql_timeout)
+                        mysql_lastname = mysql_user['sort_key']
 
                 except queue.Empty:
-                    self._logger.info("Timed out waiting for more mysql data for '%s'",
+                    self._logger.info("No more mysql data after '%s'",
                                       working_lastname)
                     self._logger.info("Please wait a few seconds for things to wrap up.")
                     stop_the_madness = True
@@ -216,6 +232,13 @@ class Melder():
             We're gonna delegate this task to
             the Combiner a.k.a. CombiningEngine
         """
+        start_time = time.perf_counter()
         self._combining_engine.combine(friven_user_list=friven_list, mysql_user_list=mysql_list)
+        if self._metrics_collector:
+            seconds = time.perf_counter() - start_time
+            self._metrics_collector.add_latency(name="combine", seconds=seconds)
+            self._metrics_collector.add_throughput(name="combine",
+                                                   count=len(friven_list) + len(mysql_list),
+                                                   seconds=seconds)
 
 # end
@@ -1,10 +1,40 @@
 """
     metrics_collector.py
+
+    Besides the matches and samples, every stage reports:
+      - throughput: records and seconds (records/sec)
+      - latency: a LatencyHistogram per operation
+        (page fetch, DB batch, combine, batch flush)
+      - queues: the time producers and consumers spent
+        blocked on each registered TimedQueue, and the time
+        series of the QueueSampler
+
+    print_summary() shows them and write_report() saves
+    them as JSON (see get_report()), tagged with the labels
+    of the run (see metrics_export.py for Prometheus)
 """
 import logging
 import datetime
 import json
+import threading
 from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.latency_histogram import LatencyHistogram
+from frivenmeld.match_record import match_record_as_dict
+
+QUEUE_COUNTERS = ('puts', 'gets', 'put_seconds', 'get_seconds')
+
+def _merge_cache_stats(stats1, stats2):
+    """
+        adds up the hits and misses of two get_stats() results
+    """
+    if stats1 is None:
+        return dict(stats2)
+
+    hits = stats1['hits'] + stats2['hits']
+    misses = stats1['misses'] + stats2['misses']
+    return {'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
 
 class MetricsCollector():
     """
@@ -19,13 +49,213 @@ class MetricsCollector():
         self._max_samples = 10
         self._num_samples = 0
         self._sample_rows = []
+        self._caches = {}
+        # cache stats merged in from other processes
+        self._merged_cache_stats = {}
+        self._observations = {}
+        self._throughput = {}
+        # name -> LatencyHistogram
+        self._latencies = {}
+        # name -> TimedQueue
+        self._queues = {}
+        # queue counters merged in from other processes
+        self._merged_queue_stats = {}
+        # name -> [QueueSampler sample, ...]
+        self._queue_samples = {}
+        # e.g. worker_id and report_date, see set_labels()
+        self._labels = {}
+        # throughput and latencies are reported from
+        # other threads (e.g. the WriterThread)
+        self._lock = threading.Lock()
         self._logger = logging.getLogger(APP_LOGNAME)
 
-    def increment_matches(self):
+    def observe(self, name, value):
+        """
+            Record one observation of a named value
+            (e.g. candidates per group)
+            The summary shows count / mean / max per name
+        """
+        observation = self._observations.get(name)
+        if observation is None:
+            self._observations[name] = [1, value, value]
+        else:
+            observation[0] += 1
+            observation[1] += value
+            observation[2] = max(observation[2], value)
+
+    def add_throughput(self, name, count, seconds):
+        """
+            Record that COUNT records were processed in SECONDS
+            by the named stage (e.g. writer_insert).
+            The summary shows the records/sec per name
+        """
+        with self._lock:
+            throughput = self._throughput.setdefault(name, [0, 0.0])
+            throughput[0] += count
+            throughput[1] += seconds
+
+    def add_latency(self, name, seconds):
+        """
+            Record how long one named operation
+            (e.g. friven_page_fetch) took
+            The summary shows its percentiles
+        """
+        with self._lock:
+            histogram = self._latencies.get(name)
+            if histogram is None:
+                histogram = self._latencies[name] = LatencyHistogram()
+            histogram.add(seconds)
+
+    def register_queue(self, name, timed_queue):
+        """
+            Report the blocked time of a TimedQueue
+            in the summary
+        """
+        self._queues[name] = timed_queue
+
+    def set_labels(self, labels):
+        """
+            Tag the report with {name: string}
+            (e.g. the worker id and page range) so the
+            reports of several workers can be told apart
+        """
+        self._labels = dict(labels)
+
+    def get_queues(self):
+        """
+            returns {name: TimedQueue} of the registered queues
+        """
+        return dict(self._queues)
+
+    def add_queue_sample(self, name, sample):
+        """
+            Append a QueueSampler sample to
+            the queue's time series
+        """
+        with self._lock:
+            self._queue_samples.setdefault(name, []).append(sample)
+
+    def thin_queue_samples(self):
+        """
+            Merges each pair of consecutive samples,
+            keeping the later depth and adding up
+            the blocked seconds
+        """
+        with self._lock:
+            for name, samples in self._queue_samples.items():
+                thinned = []
+                for index in range(0, len(samples) - 1, 2):
+                    first, second = samples[index], samples[index + 1]
+                    merged = dict(second)
+                    merged['put_seconds'] += first['put_seconds']
+                    merged['get_seconds'] += first['get_seconds']
+                    thinned.append(merged)
+                if len(samples) % 2:
+                    thinned.append(samples[-1])
+                self._queue_samples[name] = thinned
+
+    def _get_queue_stats(self):
+        """
+            returns {name: counters} for all registered queues
+            (and the ones merged from other processes)
+        """
+        all_stats = {name: dict(stats) for name, stats in self._merged_queue_stats.items()}
+        for name, timed_queue in self._queues.items():
+            queue_stats = timed_queue.get_stats()
+            stats = all_stats.setdefault(name, dict.fromkeys(QUEUE_COUNTERS, 0))
+            for counter in QUEUE_COUNTERS:
+                stats[counter] += queue_stats[counter]
+        return dict(sorted(all_stats.items()))
+
+    def register_cache(self, name, cache):
+        """
+            Report the statistics of CACHE in the summary
+
+            cache must provide get_stats() returning a
+            dictionary with at least 'hits', 'misses' and 'hit_rate'
+        """
+        self._caches[name] = cache
+
+    def _get_cache_stats(self):
+        """
+            returns {name: stats} for all registered caches
+            (and the ones merged from other processes)
+        """
+        all_stats = {}
+        for name, cache in self._caches.items():
+            all_stats[name] = cache.get_stats()
+        for name, stats in self._merged_cache_stats.items():
+            all_stats[name] = _merge_cache_stats(all_stats.get(name), stats)
+        return dict(sorted(all_stats.items()))
+
+    def get_state(self):
+        """
+            returns the measurements as plain (picklable)
+            data, e.g. to send them from a worker process
+            to the process that merges them (see merge_state())
+        """
+        with self._lock:
+            throughput = {name: list(values) for name, values in self._throughput.items()}
+            latencies = {name: histogram.get_state()
+                         for name, histogram in self._latencies.items()}
+            queue_samples = {name: list(samples)
+                             for name, samples in self._queue_samples.items()}
+        return {'num_matches': self._num_matches,
+                'sample_rows': list(self._sample_rows),
+                'observations': {name: list(values)
+                                 for name, values in self._observations.items()},
+                'throughput': throughput,
+                'latencies': latencies,
+                'queue_stats': self._get_queue_stats(),
+                'queue_samples': queue_samples,
+                'cache_stats': self._get_cache_stats()}
+
+    def merge_state(self, state):
+        """
+            adds the measurements of another
+            MetricsCollector's get_state()
+        """
+        self.increment_matches(count=state['num_matches'])
+        for row_dict in state['sample_rows']:
+            self.add_sample_row(row_dict=row_dict)
+
+        for name, (count, total, maximum) in state['observations'].items():
+            observation = self._observations.get(name)
+            if observation is None:
+                self._observations[name] = [count, total, maximum]
+            else:
+                observation[0] += count
+                observation[1] += total
+                observation[2] = max(observation[2], maximum)
+
+        for name, (count, seconds) in state['throughput'].items():
+            self.add_throughput(name=name, count=count, seconds=seconds)
+
+        with self._lock:
+            for name, histogram_state in state['latencies'].items():
+                histogram = self._latencies.get(name)
+                if histogram is None:
+                    histogram = self._latencies[name] = LatencyHistogram()
+                histogram.merge_state(histogram_state)
+            # the series of several workers are kept one after another
+            for name, samples in state['queue_samples'].items():
+                self._queue_samples.setdefault(name, []).extend(samples)
+
+        for name, stats in state['queue_stats'].items():
+            merged = self._merged_queue_stats.setdefault(name, dict.fromkeys(QUEUE_COUNTERS, 0))
+            for counter in QUEUE_COUNTERS:
+                merged[counter] += stats[counter]
+
+        for name, stats in state['cache_stats'].items():
+            self._merged_cache_stats[name] = _merge_cache_stats(
+                self._merged_cache_stats.get(name), stats)
+
+    def increment_matches(self, count=1):
         """
             Call this to record that a match was found
+            (or that COUNT matches were found)
         """
-        self._num_matches += 1
+        self._num_matches += count
 
     def mark_end_time(self):
         """
@@ -43,6 +273,15 @@ class MetricsCollector():
             self._sample_rows.append(row_dict)
             self._num_samples += 1
 
+    def add_sample_record(self, match_record):
+        """
+            Accumulate samples of match record tuples
+            only converts the record to a dictionary
+            if we still need samples
+        """
+        if self._num_samples < self._max_samples:
+            self.add_sample_row(row_dict=match_record_as_dict(match_record))
+
     def _get_duration(self):
         """
             returns the duration of ths script
@@ -67,6 +306,46 @@ class MetricsCollector():
 
         return minutes, seconds
 
+    def get_report(self):
+        """
+            returns the measurements of the run
+            as a JSON serializable dictionary
+        """
+        end_time = self._end_time or datetime.datetime.now()
+        with self._lock:
+            throughput = {name: {'count': count,
+                                 'seconds': seconds,
+                                 'per_second': count / seconds if seconds else 0.0}
+                          for name, (count, seconds) in sorted(self._throughput.items())}
+            # the bucket counts keep the reports of workers mergeable
+            latencies = {name: dict(histogram.get_summary(), **histogram.get_state())
+                         for name, histogram in sorted(self._latencies.items())}
+            queue_samples = {name: list(samples)
+                             for name, samples in sorted(self._queue_samples.items())}
+        return {'labels': dict(self._labels),
+                'start_time': self._start_time.isoformat(),
+                'elapsed_seconds': (end_time - self._start_time).total_seconds(),
+                'num_matches': self._num_matches,
+                'throughput': throughput,
+                'latency_seconds': latencies,
+                'queues': self._get_queue_stats(),
+                'queue_samples': queue_samples,
+                'observations': {name: {'count': count,
+                                        'total': total,
+                                        'mean': total / count,
+                                        'max': maximum}
+                                 for name, (count, total, maximum)
+                                 in sorted(self._observations.items())},
+                'caches': self._get_cache_stats()}
+
+    def write_report(self, path):
+        """
+            Saves get_report() as JSON
+        """
+        with open(path, "w") as report_file:
+            json.dump(self.get_report(), report_file, sort_keys=True, indent=4)
+        self._logger.info("Metrics report written to %s", path)
+
     def _get_sample_output_as_json(self):
         """
             Converts sample rows into a json string
@@ -96,6 +375,54 @@ class MetricsCollector():
         json_samples = self._get_sample_output_as_json()
         print("Sample Output: {}".format(json_samples))
 
+        for name, (count, total, maximum) in sorted(self._observations.items()):
+            print("Observed {}: count {}, mean {:.2f}, max {}".format(name,
+                                                                    count,
+                                                                    total / count,
+                                                                    maximum))
+
+        for name, (count, seconds) in sorted(self._throughput.items()):
+            print("Throughput {}: {} records in {:.2f} seconds ({:.0f}/sec)".format(
+                name, count, seconds, count / seconds if seconds else 0))
+
+        for name, summary in self.get_report()['latency_seconds'].items():
+            print("Latency {}: count {}, mean {:.2f} ms, p50 {:.2f} ms, p90 {:.2f} ms, "
+                  "p99 {:.2f} ms, max {:.2f} ms".format(name,
+                                                        summary['count'],
+                                                        summary['mean'] * 1000,
+                                                        summary['p50'] * 1000,
+                                                        summary['p90'] * 1000,
+                                                        summary['p99'] * 1000,
+                                                        summary['max'] * 1000))
+
+        for name, stats in self._get_queue_stats().items():
+            print("Queue {}: {} puts blocked {:.2f} seconds, "
+                  "{} gets blocked {:.2f} seconds".format(name,
+                                                          stats['puts'],
+                                                          stats['put_seconds'],
+                                                          stats['gets'],
+                                                          stats['get_seconds']))
+
+        with self._lock:
+            queue_samples = sorted(self._queue_samples.items())
+        for name, samples in queue_samples:
+            if not samples:
+                continue
+            depths = [sample['depth'] for sample in samples]
+            print("Queue {} depth: mean {:.1f}, max {} over {} samples, "
+                  "max memory {:.1f} MB".format(name,
+                                                sum(depths) / len(depths),
+                                                max(depths),
+                                                len(samples),
+                                                max(sample['memory_bytes']
+                                                    for sample in samples) / 1048576))
+
+        for name, stats in self._get_cache_stats().items():
+            print("Cache {}: {} hits, {} misses, {:.1%} hit rate".format(name,
+                                                                        stats['hits'],
+                                                                        stats['misses'],
+                                                                        stats['hit_rate']))
+
 # pylint: disable=invalid-name
 if __name__ == "__main__":
 
@@ -0,0 +1,252 @@
+"""
+    metrics_export.py
+
+    Structured output of MetricsCollector.get_report()
+
+    The JSON report (MetricsCollector.write_report()) is the
+    source of truth.  This module renders reports in the
+    Prometheus text format, for a node exporter textfile
+    collector or a push gateway, and merges the reports of
+    parallel workers:
+
+        python frivenmeld/metrics_export.py --json all.json \\
+            --prometheus all.prom w1.json w2.json w3.json
+
+    The Prometheus file has one series per report, told apart by
+    the report labels (worker_id, first_page, last_page,
+    report_date), so sum() by (report_date) adds up the workers.
+    The merged JSON report adds up the counters and histograms.
+"""
+import argparse
+import json
+from frivenmeld.latency_histogram import BUCKET_BOUNDS
+from frivenmeld.latency_histogram import LatencyHistogram
+
+METRIC_PREFIX = "frivenmeld"
+
+# name, type, help
+METRIC_FAMILIES = [
+    ("matches_total", "counter", "Match records written"),
+    ("run_seconds", "gauge", "Wall clock seconds of the run"),
+    ("stage_records_total", "counter", "Records processed by a stage"),
+    ("stage_seconds_total", "counter", "Seconds a stage spent processing records"),
+    ("latency_seconds", "histogram", "Latency of one operation of a stage"),
+    ("queue_operations_total", "counter", "put() and get() calls on a queue"),
+    ("queue_blocked_seconds_total", "counter", "Seconds spent blocked in put() and get()"),
+    ("queue_depth_max", "gauge", "Largest sampled queue depth"),
+    ("queue_memory_bytes_max", "gauge", "Largest sampled queue memory estimate"),
+    ("observations_total", "counter", "Number of observations of a value"),
+    ("observation_sum", "counter", "Sum of the observations of a value"),
+    ("observation_max", "gauge", "Largest observation of a value"),
+    ("cache_hits_total", "counter", "Cache hits"),
+    ("cache_misses_total", "counter", "Cache misses"),
+]
+
+def _format_value(value):
+    """
+        Prometheus float
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+def _format_labels(labels):
+    """
+        {"a": "1", "b": "x"} -> '{a="1",b="x"}'
+    """
+    if not labels:
+        return ""
+    escaped = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append('{}="{}"'.format(name, value))
+    return "{" + ",".join(escaped) + "}"
+
+def _get_samples(report):
+    """
+        returns [(family, suffix, extra labels, value), ...]
+        for the metrics of one report
+    """
+    samples = [("matches_total", "", {}, report['num_matches']),
+               ("run_seconds", "", {}, report['elapsed_seconds'])]
+
+    for stage, throughput in report['throughput'].items():
+        samples.append(("stage_records_total", "", {'stage': stage}, throughput['count']))
+        samples.append(("stage_seconds_total", "", {'stage': stage}, throughput['seconds']))
+
+    for operation, latency in report['latency_seconds'].items():
+        cumulative = 0
+        for bound, count in zip(BUCKET_BOUNDS + [float("inf")], latency['counts']):
+            cumulative += count
+            samples.append(("latency_seconds", "_bucket",
+                            {'operation': operation, 'le': _format_value(bound)},
+                            cumulative))
+        samples.append(("latency_seconds", "_sum", {'operation': operation}, latency['total']))
+        samples.append(("latency_seconds", "_count", {'operation': operation}, latency['count']))
+
+    for name, stats in report['queues'].items():
+        for operation in ('put', 'get'):
+            labels = {'queue': name, 'operation': operation}
+            samples.append(("queue_operations_total", "", labels, stats[operation + 's']))
+            samples.append(("queue_blocked_seconds_total", "", labels,
+                            stats[operation + '_seconds']))
+
+    for name, queue_samples in report['queue_samples'].items():
+        if queue_samples:
+            samples.append(("queue_depth_max", "", {'queue': name},
+                            max(sample['depth'] for sample in queue_samples)))
+            samples.append(("queue_memory_bytes_max", "", {'queue': name},
+                            max(sample['memory_bytes'] for sample in queue_samples)))
+
+    for name, observation in report['observations'].items():
+        samples.append(("observations_total", "", {'name': name}, observation['count']))
+        samples.append(("observation_sum", "", {'name': name}, observation['total']))
+        samples.append(("observation_max", "", {'name': name}, observation['max']))
+
+    for name, stats in report['caches'].items():
+        samples.append(("cache_hits_total", "", {'cache': name}, stats['hits']))
+        samples.append(("cache_misses_total", "", {'cache': name}, stats['misses']))
+
+    return samples
+
+def format_prometheus(reports):
+    """
+        returns the reports in the Prometheus text format,
+        each report's series tagged with its labels
+    """
+    families = {}
+    for report in reports:
+        for family, suffix, labels, value in _get_samples(report):
+            families.setdefault(family, []).append(
+                (suffix, dict(report['labels'], **labels), value))
+
+    lines = []
+    for family, metric_type, help_text in METRIC_FAMILIES:
+        if family not in families:
+            continue
+        metric_name = "{}_{}".format(METRIC_PREFIX, family)
+        lines.append("# HELP {} {}".format(metric_name, help_text))
+        lines.append("# TYPE {} {}".format(metric_name, metric_type))
+        for suffix, labels, value in families[family]:
+            lines.append("{}{}{} {}".format(metric_name,
+                                            suffix,
+                                            _format_labels(labels),
+                                            _format_value(value)))
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(reports, path):
+    """
+        Saves format_prometheus() to path
+    """
+    with open(path, "w") as prometheus_file:
+        prometheus_file.write(format_prometheus(reports))
+
+def _merge_labels(reports):
+    """
+        keeps the labels the reports agree on and joins
+        the distinct values of the others, e.g. worker_id "1,2,3"
+    """
+    labels = {}
+    for report in reports:
+        for name, value in report['labels'].items():
+            values = labels.setdefault(name, [])
+            if value not in values:
+                values.append(value)
+    return {name: ",".join(str(value) for value in values)
+            for name, values in labels.items()}
+
+def _add_counters(target, source, names):
+    """
+        adds the named counters of source to target
+    """
+    for name in names:
+        target[name] = target.get(name, 0) + source[name]
+
+# pylint: disable=too-many-locals
+def merge_reports(reports):
+    """
+        returns one report with the counters, histograms and
+        queue samples of all reports added up
+    """
+    assert reports
+
+    throughput = {}
+    histograms = {}
+    queues = {}
+    queue_samples = {}
+    observations = {}
+    caches = {}
+    for report in reports:
+        for name, values in report['throughput'].items():
+            _add_counters(throughput.setdefault(name, {}), values, ('count', 'seconds'))
+        for name, latency in report['latency_seconds'].items():
+            histograms.setdefault(name, LatencyHistogram()).merge_state(latency)
+        for name, stats in report['queues'].items():
+            _add_counters(queues.setdefault(name, {}), stats,
+                          ('puts', 'gets', 'put_seconds', 'get_seconds'))
+        for name, samples in report['queue_samples'].items():
+            queue_samples.setdefault(name, []).extend(samples)
+        for name, observation in report['observations'].items():
+            merged = observations.setdefault(name, {'max': observation['max']})
+            _add_counters(merged, observation, ('count', 'total'))
+            merged['max'] = max(merged['max'], observation['max'])
+        for name, stats in report['caches'].items():
+            _add_counters(caches.setdefault(name, {}), stats, ('hits', 'misses'))
+
+    for values in throughput.values():
+        values['per_second'] = values['count'] / values['seconds'] if values['seconds'] else 0.0
+    for observation in observations.values():
+        observation['mean'] = observation['total'] / observation['count']
+    for stats in caches.values():
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+
+    return {'labels': _merge_labels(reports),
+            'start_time': min(report['start_time'] for report in reports),
+            'elapsed_seconds': max(report['elapsed_seconds'] for report in reports),
+            'num_matches': sum(report['num_matches'] for report in reports),
+            'throughput': throughput,
+            'latency_seconds': {name: dict(histogram.get_summary(), **histogram.get_state())
+                                for name, histogram in histograms.items()},
+            'queues': queues,
+            'queue_samples': queue_samples,
+            'observations': observations,
+            'caches': caches}
+
+def main(argv=None):
+    """
+        merges the JSON reports of several workers
+    """
+    parser = argparse.ArgumentParser(description="Merge the --metrics-report "
+                                                 "files of several workers")
+    parser.add_argument("reports",
+                        nargs="+",
+                        help="JSON reports written with --metrics-report")
+    parser.add_argument("--json",
+                        dest="json_path",
+                        default=None,
+                        help="Write the merged report to this JSON file")
+    parser.add_argument("--prometheus",
+                        dest="prometheus_path",
+                        default=None,
+                        help="Write the reports, one series per worker, to this "
+                             "Prometheus text format file")
+    arg_object = parser.parse_args(argv)
+    if not arg_object.json_path and not arg_object.prometheus_path:
+        parser.error("use --json and/or --prometheus")
+
+    reports = []
+    for path in arg_object.reports:
+        with open(path) as report_file:
+            reports.append(json.load(report_file))
+
+    if arg_object.json_path:
+        with open(arg_object.json_path, "w") as json_file:
+            json.dump(merge_reports(reports), json_file, sort_keys=True, indent=4)
+    if arg_object.prometheus_path:
+        write_prometheus(reports=reports, path=arg_object.prometheus_path)
+
+if __name__ == "__main__":
+    main()
+
+# end
@@ -0,0 +1,100 @@
+"""
+    normalizer.py
+
+    Ingest-time normalization of user records
+
+    Both loaders run every record through a RecordNormalizer
+    before putting it on their queue.  The normalizer attaches
+    the keys that the downstream stages need:
+
+        sort_key            - lastname used by the Melder merge
+        match_key           - firstname/lastname key used by the CombiningEngine
+        location_code       - dictionary encoded location
+        specialty_code      - dictionary encoded specialty
+        classification_code - dictionary encoded classification
+
+    Every key is computed exactly once per record.  The name keys
+    are interned strings and the categorical fields are replaced
+    by small integer codes (see category_encoder.py), so the Melder
+    and CombiningEngine only ever compare precomputed values.
+"""
+import sys
+from frivenmeld.category_encoder import CategoryEncoder
+
+def make_sort_key(lastname):
+    """
+        returns the value we use to order
+        and group users by lastname
+    """
+    return sys.intern(lastname.lower().strip())
+
+def make_match_key(firstname, lastname):
+    """
+        returns some unique value based on
+        firstname and lastname
+        something we can use as a dict key
+    """
+    return sys.intern("{}::{}".format(firstname.lower().strip(), lastname.lower().strip()))
+
+
+class RecordNormalizer():
+    """
+        Attaches precomputed keys to user records
+        coming from Friendly Vendor and Doximity
+
+        A single instance is shared by both loaders
+        so both sources use the same category codes
+    """
+
+    def __init__(self):
+        self._location_encoder = CategoryEncoder(name="location")
+        self._specialty_encoder = CategoryEncoder(name="specialty")
+        self._classification_encoder = CategoryEncoder(name="classification")
+
+    def get_encoders(self):
+        """
+            returns the CategoryEncoders by name
+        """
+        return {'location': self._location_encoder,
+                'specialty': self._specialty_encoder,
+                'classification': self._classification_encoder}
+
+    def normalize_friven_user(self, user):
+        """
+            Adds the keys to a Friendly Vendor user
+            (as returned by FriendlyVendorApi)
+            and returns the same dictionary
+
+            The categorical strings are replaced by their codes
+        """
+        user['sort_key'] = make_sort_key(user['lastname'])
+        user['match_key'] = make_match_key(firstname=user['firstname'],
+                                           lastname=user['lastname'])
+        user['location_code'] = self._location_encoder.encode(
+            user.pop('practice_location'))
+        user['specialty_code'] = self._specialty_encoder.encode(
+            user.pop('specialty'))
+        user['classification_code'] = self._classification_encoder.encode(
+            user.pop('user_type_classification'))
+        return user
+
+    def normalize_mysql_user(self, user):
+        """
+            Adds the keys to a Doximity user
+            (as returned by the MysqlLoader query)
+            and returns the same dictionary
+
+            The categorical strings are replaced by their codes
+        """
+        user['sort_key'] = make_sort_key(user['lastname'])
+        user['match_key'] = make_match_key(firstname=user['firstname'],
+                                           lastname=user['lastname'])
+        user['location_code'] = self._location_encoder.encode(
+            user.pop('location'))
+        user['specialty_code'] = self._specialty_encoder.encode(
+            user.pop('specialty'))
+        user['classification_code'] = self._classification_encoder.encode(
+            user.pop('classification'))
+        return user
+
+# end
@@ -0,0 +1,254 @@
+"""
+    orchestrator.py
+
+    Runs one job as several worker processes
+
+    The Orchestrator asks the Friendly Vendor API for the
+    number of pages, splits the requested page range into
+    balanced partitions and runs each partition as its own
+    worker (worker_id 1-N) in its own process.
+
+    A partition that fails, by raising or by its process dying
+    (OOM kill, segfault), is submitted again, up to max_attempts
+    times.  Every attempt gets its own single-process pool: a
+    dead process breaks its pool, which would fail every
+    partition running in a shared one.  The rerun first removes what the
+    failed attempt wrote: it resumes from its checkpoint
+    if there is one, otherwise it deletes its worker's records
+    (upsert and staging runs replace them anyway).
+
+    With --partition-by lastnames, the balanced page partitions
+    are turned into lastname ranges (starting at the first
+    lastname of each partition's first page) and mapped back to
+    pages with a PageIndex.  A lastname is then never split
+    between workers, and each worker stops reading Doximity
+    users at the end of its range.
+
+    Every worker returns its MetricsCollector state and the
+    Orchestrator merges them into one MetricsCollector.
+"""
+import argparse
+import concurrent.futures
+import logging
+from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.friendly_vendor.friendly_vendor_api import FriendlyVendorApi
+from frivenmeld.friendly_vendor.page_index import PageIndex
+from frivenmeld.doximity.mysql_writer import WRITE_MODE_UPSERT
+from frivenmeld.sinks.sink import SINK_MYSQL
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+PARTITION_BY_PAGES = "pages"
+PARTITION_BY_LASTNAMES = "lastnames"
+PARTITION_BY = [PARTITION_BY_PAGES, PARTITION_BY_LASTNAMES]
+
+# _worker_id is a tinyint unsigned, and 0 means "all workers"
+MAX_WORKERS = 255
+
+class OrchestratorException(Exception):
+    """
+        Raised when a partition keeps failing
+    """
+    pass
+
+def split_pages(first_page, last_page, num_partitions):
+    """
+        splits first_page - last_page into at most num_partitions
+        contiguous ranges whose sizes differ by at most one page
+
+        returns [(start_page, end_page), ...]
+    """
+    assert first_page <= last_page
+    assert num_partitions > 0
+
+    num_pages = last_page - first_page + 1
+    num_partitions = min(num_partitions, num_pages)
+    size, remainder = divmod(num_pages, num_partitions)
+
+    partitions = []
+    start_page = first_page
+    for index in range(num_partitions):
+        end_page = start_page + size - 1 + (1 if index < remainder else 0)
+        partitions.append((start_page, end_page))
+        start_page = end_page + 1
+    return partitions
+
+def run_partition(job_function, arg_object, config):
+    """
+        Runs in the worker process:
+        returns the job's MetricsCollector state
+    """
+    mcollector = job_function(arg_object=arg_object, config=config)
+    return mcollector.get_state()
+
+class Orchestrator():
+    """
+        Runs the partitions of a job in worker processes
+    """
+
+    def __init__(self, job_function, arg_object, config):
+        """
+            job_function(arg_object, config) runs one worker
+            and returns its MetricsCollector (driver.run_job)
+
+            arg_object: the parsed driver arguments,
+            arg_object.workers is the number of processes
+        """
+        assert 0 < arg_object.workers <= MAX_WORKERS
+
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._job_function = job_function
+        self._arg_object = arg_object
+        self._config = config
+        self._page_index = PageIndex(friven_api=FriendlyVendorApi(
+            api_url=config["FRIENDLY_VENDOR_API_URL"]))
+
+    def get_page_range(self):
+        """
+            returns (first page, last page) of the job,
+            asking the API for the number of pages
+            if no end page was given
+        """
+        last_page = self._arg_object.end_page
+        if not last_page:
+            last_page = self._page_index.get_total_pages()
+        return self._arg_object.start_page, last_page
+
+    def get_partitions(self):
+        """
+            returns [(start_page, end_page, first_lastname, end_lastname), ...]
+            the lastnames are None unless partitioning by lastname
+        """
+        first_page, last_page = self.get_page_range()
+        page_partitions = split_pages(first_page=first_page,
+                                      last_page=last_page,
+                                      num_partitions=self._arg_object.workers)
+
+        if self._arg_object.partition_by != PARTITION_BY_LASTNAMES:
+            return [(start_page, end_page, None, None)
+                    for start_page, end_page in page_partitions]
+
+        partitions = []
+        for first_lastname, end_lastname in self._page_index.split_lastnames(page_partitions):
+            page_range = self._page_index.get_page_range(first_lastname=first_lastname,
+                                                         end_lastname=end_lastname,
+                                                         first_page=first_page,
+                                                         last_page=last_page)
+            if page_range:
+                partitions.append(page_range + (first_lastname, end_lastname))
+        return partitions
+
+    def get_partition_args(self, worker_id, partition, attempt):
+        """
+            returns the arguments of one worker
+        """
+        partition_args = argparse.Namespace(**vars(self._arg_object))
+        partition_args.workers = 0
+        partition_args.worker_id = worker_id
+        (partition_args.start_page,
+         partition_args.end_page,
+         partition_args.first_lastname,
+         partition_args.end_lastname) = partition
+
+        if attempt > 1:
+            # get rid of the failed attempt's records
+            if partition_args.checkpoint_dir:
+                # like --resume on the command line: deleting the
+                # date's rows or the rows older than this attempt
+                # would remove the rows written before the checkpoint
+                partition_args.resume = True
+                partition_args.delete_existing = False
+                partition_args.cleanup_stale = False
+            elif (partition_args.sink == SINK_MYSQL
+                  and not partition_args.staging
+                  and partition_args.write_mode != WRITE_MODE_UPSERT):
+                partition_args.delete_existing = True
+        return partition_args
+
+    def _submit(self, worker_id, partition, attempt):
+        """
+            starts one attempt of a partition in a new process
+
+            returns (future, executor)
+        """
+        self._logger.info("Orchestrator starting worker %s (pages %s-%s), attempt %s",
+                          worker_id,
+                          partition[0],
+                          partition[1],
+                          attempt)
+        partition_args = self.get_partition_args(worker_id=worker_id,
+                                                 partition=partition,
+                                                 attempt=attempt)
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+        future = executor.submit(run_partition,
+                                 job_function=self._job_function,
+                                 arg_object=partition_args,
+                                 config=self._config)
+        return future, executor
+
+    def run(self):
+        """
+            Runs all partitions and
+            returns the merged MetricsCollector
+
+            raises OrchestratorException if a partition
+            failed max_attempts times
+        """
+        partitions = self.get_partitions()
+        self._logger.info("Orchestrator running pages %s-%s as %s partitions by %s",
+                          partitions[0][0],
+                          partitions[-1][1],
+                          len(partitions),
+                          self._arg_object.partition_by)
+
+        mcollector = MetricsCollector()
+        failed_partitions = []
+
+        # future -> (worker_id, partition, attempt, executor)
+        running = {}
+        try:
+            for worker_id, partition in enumerate(partitions, start=1):
+                future, executor = self._submit(worker_id, partition, attempt=1)
+                running[future] = (worker_id, partition, 1, executor)
+
+            while running:
+                done, _ = concurrent.futures.wait(running,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    worker_id, partition, attempt, executor = running.pop(future)
+                    executor.shutdown()
+                    try:
+                        mcollector.merge_state(future.result())
+                        self._logger.info("Orchestrator worker %s (pages %s-%s) complete",
+                                          worker_id,
+                                          partition[0],
+                                          partition[1])
+                    # BrokenProcessPool when the process died
+                    # pylint: disable=broad-except
+                    except Exception as error:
+                        self._logger.error("Orchestrator worker %s (pages %s-%s) "
+                                           "attempt %s failed: %r",
+                                           worker_id,
+                                           partition[0],
+                                           partition[1],
+                                           attempt,
+                                           error)
+                        if attempt < self._arg_object.max_attempts:
+                            retry, executor = self._submit(worker_id, partition,
+                                                           attempt=attempt + 1)
+                            running[retry] = (worker_id, partition, attempt + 1, executor)
+                        else:
+                            failed_partitions.append((worker_id, partition[0], partition[1]))
+        finally:
+            for _, _, _, executor in running.values():
+                executor.shutdown()
+
+        if failed_partitions:
+            raise OrchestratorException("Partitions failed after {} attempts: {}".format(
+                self._arg_object.max_attempts, failed_partitions))
+
+        mcollector.observe(name="orchestrator_partitions", value=len(partitions))
+        return mcollector
+
+# end
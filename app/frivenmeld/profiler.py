@@ -0,0 +1,285 @@
+"""
+    profiler.py
+
+    Profiles a run without code changes (--profile DIR)
+
+    Modes (--profile-modes, all by default):
+      - cpu: a cProfile per thread.  The main thread (melder,
+        combining engine and the writer without --writer-in-flight)
+        is profiled from start(); every thread started after
+        start() (loaders, WriterThreads) gets its own profile
+        through threading.setprofile().  Each is written to
+        profile_<thread>.pstats for pstats or snakeviz.
+      - memory: tracemalloc; the top allocation sites still
+        alive at the end of the run and the peak
+        go to memory_top.txt
+      - stacks: a StackSampler thread records the stacks of all
+        threads every interval and writes them in the folded
+        format of flamegraph.pl to stacks.folded.  It only
+        reads frames, so it is cheap enough for production-
+        scale runs where cProfile is too slow.
+
+    summary.txt has the top functions of every thread, the top
+    allocation sites and the functions the sampled stacks spent
+    the most time in.
+"""
+import collections
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import tracemalloc
+from frivenmeld.loggingsetup import APP_LOGNAME
+
+PROFILE_CPU = "cpu"
+PROFILE_MEMORY = "memory"
+PROFILE_STACKS = "stacks"
+PROFILE_MODES = [PROFILE_CPU, PROFILE_MEMORY, PROFILE_STACKS]
+
+DEFAULT_STACK_INTERVAL = 0.01
+# functions / allocation sites in the summary
+SUMMARY_TOP = 25
+# frames kept per allocation
+ALLOCATION_FRAMES = 10
+
+def parse_profile_modes(value):
+    """
+        "cpu,stacks" -> ['cpu', 'stacks']
+
+        raises ValueError for unknown modes
+    """
+    modes = [mode.strip() for mode in value.split(",") if mode.strip()]
+    unknown = sorted(set(modes) - set(PROFILE_MODES))
+    if unknown or not modes:
+        raise ValueError("Unknown profile modes {}, use {}".format(unknown,
+                                                                   ",".join(PROFILE_MODES)))
+    return modes
+
+def _file_name(thread_name):
+    """
+        thread name usable in a file name
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", thread_name)
+
+def _get_thread_name(thread):
+    """
+        e.g. FrivenLoader-Thread-1, so loaders with
+        default thread names can be told apart
+    """
+    class_name = type(thread).__name__
+    if type(thread).__module__ == threading.__name__ or thread.name.startswith(class_name):
+        return thread.name
+    return "{}-{}".format(class_name, thread.name)
+
+class StackSampler(threading.Thread):
+    """
+        Counts the stacks of all other threads every interval
+    """
+
+    def __init__(self, interval=DEFAULT_STACK_INTERVAL):
+        assert interval > 0
+
+        self._interval = interval
+        # "thread;outer function;...;inner function" -> samples
+        self._stacks = collections.Counter()
+        self._num_samples = 0
+        self._stop_event = threading.Event()
+        super(StackSampler, self).__init__(name="StackSampler", daemon=True)
+
+    def stop(self):
+        """
+            stop sampling and wait for the thread
+        """
+        self._stop_event.set()
+        self.join()
+
+    def sample(self):
+        """
+            records the current stack of every other thread
+        """
+        thread_names = {thread.ident: _get_thread_name(thread)
+                        for thread in threading.enumerate()}
+        # pylint: disable=protected-access
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            functions = []
+            while frame is not None:
+                code = frame.f_code
+                functions.append("{}:{}".format(os.path.basename(code.co_filename),
+                                                code.co_name))
+                frame = frame.f_back
+            functions.append(thread_names.get(ident, str(ident)))
+            self._stacks[";".join(reversed(functions))] += 1
+        self._num_samples += 1
+
+    def get_num_samples(self):
+        """
+            number of times the stacks were sampled
+        """
+        return self._num_samples
+
+    def get_stacks(self):
+        """
+            returns {folded stack: samples}
+        """
+        return dict(self._stacks)
+
+    def get_top_functions(self, top):
+        """
+            returns [(function, share of the samples), ...] of
+            the functions that were on the top of a stack most
+        """
+        functions = collections.Counter()
+        for stack, count in self._stacks.items():
+            functions[stack.rsplit(";", 1)[-1]] += count
+        total = sum(functions.values())
+        return [(function, count / total) for function, count in functions.most_common(top)]
+
+    def write_folded(self, path):
+        """
+            Saves the stacks in the folded format
+        """
+        with open(path, "w") as folded_file:
+            for stack, count in sorted(self._stacks.items()):
+                folded_file.write("{} {}\n".format(stack, count))
+
+    def run(self):
+        """
+            This is the method that
+            the thread's start()
+            method invokes
+        """
+        while not self._stop_event.wait(self._interval):
+            self.sample()
+
+# pylint: disable=too-many-instance-attributes
+class Profiler():
+    """
+        start() before the run, stop() after it
+        to write the profiles to output_dir
+    """
+
+    def __init__(self, output_dir, modes=None, stack_interval=DEFAULT_STACK_INTERVAL):
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._output_dir = output_dir
+        self._modes = modes or PROFILE_MODES
+        self._stack_interval = stack_interval
+        # thread name -> cProfile.Profile
+        self._profiles = {}
+        self._profiles_lock = threading.Lock()
+        self._stack_sampler = None
+
+    def _profile_new_thread(self, frame, event, arg):
+        """
+            threading.setprofile() hook, called on the first event of
+            every new thread: enabling a cProfile replaces the hook
+        """
+        # pylint: disable=unused-argument
+        profile = cProfile.Profile()
+        with self._profiles_lock:
+            self._profiles[_get_thread_name(threading.current_thread())] = profile
+        profile.enable()
+
+    def start(self):
+        """
+            starts the enabled modes
+        """
+        os.makedirs(self._output_dir, exist_ok=True)
+        self._logger.info("Profiling %s into %s", ",".join(self._modes), self._output_dir)
+
+        if PROFILE_MEMORY in self._modes:
+            tracemalloc.start(ALLOCATION_FRAMES)
+        if PROFILE_STACKS in self._modes:
+            self._stack_sampler = StackSampler(interval=self._stack_interval)
+            self._stack_sampler.start()
+        if PROFILE_CPU in self._modes:
+            threading.setprofile(self._profile_new_thread)
+            main_profile = cProfile.Profile()
+            self._profiles[_get_thread_name(threading.current_thread())] = main_profile
+            main_profile.enable()
+
+    def stop(self):
+        """
+            stops profiling and writes the
+            profiles and summary.txt
+        """
+        summary = io.StringIO()
+        if PROFILE_CPU in self._modes:
+            threading.setprofile(None)
+            self._profiles[_get_thread_name(threading.current_thread())].disable()
+            self._write_cpu_profiles(summary)
+        if PROFILE_MEMORY in self._modes:
+            self._write_memory_profile(summary)
+        if PROFILE_STACKS in self._modes:
+            self._stack_sampler.stop()
+            self._write_stack_profile(summary)
+
+        summary_path = os.path.join(self._output_dir, "summary.txt")
+        with open(summary_path, "w") as summary_file:
+            summary_file.write(summary.getvalue())
+        self._logger.info("Profile summary written to %s", summary_path)
+
+    def _write_cpu_profiles(self, summary):
+        """
+            one pstats file per thread and its top
+            functions by cumulative time in the summary
+        """
+        with self._profiles_lock:
+            profiles = sorted(self._profiles.items())
+
+        for thread_name, profile in profiles:
+            # snapshot_stats() instead of dump_stats(): dump_stats()
+            # disables the profiler of the calling thread
+            profile.snapshot_stats()
+            path = os.path.join(self._output_dir,
+                                "profile_{}.pstats".format(_file_name(thread_name)))
+            with open(path, "wb") as profile_file:
+                marshal.dump(profile.stats, profile_file)
+
+            summary.write("=== CPU {} ({}) ===\n".format(thread_name, path))
+            if profile.stats:
+                stats = pstats.Stats(path, stream=summary)
+                stats.sort_stats("cumulative").print_stats(SUMMARY_TOP)
+            else:
+                summary.write("no calls\n\n")
+
+    def _write_memory_profile(self, summary):
+        """
+            the top allocation sites by size
+        """
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+        lines = ["=== Memory: {:.1f} MB allocated at the end, {:.1f} MB peak ===".format(
+            current / 1048576, peak / 1048576)]
+        for statistic in snapshot.statistics("lineno")[:SUMMARY_TOP]:
+            lines.append(str(statistic))
+        text = "\n".join(lines) + "\n\n"
+
+        with open(os.path.join(self._output_dir, "memory_top.txt"), "w") as memory_file:
+            memory_file.write(text)
+        summary.write(text)
+
+    def _write_stack_profile(self, summary):
+        """
+            stacks.folded and the functions most
+            often on top of a sampled stack
+        """
+        path = os.path.join(self._output_dir, "stacks.folded")
+        self._stack_sampler.write_folded(path)
+
+        summary.write("=== Sampled stacks: {} samples ({}) ===\n".format(
+            self._stack_sampler.get_num_samples(), path))
+        for function, share in self._stack_sampler.get_top_functions(SUMMARY_TOP):
+            summary.write("{:6.1%} {}\n".format(share, function))
+        summary.write("\n")
+
+# end
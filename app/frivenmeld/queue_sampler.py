@@ -0,0 +1,118 @@
+"""
+    queue_sampler.py
+
+    Samples the TimedQueues registered with the
+    MetricsCollector on a background thread
+
+    Every interval it records, per queue:
+      - depth: items waiting
+      - put_seconds: time producers were blocked (queue full)
+        during the interval
+      - get_seconds: time consumers were blocked (queue empty)
+        during the interval
+      - memory_bytes: depth times the estimated size of the
+        item at the head of the queue
+
+    The series are stored in the MetricsCollector and end up
+    in the summary and in --metrics-report.
+
+    A queue that is mostly full with blocked producers is
+    saturated: its consumer is the bottleneck.  A queue that is
+    mostly empty with blocked consumers is starved: its producer
+    is.  A sample is a few counter reads and one item size
+    estimate, so the default interval of a second costs nothing
+    measurable.  When the series reach max_samples, pairs of
+    samples are merged and the interval doubles, so long runs
+    keep a bounded series that still covers the whole run.
+"""
+import logging
+import sys
+import threading
+import time
+from frivenmeld.loggingsetup import APP_LOGNAME
+
+DEFAULT_SAMPLE_INTERVAL = 1.0
+DEFAULT_MAX_SAMPLES = 1000
+
+def estimate_size(item):
+    """
+        bytes of an item and of the values it holds
+        (users are dicts, writer batches lists of tuples)
+
+        the elements of a list are assumed to be the
+        same size as its first one
+    """
+    size = sys.getsizeof(item)
+    if isinstance(item, dict):
+        size += sum(sys.getsizeof(value) for value in item.values())
+    elif isinstance(item, (list, tuple)) and item:
+        size += len(item) * estimate_size(item[0])
+    return size
+
+class QueueSampler(threading.Thread):
+    """
+        Records the depth, blocked time and memory
+        of the registered queues every interval
+    """
+
+    def __init__(self, metrics_collector, interval=DEFAULT_SAMPLE_INTERVAL,
+                 max_samples=DEFAULT_MAX_SAMPLES):
+        assert interval > 0
+        assert max_samples > 1
+
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._metrics_collector = metrics_collector
+        self._interval = interval
+        self._max_samples = max_samples
+        self._start_time = time.perf_counter()
+        # queue name -> (put_seconds, get_seconds) of the previous sample
+        self._previous = {}
+        self._num_samples = 0
+        self._stop_event = threading.Event()
+        super(QueueSampler, self).__init__(name="QueueSampler", daemon=True)
+
+    def stop(self):
+        """
+            takes a last sample and waits for the thread
+        """
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+    def sample(self):
+        """
+            records one sample of every registered queue
+        """
+        seconds = round(time.perf_counter() - self._start_time, 3)
+        for name, timed_queue in self._metrics_collector.get_queues().items():
+            stats = timed_queue.get_stats()
+            head = timed_queue.peek()
+            put_seconds, get_seconds = self._previous.get(name, (0.0, 0.0))
+            self._previous[name] = (stats['put_seconds'], stats['get_seconds'])
+
+            self._metrics_collector.add_queue_sample(
+                name=name,
+                sample={'seconds': seconds,
+                        'depth': stats['depth'],
+                        'put_seconds': stats['put_seconds'] - put_seconds,
+                        'get_seconds': stats['get_seconds'] - get_seconds,
+                        'memory_bytes': 0 if head is None
+                                        else stats['depth'] * estimate_size(head)})
+
+        self._num_samples += 1
+        if self._num_samples >= self._max_samples:
+            self._metrics_collector.thin_queue_samples()
+            self._num_samples = (self._num_samples + 1) // 2
+            self._interval *= 2
+            self._logger.debug("QueueSampler interval is now %s seconds", self._interval)
+
+    def run(self):
+        """
+            This is the method that
+            the thread's start()
+            method invokes
+        """
+        while not self._stop_event.wait(self._interval):
+            self.sample()
+
+# end
@@ -0,0 +1,102 @@
+"""
+    report_dates.py
+
+    Matches several report dates in one pass (--report-dates)
+
+    Of a match record, only report_date and the two activity
+    flags depend on the report date.  So the users are fetched
+    and matched once, for the first report date, and the
+    ReportDateFanOut sits between the combining engine and the
+    sink: it passes every match record on together with a copy
+    for each other report date, with that date's activity flags
+    (computed from the record's last active dates).
+"""
+import datetime
+from frivenmeld.date_cache import DateCache
+from frivenmeld.match_record import FIELD_INDEX
+
+IS_DOXIMITY_USER_ACTIVE = FIELD_INDEX["is_doximity_user_active"]
+IS_FRIENDLY_VENDOR_USER_ACTIVE = FIELD_INDEX["is_friendly_vendor_user_active"]
+REPORT_DATE = FIELD_INDEX["report_date"]
+DOXIMITY_LAST_ACTIVE_DATE = FIELD_INDEX["doximity_last_active_date"]
+FRIENDLY_VENDOR_LAST_ACTIVE_DATE = FIELD_INDEX["friendly_vendor_last_active_date"]
+
+def parse_report_dates(value):
+    """
+        "2017-02-01:2017-02-03,2017-02-10" ->
+        ['2017-02-01', '2017-02-02', '2017-02-03', '2017-02-10']
+
+        comma separated dates and inclusive first:last ranges,
+        returned sorted and without duplicates
+
+        raises ValueError for malformed dates or ranges
+    """
+    report_dates = set()
+    for item in value.split(","):
+        first, _, last = item.strip().partition(":")
+        first_date = datetime.datetime.strptime(first, "%Y-%m-%d").date()
+        last_date = first_date
+        if last:
+            last_date = datetime.datetime.strptime(last, "%Y-%m-%d").date()
+        if last_date < first_date:
+            raise ValueError("Report date range ends before it starts: '{}'".format(item))
+
+        while first_date <= last_date:
+            report_dates.add(str(first_date))
+            first_date += datetime.timedelta(days=1)
+    return sorted(report_dates)
+
+class ReportDateFanOut():
+    """
+        Takes the place of the sink for the combining engine,
+        and adds the records of the other report dates
+    """
+
+    def __init__(self, sink, report_dates):
+        """
+            report_dates: ['YYYY-MM-DD', ...], the first one is
+                          the report_date the engine matches for
+        """
+        self._sink = sink
+        # (report_date string, DateCache) of the other dates
+        self._other_dates = []
+        for report_date in report_dates[1:]:
+            date_cache = DateCache(report_date=datetime.datetime.strptime(report_date,
+                                                                          "%Y-%m-%d").date())
+            self._other_dates.append((report_date, date_cache))
+
+    def _fan_out(self, match_record, records):
+        """
+            appends the record and its copies for the other dates
+            (the two activity flags are next to each other)
+        """
+        records.append(match_record)
+        doximity_last_active_date = match_record[DOXIMITY_LAST_ACTIVE_DATE]
+        friven_last_active_date = match_record[FRIENDLY_VENDOR_LAST_ACTIVE_DATE]
+        for report_date, date_cache in self._other_dates:
+            records.append(
+                match_record[:IS_DOXIMITY_USER_ACTIVE]
+                + (date_cache.is_active(date_cache.parse(doximity_last_active_date)),
+                   date_cache.is_active(date_cache.parse(friven_last_active_date)))
+                + match_record[IS_FRIENDLY_VENDOR_USER_ACTIVE + 1:REPORT_DATE]
+                + (report_date,)
+                + match_record[REPORT_DATE + 1:])
+
+    def add_record(self, match_record):
+        """
+            Same as Sink.add_record()
+        """
+        records = []
+        self._fan_out(match_record, records)
+        self._sink.add_records(match_records=records)
+
+    def add_records(self, match_records):
+        """
+            Same as Sink.add_records()
+        """
+        records = []
+        for match_record in match_records:
+            self._fan_out(match_record, records)
+        self._sink.add_records(match_records=records)
+
+# end
@@ -0,0 +1,161 @@
+"""
+   file_sink.py
+
+   Sinks that write match records to gzip compressed files
+
+       CsvSink        .csv.gz    header line, one row per record
+       JsonlSink      .jsonl.gz  one JSON object per record
+       ColumnarSink   .cols.gz   one JSON line per batch holding
+                                 a list of values per field (a row
+                                 group), see read_row_groups()
+
+   Every row has the OUTPUT_FIELDS: the match record plus _worker_id.
+   Batches are serialized before the file lock is taken, so with
+   several background connections only the writes are serialized.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+from frivenmeld.sinks.sink import Sink
+from frivenmeld.sinks.sink import OUTPUT_FIELDS
+
+def format_csv(rows, header=False):
+    """
+        returns the rows as CSV text
+    """
+    text = io.StringIO()
+    writer = csv.writer(text, lineterminator="\n")
+    if header:
+        writer.writerow(OUTPUT_FIELDS)
+    writer.writerows(rows)
+    return text.getvalue()
+
+def format_jsonl(rows):
+    """
+        returns the rows as JSON lines
+    """
+    return "".join(json.dumps(dict(zip(OUTPUT_FIELDS, row)), separators=(",", ":")) + "\n"
+                   for row in rows)
+
+def format_row_group(rows):
+    """
+        returns the rows as one JSON line of columns
+    """
+    columns = list(zip(*rows)) if rows else [[] for _ in OUTPUT_FIELDS]
+    row_group = {'rows': len(rows),
+                 'columns': {field: list(column) for field, column in zip(OUTPUT_FIELDS, columns)}}
+    return json.dumps(row_group, separators=(",", ":")) + "\n"
+
+def read_row_groups(path):
+    """
+        yields {fieldname: [values]} for every
+        row group in a ColumnarSink file
+    """
+    with gzip.open(path, "rt", encoding="utf8") as columnar_file:
+        for line in columnar_file:
+            yield json.loads(line)['columns']
+
+class FileSink(Sink):
+    """
+        Base class of the gzip file sinks
+    """
+
+    # appended to the default file name
+    extension = None
+
+    def __init__(self, path):
+        super(FileSink, self).__init__()
+        self._path = path
+        self._file = None
+        self._file_lock = threading.Lock()
+
+    def get_path(self):
+        """
+            Accessor for the output file name
+        """
+        return self._path
+
+    def _get_throughput_name(self):
+        """
+            e.g. writer_csv
+        """
+        return "writer_{}".format(self.extension.split(".")[1])
+
+    def _header(self):
+        """
+            text written at the start of the file
+        """
+        return ""
+
+    def _serialize(self, rows):
+        """
+            returns the text for a batch of rows
+        """
+        raise NotImplementedError
+
+    def _write_records(self, match_records):
+        """
+            Appends a batch to the file
+        """
+        worker_id = (self._worker_id,)
+        text = self._serialize([match_record + worker_id for match_record in match_records])
+
+        with self._file_lock:
+            if self._file is None:
+                self._file = gzip.open(self._path, "wt", encoding="utf8", newline="")
+                self._file.write(self._header())
+            self._file.write(text)
+
+    def _close(self):
+        """
+            closes the file at the end of finish()
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._logger.info("%s wrote %s (%s bytes)",
+                              self.get_name(),
+                              self._path,
+                              os.path.getsize(self._path))
+
+class CsvSink(FileSink):
+    """
+        Writes a gzip compressed CSV file
+    """
+    extension = ".csv.gz"
+
+    def _header(self):
+        return format_csv([], header=True)
+
+    def _serialize(self, rows):
+        return format_csv(rows)
+
+class JsonlSink(FileSink):
+    """
+        Writes a gzip compressed JSON lines file
+    """
+    extension = ".jsonl.gz"
+
+    def _serialize(self, rows):
+        return format_jsonl(rows)
+
+class ColumnarSink(FileSink):
+    """
+        Writes a gzip compressed file of row groups
+    """
+    extension = ".cols.gz"
+
+    def _serialize(self, rows):
+        return format_row_group(rows)
+
+# --sink name -> class
+FILE_SINKS = {
+    'csv': CsvSink,
+    'jsonl': JsonlSink,
+    'columnar': ColumnarSink,
+}
+
+# end
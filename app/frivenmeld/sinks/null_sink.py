@@ -0,0 +1,52 @@
+"""
+   null_sink.py
+
+   A sink that serializes and times every batch, then
+   throws it away.  Measures the pipeline without a
+   database or disk in the way.
+"""
+import threading
+from frivenmeld.sinks.sink import Sink
+from frivenmeld.sinks.file_sink import format_csv
+
+SINK_NULL = "null"
+
+class NullSink(Sink):
+    """
+        Serializes each batch (as CSV by default) and discards it
+    """
+
+    def __init__(self, serialize=format_csv):
+        """
+            serialize: function(rows) -> text
+        """
+        super(NullSink, self).__init__()
+        self._serialize = serialize
+        self._serialized_bytes = 0
+        self._bytes_lock = threading.Lock()
+
+    def get_serialized_bytes(self):
+        """
+            Accessor for the size of everything serialized so far
+        """
+        return self._serialized_bytes
+
+    def _get_throughput_name(self):
+        return "writer_null"
+
+    def _write_records(self, match_records):
+        """
+            Serializes the batch and drops it
+        """
+        worker_id = (self._worker_id,)
+        text = self._serialize([match_record + worker_id for match_record in match_records])
+        with self._bytes_lock:
+            self._serialized_bytes += len(text)
+
+    def _close(self):
+        self._logger.info("NullSink serialized %s bytes", self._serialized_bytes)
+        if self._metrics_collector:
+            self._metrics_collector.observe(name="null_sink_serialized_bytes",
+                                            value=self._serialized_bytes)
+
+# end
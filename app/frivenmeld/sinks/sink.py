@@ -0,0 +1,265 @@
+"""
+   sink.py
+
+   Base class of the places match records are written to
+
+   A Sink buffers match records (tuples in MATCH_RECORD_FIELDS
+   order) and hands every full buffer to _write_records(),
+   either right away or on a WriterPool (see start_background()).
+   It times each batch, reports the throughput and tells the
+   batch listeners (e.g. a Checkpoint) when a batch is written.
+
+   Implementations:
+
+       MysqlWriter    frivenmeld/doximity/mysql_writer.py
+       CsvSink        frivenmeld/sinks/file_sink.py
+       JsonlSink      frivenmeld/sinks/file_sink.py
+       ColumnarSink   frivenmeld/sinks/file_sink.py
+       NullSink       frivenmeld/sinks/null_sink.py
+"""
+import logging
+import threading
+import time
+from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.match_record import MATCH_RECORD_FIELDS
+from frivenmeld.sinks.writer_thread import WriterPool
+from frivenmeld.sinks.writer_thread import WriterThreadException
+
+# --sink name of the MysqlWriter
+SINK_MYSQL = "mysql"
+
+# fields of an output row: the match record plus _worker_id
+OUTPUT_FIELDS = tuple(MATCH_RECORD_FIELDS) + ("_worker_id",)
+
+class SinkException(Exception):
+    """
+        Raised when a batch can not be written
+    """
+    pass
+
+# pylint: disable=too-many-instance-attributes
+class Sink():
+    """
+        Buffers match records and writes them in batches
+    """
+
+    # raised for failed writes, subclasses
+    # can use their own subclass of SinkException
+    exception_class = SinkException
+
+    def __init__(self):
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._write_buffer = None
+        self._batchsize = None
+        self._worker_id = 0
+        self._metrics_collector = None
+
+        # see add_batch_listener()
+        self._batch_listeners = []
+
+        # set by start_background()
+        self._writer_pool = None
+        self._num_connections = 1
+
+    def get_name(self):
+        """
+            used in logs and throughput metrics
+        """
+        return type(self).__name__
+
+    def set_worker_id(self, worker_id):
+        """
+            set the worker ID associated
+            with records created
+
+            use worker_id = 0 (default)
+            if you are not using multiple workers
+        """
+
+        self._worker_id = int(worker_id)
+
+        self._logger.info("%s _worker_id set to %s", self.get_name(), self._worker_id)
+
+    def set_metrics_collector(self, metrics_collector):
+        """
+            report rows written and time spent
+            writing to this MetricsCollector
+        """
+        self._metrics_collector = metrics_collector
+
+    def add_batch_listener(self, listener):
+        """
+            listener.batch_written(match_records) is called
+            after each batch has been written (and committed),
+            in the order the batches were added
+        """
+        self._batch_listeners.append(listener)
+
+    def init_queue(self, batchsize):
+        """
+            Instantiates the write buffer,
+            which is flushed every batchsize records
+        """
+        assert batchsize > 0
+
+        self._write_buffer = []
+        self._batchsize = batchsize
+        self._logger.info("%s configured with queue size %s",
+                          self.get_name(),
+                          batchsize)
+
+    def start_background(self, max_in_flight, num_connections=1):
+        """
+            Write batches on a WriterPool so the caller
+            can keep filling a new buffer while a full one
+            is written.  At most max_in_flight full buffers
+            wait before add_record() blocks.
+
+            num_connections: write this many batches at the same time
+
+            Call finish() at the end of the run.
+        """
+        assert self._writer_pool is None
+        self._num_connections = num_connections
+        self._writer_pool = WriterPool(flush_function=self._write_batch,
+                                       max_in_flight=max_in_flight,
+                                       num_threads=num_connections,
+                                       on_complete=self._batch_written)
+        self._writer_pool.start()
+        if self._metrics_collector:
+            self._metrics_collector.register_queue(
+                name="{}_queue".format(self._get_throughput_name()),
+                timed_queue=self._writer_pool.get_queue())
+        self._logger.info("%s writing in the background on %s connections "
+                          "with up to %s batches in flight",
+                          self.get_name(),
+                          num_connections,
+                          max_in_flight)
+
+    def finish(self):
+        """
+            Flush whatever is buffered and wait for
+            the background writes (if any) to complete
+
+            raises exception_class if any write failed
+        """
+        self.run_inserts()
+        if self._writer_pool:
+            try:
+                self._writer_pool.finish()
+            except WriterThreadException as error:
+                raise self.exception_class(error)
+            finally:
+                self._writer_pool = None
+                self._num_connections = 1
+        self._close()
+
+    def _close(self):
+        """
+            called at the end of finish()
+        """
+        pass
+
+    def _check_background_error(self):
+        """
+            raises exception_class as soon as a background
+            write failed, rather than at the next full buffer
+        """
+        if self._writer_pool:
+            try:
+                self._writer_pool.check_error()
+            except WriterThreadException as error:
+                raise self.exception_class(error)
+
+    def add_record(self, match_record):
+        """
+            Add a record (tuple in MATCH_RECORD_FIELDS order)
+            to the write buffer.
+            if the buffer is full (batchsize reached)
+            then run inserts
+        """
+        self._check_background_error()
+        self._write_buffer.append(match_record)
+        if len(self._write_buffer) >= self._batchsize:
+            self._logger.debug("%s Queue is full. Running inserts.", self.get_name())
+            self.run_inserts()
+
+    def add_records(self, match_records):
+        """
+            Add a batch of records to the write buffer
+        """
+        self._check_background_error()
+        for match_record in match_records:
+            self.add_record(match_record=match_record)
+
+    def run_inserts(self):
+        """
+            Hands the full buffer to the WriterPool
+            (or writes it right here if there is none)
+            and starts a new buffer
+        """
+
+        match_records = self._write_buffer
+        self._write_buffer = []
+
+        if not match_records:
+            # nothing in queue?
+            return
+
+        if self._writer_pool:
+            try:
+                self._writer_pool.submit(match_records)
+            except WriterThreadException as error:
+                raise self.exception_class(error)
+        else:
+            self._write_batch(match_records)
+            self._batch_written(match_records)
+
+    def _get_throughput_name(self):
+        """
+            name of the throughput metric
+        """
+        return "writer_{}".format(self.get_name().lower())
+
+    def _write_records(self, match_records):
+        """
+            Writes one batch, implemented by the subclasses
+        """
+        raise NotImplementedError
+
+    def _write_batch(self, match_records):
+        """
+            Writes a batch and reports the throughput
+        """
+        start_time = time.perf_counter()
+
+        self._write_records(match_records)
+
+        seconds = time.perf_counter() - start_time
+        self._logger.info("%s wrote %s rows in %.3f seconds (%.0f rows/sec)",
+                          self.get_name(),
+                          len(match_records),
+                          seconds,
+                          len(match_records) / seconds if seconds else 0)
+        if self._metrics_collector:
+            throughput_name = self._get_throughput_name()
+            self._metrics_collector.add_throughput(name=throughput_name,
+                                                   count=len(match_records),
+                                                   seconds=seconds)
+            self._metrics_collector.add_latency(name=throughput_name, seconds=seconds)
+            if self._num_connections > 1:
+                # per connection, e.g. writer_insert_WriterThread-2
+                self._metrics_collector.add_throughput(
+                    name="{}_{}".format(throughput_name, threading.current_thread().name),
+                    count=len(match_records),
+                    seconds=seconds)
+
+    def _batch_written(self, match_records):
+        """
+            tells the listeners a batch was written
+            (batches arrive here in the order they were added)
+        """
+        for listener in self._batch_listeners:
+            listener.batch_written(match_records)
+
+# end
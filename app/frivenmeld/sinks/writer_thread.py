@@ -0,0 +1,202 @@
+"""
+   writer_thread.py
+
+   Runs Sink flushes on their own thread
+
+   A Sink (e.g. the MysqlWriter) hands over a full buffer of
+   match records and immediately starts filling a new one,
+   while this thread writes it (e.g. runs the INSERT and commit).  At most max_in_flight
+   batches wait in the queue; when it is full, submit() blocks,
+   which is the backpressure that keeps memory bounded when
+   the database is slower than matching.
+
+   A WriterPool runs several WriterThreads on one queue, so
+   that many batches are written at the same time, each on
+   its own connection.  After the first failed flush, every
+   thread of the pool drops the batches still queued.
+"""
+import logging
+import queue
+import threading
+from frivenmeld.loggingsetup import APP_LOGNAME
+from frivenmeld.timed_queue import TimedQueue
+
+class WriterThreadException(Exception):
+    """
+        Raised on the main thread when a flush failed
+    """
+    pass
+
+class WriterThread(threading.Thread):
+    """
+        Calls flush_function(batch) for every
+        submitted batch, in order, on its own thread
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, flush_function, max_in_flight, batch_queue=None, name="WriterThread",
+                 stop_event=None):
+        """
+            batch_queue: share this queue with other
+            WriterThreads instead of creating one
+            stop_event: threading.Event shared with those
+            WriterThreads, set by the first failed flush
+        """
+        assert max_in_flight > 0
+
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._flush_function = flush_function
+        if batch_queue is None:
+            batch_queue = queue.Queue(maxsize=max_in_flight)
+        self._batch_queue = batch_queue
+        if stop_event is None:
+            stop_event = threading.Event()
+        self._stop_event = stop_event
+        self._error = None
+        self._num_dropped = 0
+        super(WriterThread, self).__init__(name=name, daemon=True)
+
+    def check_error(self):
+        """
+            re-raises a failed flush on the calling thread
+        """
+        if self._error is not None:
+            raise WriterThreadException(self._error)
+
+    def submit(self, batch):
+        """
+            Queue a batch for flushing
+            Blocks while max_in_flight batches are waiting
+        """
+        self.check_error()
+        self._batch_queue.put(batch)
+
+    def finish(self):
+        """
+            Wait for all submitted batches to be flushed
+            and stop the thread
+        """
+        self._batch_queue.put(None)
+        self.join()
+        self.check_error()
+
+    def run(self):
+        """
+            This is the method that
+            the thread's start()
+            method invokes
+        """
+        while True:
+            batch = self._batch_queue.get()
+            if batch is None:
+                if self._num_dropped:
+                    self._logger.warning("%s dropped %s batches after a failed flush",
+                                         self.name,
+                                         self._num_dropped)
+                self._logger.info("%s finished", self.name)
+                return
+
+            if self._stop_event.is_set():
+                # keep draining so submit() never blocks forever,
+                # the error is raised on the next submit() or finish()
+                self._num_dropped += 1
+                continue
+
+            try:
+                self._flush_function(batch)
+            # pylint: disable=broad-except
+            except Exception as error:
+                self._logger.error("%s flush failed: %s", self.name, error)
+                self._error = error
+                self._stop_event.set()
+
+class WriterPool():
+    """
+        Calls flush_function(batch) for every submitted
+        batch on one of num_threads WriterThreads.
+
+        Batches finish out of order, but on_complete(batch)
+        is called in submit order, and only for batches whose
+        predecessors were all flushed successfully
+    """
+    def __init__(self, flush_function, max_in_flight, num_threads, on_complete=None):
+        assert num_threads > 0
+
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._flush_function = flush_function
+        self._on_complete = on_complete
+        self._batch_queue = TimedQueue(maxsize=max_in_flight)
+        # set by the first failed flush of any thread
+        self._stop_event = threading.Event()
+        self._threads = [WriterThread(flush_function=self._flush,
+                                      max_in_flight=max_in_flight,
+                                      batch_queue=self._batch_queue,
+                                      name="WriterThread-{}".format(index),
+                                      stop_event=self._stop_event)
+                         for index in range(num_threads)]
+
+        # sequence number -> batch, for batches flushed
+        # before the ones submitted ahead of them
+        self._completed = {}
+        self._next_submit = 0
+        self._next_complete = 0
+        self._complete_lock = threading.Lock()
+
+    def get_queue(self):
+        """
+            Accessor for the batch queue
+            (the WriterThreads block on get() when idle)
+        """
+        return self._batch_queue
+
+    def start(self):
+        """
+            Starts the threads
+        """
+        for writer_thread in self._threads:
+            writer_thread.start()
+
+    def check_error(self):
+        """
+            re-raises the first failed flush on the calling thread
+            (cheap enough to call for every record)
+        """
+        if self._stop_event.is_set():
+            for writer_thread in self._threads:
+                writer_thread.check_error()
+
+    def submit(self, batch):
+        """
+            Queue a batch for flushing
+            Blocks while max_in_flight batches are waiting
+        """
+        self.check_error()
+        self._batch_queue.put((self._next_submit, batch))
+        self._next_submit += 1
+
+    def finish(self):
+        """
+            Wait for all submitted batches to be flushed
+            and stop the threads
+        """
+        for _ in self._threads:
+            self._batch_queue.put(None)
+        for writer_thread in self._threads:
+            writer_thread.join()
+        self.check_error()
+
+    def _flush(self, item):
+        """
+            runs on a WriterThread
+        """
+        sequence, batch = item
+        self._flush_function(batch)
+
+        with self._complete_lock:
+            self._completed[sequence] = batch
+            while self._next_complete in self._completed:
+                completed_batch = self._completed.pop(self._next_complete)
+                self._next_complete += 1
+                if self._on_complete:
+                    self._on_complete(completed_batch)
+
+# end
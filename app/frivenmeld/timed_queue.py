@@ -0,0 +1,99 @@
+"""
+    timed_queue.py
+
+    queue.Queue that keeps track of the time its
+    producers and consumers spend in put() and get()
+
+    put() blocks while the queue is full and get() while it
+    is empty, so the time spent in them tells whether a
+    stage is starved (its consumers wait) or saturated (its
+    producers wait).  Two perf_counter() calls per operation
+    are cheap enough to leave on.
+
+    A loader puts END_OF_DATA after its last user, so its
+    consumer (see get_item()) stops right away instead of
+    waiting for the timeout that catches stalled producers.
+"""
+import queue
+import threading
+import time
+
+# put by a producer after its last item
+END_OF_DATA = "END_OF_DATA"
+
+class EndOfData(queue.Empty):
+    """
+        Raised by get_item() when the producer is done
+        (a queue.Empty, so timeouts and the end are
+        handled the same way)
+    """
+    pass
+
+def get_item(item_queue, timeout):
+    """
+        item_queue.get(timeout=timeout), but raises
+        EndOfData for END_OF_DATA and leaves it in the
+        queue for the next get_item()
+    """
+    item = item_queue.get(timeout=timeout)
+    if item is END_OF_DATA:
+        # the producer is done, so there is room for it
+        item_queue.put_nowait(END_OF_DATA)
+        raise EndOfData()
+    return item
+
+class TimedQueue(queue.Queue):
+    """
+        Drop-in replacement for queue.Queue
+    """
+
+    def __init__(self, maxsize=0):
+        super(TimedQueue, self).__init__(maxsize=maxsize)
+        self._stats_lock = threading.Lock()
+        self._num_puts = 0
+        self._num_gets = 0
+        self._put_seconds = 0.0
+        self._get_seconds = 0.0
+
+    def put(self, item, block=True, timeout=None):
+        start_time = time.perf_counter()
+        try:
+            super(TimedQueue, self).put(item, block=block, timeout=timeout)
+        finally:
+            seconds = time.perf_counter() - start_time
+            with self._stats_lock:
+                self._num_puts += 1
+                self._put_seconds += seconds
+
+    def get(self, block=True, timeout=None):
+        start_time = time.perf_counter()
+        try:
+            return super(TimedQueue, self).get(block=block, timeout=timeout)
+        finally:
+            seconds = time.perf_counter() - start_time
+            with self._stats_lock:
+                self._num_gets += 1
+                self._get_seconds += seconds
+
+    def peek(self):
+        """
+            returns the next item without removing it
+            (None if the queue is empty)
+        """
+        with self.mutex:
+            return self.queue[0] if self.queue else None
+
+    def get_stats(self):
+        """
+            returns the puts and gets so far, the seconds
+            spent in them, and the current depth
+        """
+        with self._stats_lock:
+            return {'puts': self._num_puts,
+                    'gets': self._num_gets,
+                    'put_seconds': self._put_seconds,
+                    'get_seconds': self._get_seconds,
+                    'depth': self.qsize(),
+                    'maxsize': self.maxsize}
+
+# end
@@ -0,0 +1,346 @@
+"""
+    work_queue.py
+
+    Lease-based queue of page chunks that any number of
+    driver processes can work through (--work-queue)
+
+    The report date's page range is split into small chunks,
+    stored in an SQLite file.  A worker claims the next chunk by
+    taking a lease on it, runs it, and marks it complete.  While
+    the chunk runs, a LeaseKeeper thread renews the lease.  If
+    the worker dies, its lease expires and the next claim
+    dispatches the chunk again.  A worker that failed releases
+    its chunk right away.  A chunk that fails max_attempts times
+    is marked failed and not dispatched again.
+
+    Fast workers just claim more chunks, so the job ends when
+    all the work is done, not when the slowest static page
+    range is done.
+
+    SQLite is a local stand-in for a coordinator: every
+    operation is one short "begin immediate" transaction, so
+    processes on one host (or on hosts that share a file
+    system with working locks) can share the file.
+"""
+import collections
+import logging
+import sqlite3
+import threading
+import time
+from frivenmeld.loggingsetup import APP_LOGNAME
+
+DEFAULT_CHUNK_PAGES = 10
+DEFAULT_LEASE_SECONDS = 600
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_COMPLETE = "complete"
+STATUS_FAILED = "failed"
+
+# seconds to wait for another process's transaction
+SQLITE_TIMEOUT = 60
+
+WorkChunk = collections.namedtuple("WorkChunk", ["chunk_id", "start_page", "end_page", "attempt"])
+
+class WorkQueueException(Exception):
+    """
+        Raised when the queue can not be used
+    """
+    pass
+
+class WorkQueue():
+    """
+        Page chunks of one or more report dates
+        in an SQLite file
+    """
+
+    def __init__(self, path, max_attempts, clock=time.time):
+        """
+            max_attempts: a chunk is failed after this many
+            released or expired leases
+
+            clock: returns the current time in seconds
+        """
+        assert max_attempts > 0
+
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._path = path
+        self._max_attempts = max_attempts
+        self._clock = clock
+        self._create_table()
+
+    def get_path(self):
+        """
+            Accessor for the queue file name
+        """
+        return self._path
+
+    def _connect(self):
+        """
+            a new connection for every operation, so the
+            queue can be used from any thread
+
+            isolation_level=None: we begin our own transactions
+        """
+        try:
+            return sqlite3.connect(self._path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+        except sqlite3.Error as error:
+            raise WorkQueueException("Can not open work queue {}: {}".format(self._path, error))
+
+    def _transaction(self, function):
+        """
+            runs function(cursor) in a write transaction
+            and returns its result
+        """
+        connection = self._connect()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("begin immediate")
+            try:
+                result = function(cursor)
+            except Exception:
+                cursor.execute("rollback")
+                raise
+            cursor.execute("commit")
+            return result
+        finally:
+            connection.close()
+
+    def _create_table(self):
+        """
+            creates the chunk table if it does not exist
+        """
+        def create(cursor):
+            cursor.execute("""
+                create table if not exists work_chunk (
+                    chunk_id integer primary key,
+                    report_date text not null,
+                    start_page integer not null,
+                    end_page integer not null,
+                    status text not null,
+                    owner text,
+                    lease_expires real,
+                    attempts integer not null default 0,
+                    last_error text,
+                    unique (report_date, start_page)
+                )""")
+        self._transaction(create)
+
+    def add_chunks(self, report_date, first_page, last_page, chunk_pages):
+        """
+            adds first_page - last_page in chunks of chunk_pages
+
+            Every worker can call this: chunks that
+            are already there are left alone
+
+            returns the number of chunks added
+        """
+        assert first_page <= last_page
+        assert chunk_pages > 0
+
+        def add(cursor):
+            added = 0
+            for start_page in range(first_page, last_page + 1, chunk_pages):
+                cursor.execute("""
+                    insert or ignore into work_chunk
+                        (report_date, start_page, end_page, status)
+                    values (?, ?, ?, ?)""",
+                               (report_date,
+                                start_page,
+                                min(start_page + chunk_pages - 1, last_page),
+                                STATUS_PENDING))
+                added += cursor.rowcount
+            return added
+
+        added = self._transaction(add)
+        self._logger.info("WorkQueue added %s chunks of pages %s-%s for %s",
+                          added,
+                          first_page,
+                          last_page,
+                          report_date)
+        return added
+
+    def claim(self, report_date, owner, lease_seconds):
+        """
+            leases the next pending chunk (or one whose
+            lease has expired) to owner
+
+            returns a WorkChunk, or None when there is nothing to claim
+        """
+        def claim_chunk(cursor):
+            now = self._clock()
+
+            # expired leases count as attempts, the
+            # chunk may be what kills its workers
+            cursor.execute("""
+                update work_chunk
+                   set status = case when attempts >= ? then ? else ? end,
+                       owner = null,
+                       lease_expires = null,
+                       last_error = 'lease expired'
+                 where report_date = ?
+                   and status = ?
+                   and lease_expires < ?""",
+                           (self._max_attempts,
+                            STATUS_FAILED,
+                            STATUS_PENDING,
+                            report_date,
+                            STATUS_LEASED,
+                            now))
+            if cursor.rowcount:
+                self._logger.warning("WorkQueue %s leases expired", cursor.rowcount)
+
+            cursor.execute("""
+                select chunk_id, start_page, end_page, attempts
+                  from work_chunk
+                 where report_date = ?
+                   and status = ?
+                 order by start_page
+                 limit 1""",
+                           (report_date, STATUS_PENDING))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+
+            chunk = WorkChunk(chunk_id=row[0], start_page=row[1], end_page=row[2],
+                              attempt=row[3] + 1)
+            cursor.execute("""
+                update work_chunk
+                   set status = ?,
+                       owner = ?,
+                       lease_expires = ?,
+                       attempts = ?
+                 where chunk_id = ?""",
+                           (STATUS_LEASED,
+                            owner,
+                            now + lease_seconds,
+                            chunk.attempt,
+                            chunk.chunk_id))
+            return chunk
+
+        chunk = self._transaction(claim_chunk)
+        if chunk:
+            self._logger.info("WorkQueue leased pages %s-%s to %s (attempt %s)",
+                              chunk.start_page,
+                              chunk.end_page,
+                              owner,
+                              chunk.attempt)
+        return chunk
+
+    def _update_lease(self, chunk, owner, set_sql, params):
+        """
+            updates the chunk if owner still holds its lease
+
+            returns False if the lease was lost
+        """
+        def update(cursor):
+            cursor.execute("""
+                update work_chunk
+                   set {set_sql}
+                 where chunk_id = ?
+                   and status = ?
+                   and owner = ?""".format(set_sql=set_sql),
+                           list(params) + [chunk.chunk_id, STATUS_LEASED, owner])
+            return cursor.rowcount == 1
+
+        return self._transaction(update)
+
+    def renew(self, chunk, owner, lease_seconds):
+        """
+            extends the lease
+
+            returns False if the lease was lost
+        """
+        return self._update_lease(chunk, owner,
+                                  set_sql="lease_expires = ?",
+                                  params=[self._clock() + lease_seconds])
+
+    def complete(self, chunk, owner):
+        """
+            marks the chunk complete
+
+            returns False if the lease was lost (the
+            chunk may be running somewhere else)
+        """
+        is_complete = self._update_lease(chunk, owner,
+                                         set_sql="status = ?, lease_expires = null",
+                                         params=[STATUS_COMPLETE])
+        if not is_complete:
+            self._logger.warning("WorkQueue lease of pages %s-%s was lost before completion",
+                                 chunk.start_page,
+                                 chunk.end_page)
+        return is_complete
+
+    def release(self, chunk, owner, error):
+        """
+            gives a failed chunk back, or fails it
+            after max_attempts
+        """
+        status = STATUS_FAILED if chunk.attempt >= self._max_attempts else STATUS_PENDING
+        self._update_lease(chunk, owner,
+                           set_sql="status = ?, owner = null, lease_expires = null, "
+                                   "last_error = ?",
+                           params=[status, str(error)])
+        self._logger.warning("WorkQueue pages %s-%s attempt %s failed (%s), now %s",
+                             chunk.start_page,
+                             chunk.end_page,
+                             chunk.attempt,
+                             error,
+                             status)
+
+    def get_progress(self, report_date):
+        """
+            returns {status: number of chunks}
+        """
+        def count(cursor):
+            cursor.execute("""
+                select status, count(*)
+                  from work_chunk
+                 where report_date = ?
+                 group by status""",
+                           (report_date,))
+            return dict(cursor.fetchall())
+
+        return self._transaction(count)
+
+class LeaseKeeper(threading.Thread):
+    """
+        Renews the lease of a running chunk
+        every third of the lease time
+    """
+
+    def __init__(self, work_queue, chunk, owner, lease_seconds):
+        self._logger = logging.getLogger(APP_LOGNAME)
+        self._work_queue = work_queue
+        self._chunk = chunk
+        self._owner = owner
+        self._lease_seconds = lease_seconds
+        self._stop_event = threading.Event()
+        super(LeaseKeeper, self).__init__(name="LeaseKeeper", daemon=True)
+
+    def stop(self):
+        """
+            stop renewing and wait for the thread
+        """
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        """
+            This is the method that
+            the thread's start()
+            method invokes
+        """
+        while not self._stop_event.wait(self._lease_seconds / 3):
+            try:
+                if not self._work_queue.renew(self._chunk, self._owner, self._lease_seconds):
+                    self._logger.warning("LeaseKeeper lost the lease of pages %s-%s",
+                                         self._chunk.start_page,
+                                         self._chunk.end_page)
+                    return
+            # pylint: disable=broad-except
+            except Exception as error:
+                # try again next time, the lease is still good for a while
+                self._logger.error("LeaseKeeper could not renew the lease: %s", error)
+
+# end
@@ -0,0 +1,18 @@
+#!/bin/sh
+#
+# run_benchmarks.sh
+#
+# Runs the micro-benchmarks
+# in the ./benchmark/ directory
+#
+# Note: run ./setup.sh first
+#
+source venv/bin/activate
+pip install -e .
+
+python benchmark/bench_normalization.py
+python benchmark/bench_batch_combine.py
+python benchmark/bench_sinks.py
+
+# needs the target database (source local_env.sh first)
+#python benchmark/bench_writer_modes.py
@@ -19,20 +19,16 @@ source venv/bin/activate
 # delete-existing will allow you to re-run the report
 # runs 2017-02-03 instead of 2017-02-02 so it does not conflict
 # with records created by running the job in single worker mode.
+#
+# --workers splits the pages into 3 balanced partitions
+# (worker ids 1-3), runs them in a process pool, retries
+# failed partitions and prints one combined summary.
+#
+# --metrics-report and --metrics-prometheus save the combined
+# metrics as JSON and in the Prometheus text format. Reports of
+# workers run separately (--workerid) can be merged with
+# python frivenmeld/metrics_export.py --json all.json w1.json w2.json
 
-echo "kicking off worker 1 (See /tmp/worker1.log)"
-python frivenmeld/driver.py --report-date=2017-02-03 --delete-existing --workerid=1 --startpage=1   --endpage=50  > /tmp/worker1.log 2>&1 &
-
-echo "kicking off worker 2 (See /tmp/worker2.log)"
-python frivenmeld/driver.py --report-date=2017-02-03 --delete-existing --workerid=2 --startpage=51  --endpage=100 > /tmp/worker2.log 2>&1 &
-
-echo "kicking off worker 3 (See /tmp/worker3.log)"
-python frivenmeld/driver.py --report-date=2017-02-03 --delete-existing --workerid=3 --startpage=101               > /tmp/worker3.log 2>&1 &
-
-echo "waiting for all workers to finish"
-wait $(jobs -p)
-
-echo "all workers complete."
-
-grep "Elapsed Time" /tmp/worker[123].log
-grep "Total Matches" /tmp/worker[123].log
+python frivenmeld/driver.py --report-date=2017-02-03 --delete-existing --workers=3 \
+    --metrics-report=metrics_2017-02-03.json \
+    --metrics-prometheus=metrics_2017-02-03.prom
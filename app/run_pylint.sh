@@ -14,19 +14,76 @@ source venv/bin/activate
 pylint frivenmeld/friendly_vendor/__init__.py
 pylint frivenmeld/friendly_vendor/friven_loader.py
 pylint frivenmeld/friendly_vendor/friendly_vendor_api.py
+pylint frivenmeld/friendly_vendor/page_index.py
 pylint frivenmeld/combining_engine.py
+pylint frivenmeld/batch_combining_engine.py
+pylint frivenmeld/fuzzy_combining_engine.py
 pylint frivenmeld/driver.py
+pylint frivenmeld/arguments.py
 pylint frivenmeld/loggingsetup.py
 pylint frivenmeld/melder.py
+pylint frivenmeld/fan_out_melder.py
 pylint frivenmeld/__init__.py
 pylint frivenmeld/metrics_collector.py
+pylint frivenmeld/latency_histogram.py
+pylint frivenmeld/timed_queue.py
+pylint frivenmeld/queue_sampler.py
+pylint frivenmeld/metrics_export.py
+pylint frivenmeld/profiler.py
+pylint frivenmeld/normalizer.py
+pylint frivenmeld/category_encoder.py
+pylint frivenmeld/date_cache.py
+pylint frivenmeld/match_record.py
+pylint frivenmeld/checkpoint.py
+pylint frivenmeld/orchestrator.py
+pylint frivenmeld/work_queue.py
+pylint frivenmeld/group_state.py
+pylint frivenmeld/incremental_combining_engine.py
+pylint frivenmeld/report_dates.py
 pylint frivenmeld/doximity/__init__.py
 pylint frivenmeld/doximity/mysql_writer.py
 pylint frivenmeld/doximity/mysql_loader.py
+pylint frivenmeld/sinks/__init__.py
+pylint frivenmeld/sinks/sink.py
+pylint frivenmeld/sinks/file_sink.py
+pylint frivenmeld/sinks/null_sink.py
+pylint frivenmeld/sinks/writer_thread.py
+pylint frivenmeld/doximity/insert_chunker.py
+pylint frivenmeld/doximity/staging_table.py
 
 pylint tests/friendly_vendor/test_friendly_vendor_api.py
+pylint tests/friendly_vendor/test_page_index.py
+pylint tests/sinks/test_writer_thread.py
+pylint tests/sinks/test_file_sink.py
+pylint tests/doximity/test_mysql_writer.py
+pylint tests/doximity/test_insert_chunker.py
+pylint tests/doximity/test_staging_table.py
 pylint tests/test_metrics_collector.py
+pylint tests/test_latency_histogram.py
+pylint tests/test_timed_queue.py
+pylint tests/test_queue_sampler.py
+pylint tests/test_metrics_export.py
+pylint tests/test_profiler.py
 pylint tests/test_loggingsetup.py
 pylint tests/test_melder.py
+pylint tests/test_fan_out_melder.py
+pylint tests/test_normalizer.py
+pylint tests/test_category_encoder.py
+pylint tests/test_date_cache.py
+pylint tests/test_match_record.py
+pylint tests/test_batch_combining_engine.py
+pylint tests/test_fuzzy_combining_engine.py
+pylint tests/test_checkpoint.py
+pylint tests/test_orchestrator.py
+pylint tests/test_work_queue.py
+pylint tests/test_driver.py
+pylint tests/test_group_state.py
+pylint tests/test_incremental_combining_engine.py
+pylint tests/test_report_dates.py
 
 pylint validation/validation_test.py
+
+pylint benchmark/bench_normalization.py
+pylint benchmark/bench_batch_combine.py
+pylint benchmark/bench_writer_modes.py
+pylint benchmark/bench_sinks.py
@@ -10,8 +10,11 @@ show table status like 'friendly_vendor_match';
 
 -- drop table friendly_vendor_match;
 
+-- partitioned by report_date, one partition per date named
+-- p<YYYYMMDD>, so --staging exchange can publish a date in one
+-- step.  Every key must hold report_date to partition by it.
 create table friendly_vendor_match (
-    friendly_vendor_match_id        bigint unsigned not null auto_increment primary key,
+    friendly_vendor_match_id        bigint unsigned not null auto_increment,
     doximity_user_id                   int unsigned not null,
     friendly_vendor_user_id            int unsigned not null,
     is_doximity_user_active        tinyint unsigned not null,
@@ -26,10 +29,17 @@ create table friendly_vendor_match (
     _friendly_vendor_page              int unsigned not null,
     _friendly_vendor_row               int unsigned not null,
     _create_time                 timestamp not null default current_timestamp,
+    primary key(friendly_vendor_match_id, report_date),
     index(report_date, _worker_id),
     unique(report_date, doximity_user_id, friendly_vendor_user_id)
+)
+partition by list columns(report_date) (
+    partition p20170202 values in ('2017-02-02')
 );
 
+-- every report date needs its partition before it is loaded:
+-- alter table friendly_vendor_match add partition (partition p20170203 values in ('2017-02-03'));
+
 show table status like 'friendly_vendor_match';
 
 select current_timestamp;
@@ -5,5 +5,5 @@
 -- 
 GRANT USAGE ON *.* TO 'de_candidate'@'%' IDENTIFIED BY PASSWORD '*3F486E34372BBBE2A77C2AD3168BFE88ACFA076F';
 GRANT SELECT ON `data_engineer`.`user` TO 'de_candidate'@'%';
-GRANT insert, delete, select on data_engineer.* to 'de_candidate'@'%';  
+GRANT insert, update, delete, select, create, drop, alter, index on data_engineer.* to 'de_candidate'@'%';  
 
@@ -0,0 +1,57 @@
+"""
+    test_insert_chunker.py
+
+    unit tests for insert_chunker.py
+"""
+from frivenmeld.doximity.insert_chunker import InsertChunker
+
+def _make_chunker(**kwargs):
+    """
+        chunker for a three column table
+    """
+    return InsertChunker(statement_prefix="INSERT INTO t (a, b, c) values",
+                         row_template="(%s, %s, 7)",
+                         **kwargs)
+
+def test_statement_cached():
+    """
+        statements are rendered once per row count
+    """
+    chunker = _make_chunker()
+    statement = chunker.get_statement(3)
+    assert statement == "INSERT INTO t (a, b, c) values\n(%s, %s, 7),\n(%s, %s, 7),\n(%s, %s, 7)"
+    assert chunker.get_statement(3) is statement
+
+def test_chunks_fit_packet():
+    """
+        no chunk is larger than the packet allows
+    """
+    chunker = _make_chunker(initial_rows=1000, max_rows=1000)
+    chunker.set_max_packet_bytes(1000)
+    records = [(index, "x" * 10) for index in range(100)]
+
+    chunks = list(chunker.chunks(records))
+    assert sum(len(chunk) for chunk in chunks) == 100
+    for chunk in chunks:
+        rendered = chunker.get_statement(len(chunk)).replace("%s", "x" * 14)
+        assert len(rendered) <= 1000
+
+def test_tuning():
+    """
+        fast statements grow, slow statements shrink
+    """
+    chunker = _make_chunker(initial_rows=100, min_rows=50, max_rows=400, target_seconds=1.0)
+    chunker.record_execution(num_rows=100, seconds=0.1)
+    assert chunker.get_rows_per_statement() == 200
+    chunker.record_execution(num_rows=200, seconds=1.0)
+    assert chunker.get_rows_per_statement() == 200
+    chunker.record_execution(num_rows=200, seconds=5.0)
+    assert chunker.get_rows_per_statement() == 100
+
+    # short tail chunks do not count
+    chunker.record_execution(num_rows=3, seconds=5.0)
+    assert chunker.get_rows_per_statement() == 100
+
+    for _ in range(5):
+        chunker.record_execution(num_rows=chunker.get_rows_per_statement(), seconds=0.0)
+    assert chunker.get_rows_per_statement() == 400
@@ -0,0 +1,231 @@
+"""
+    test_mysql_writer.py
+
+    unit tests for mysql_writer.py (dry run, no database)
+"""
+import pytest
+from frivenmeld.doximity.mysql_writer import MysqlWriter
+from frivenmeld.doximity.mysql_writer import MysqlWriterException
+from frivenmeld.doximity.mysql_writer import WRITE_MODES
+from frivenmeld.doximity.mysql_writer import WRITE_MODE_UPSERT
+from frivenmeld.doximity.mysql_writer import format_load_value
+from frivenmeld.doximity.staging_table import PUBLISH_COPY
+from frivenmeld.doximity.staging_table import PUBLISH_EXCHANGE
+from frivenmeld.metrics_collector import MetricsCollector
+
+@pytest.fixture()
+def mysql_writer():
+    """
+        Fixture of a dry run MysqlWriter
+    """
+    writer = MysqlWriter(host=None,
+                         port=None,
+                         database=None,
+                         username=None,
+                         password=None)
+    writer.init_queue(batchsize=3)
+    writer.set_dry_run(is_dry_run=True)
+    return writer
+
+def test_format_load_value():
+    """
+        values are escaped for LOAD DATA
+    """
+    assert format_load_value(12) == "12"
+    assert format_load_value("2017-02-02") == "2017-02-02"
+    assert format_load_value(None) == "\\N"
+    assert format_load_value("a\tb\nc\\") == "a\\tb\\nc\\\\"
+
+# pylint: disable=redefined-outer-name
+@pytest.mark.parametrize("write_mode", WRITE_MODES)
+def test_write_modes(mysql_writer, write_mode):
+    """
+        every write mode reports its throughput
+    """
+    mcollector = MetricsCollector()
+    mysql_writer.set_write_mode(write_mode=write_mode)
+    mysql_writer.set_metrics_collector(metrics_collector=mcollector)
+    for index in range(7):
+        mysql_writer.add_record(match_record=tuple(range(index, index + 12)))
+    mysql_writer.finish()
+
+    mcollector.mark_end_time()
+    mcollector.print_summary()
+
+# pylint: disable=protected-access
+def test_upsert_statement(mysql_writer):
+    """
+        upserts update everything but the unique key
+    """
+    mysql_writer.set_write_mode(write_mode=WRITE_MODE_UPSERT)
+    statement = mysql_writer._get_insert_chunker().get_statement(2)
+
+    assert statement.count("(%s,") == 2
+    update_clause = statement.split("on duplicate key update")[1]
+    assert "is_doximity_user_active = values(is_doximity_user_active)" in update_clause
+    assert "_create_time = current_timestamp" in update_clause
+    assert "report_date" not in update_clause
+    assert "doximity_user_id" not in update_clause
+
+def test_remove_stale_records_dry_run(mysql_writer):
+    """
+        dry run has no server time and deletes nothing
+    """
+    mysql_writer.set_write_mode(write_mode=WRITE_MODE_UPSERT)
+    written_since = mysql_writer.get_server_time()
+    assert written_since is None
+    assert mysql_writer.remove_stale_records(date_string="2017-02-02",
+                                             written_since=written_since) == 0
+
+def test_staging_dry_run(mysql_writer):
+    """
+        records go to the staging table until it is published
+    """
+    mysql_writer.start_staging(date_string="2017-02-02",
+                               publish_mode=PUBLISH_COPY,
+                               drop_secondary_indexes=True)
+    statement = mysql_writer._get_insert_chunker().get_statement(1)
+    assert statement.startswith("INSERT INTO friendly_vendor_match_stg_20170202_w0_")
+
+    mysql_writer.add_record(match_record=tuple(range(12)))
+    mysql_writer.finish()
+    mysql_writer.publish_staging(date_string="2017-02-02")
+
+    statement = mysql_writer._get_insert_chunker().get_statement(1)
+    assert statement.startswith("INSERT INTO friendly_vendor_match (")
+
+def test_delete_in_chunks(mysql_writer, monkeypatch):
+    """
+        deletes walk the primary key one chunk at a time
+    """
+    table_ids = list(range(1, 12))
+    statements = []
+
+    # pylint: disable=unused-argument
+    def query(sql, param_list):
+        last_id, limit = param_list[-2:]
+        return [{'friendly_vendor_match_id': table_id}
+                for table_id in table_ids if table_id > last_id][:limit]
+
+    def execute(sql, param_list):
+        statements.append(param_list)
+        first_id, last_id = param_list[-2:]
+        deleted = [table_id for table_id in table_ids if first_id <= table_id <= last_id]
+        for table_id in deleted:
+            table_ids.remove(table_id)
+        return len(deleted)
+
+    monkeypatch.setattr(mysql_writer, "_query", query)
+    monkeypatch.setattr(mysql_writer, "_execute", execute)
+    mcollector = MetricsCollector()
+    mysql_writer.set_metrics_collector(metrics_collector=mcollector)
+    mysql_writer.set_worker_id(worker_id=2)
+    mysql_writer.set_delete_throttle(chunksize=5, pause_seconds=0)
+
+    assert mysql_writer.remove_records_for_date(date_string="2017-02-02") == 11
+    assert statements == [["2017-02-02", 2, 1, 5],
+                          ["2017-02-02", 2, 6, 10],
+                          ["2017-02-02", 2, 11, 11]]
+    assert not table_ids
+
+def test_publish_staging_copy(mysql_writer, monkeypatch):
+    """
+        copy publishes delete and insert one id range at a time
+    """
+    table_ids = {'friendly_vendor_match': [1, 2, 3],
+                 'staging': list(range(101, 108))}
+    statements = []
+
+    def get_table(sql):
+        return 'friendly_vendor_match' if "from friendly_vendor_match\n" in sql else 'staging'
+
+    # pylint: disable=unused-argument
+    def query(sql, param_list):
+        last_id, limit = param_list[-2:]
+        return [{'friendly_vendor_match_id': table_id}
+                for table_id in table_ids[get_table(sql)] if table_id > last_id][:limit]
+
+    def execute(sql, param_list=None):
+        if param_list:
+            first_id, last_id = param_list[-2:]
+            statement = sql.split()[0]
+            statements.append((statement, first_id, last_id))
+            table = 'friendly_vendor_match' if statement == "delete" else 'staging'
+            rows = [table_id for table_id in table_ids[table] if first_id <= table_id <= last_id]
+            if statement == "delete":
+                for table_id in rows:
+                    table_ids[table].remove(table_id)
+            return len(rows)
+        return 0
+
+    monkeypatch.setattr(mysql_writer, "_query", query)
+    monkeypatch.setattr(mysql_writer, "_execute", execute)
+    mysql_writer.set_delete_throttle(chunksize=3, pause_seconds=0)
+    mysql_writer.start_staging(date_string="2017-02-02",
+                               publish_mode=PUBLISH_COPY,
+                               drop_secondary_indexes=False)
+    mysql_writer.finish()
+    mysql_writer.publish_staging(date_string="2017-02-02")
+
+    assert statements == [("delete", 1, 3),
+                          ("insert", 101, 103),
+                          ("insert", 104, 106),
+                          ("insert", 107, 107)]
+    assert not table_ids['friendly_vendor_match']
+
+@pytest.mark.parametrize("partitions", [[], [{'partition_method': "LIST COLUMNS",
+                                               'partition_description': "'2017-02-02'"}]])
+def test_staging_exchange_partition(mysql_writer, monkeypatch, partitions):
+    """
+        exchange fails before the staging table is created
+        if the target has no partition for the date
+    """
+    statements = []
+    # pylint: disable=unused-argument
+    def execute(sql, param_list=None):
+        statements.append(sql)
+        return 0
+
+    monkeypatch.setattr(mysql_writer, "_query", lambda sql, param_list: partitions)
+    monkeypatch.setattr(mysql_writer, "_execute", execute)
+    mysql_writer.set_dry_run(is_dry_run=False)
+
+    if not partitions:
+        with pytest.raises(MysqlWriterException, match="no partition p20170202"):
+            mysql_writer.start_staging(date_string="2017-02-02",
+                                       publish_mode=PUBLISH_EXCHANGE)
+        assert not statements
+        return
+
+    mysql_writer.start_staging(date_string="2017-02-02", publish_mode=PUBLISH_EXCHANGE)
+    mysql_writer.finish()
+    mysql_writer.publish_staging(date_string="2017-02-02")
+    assert statements[0].startswith("create table friendly_vendor_match_stg_20170202_w0_")
+    assert statements[2].startswith("alter table friendly_vendor_match exchange partition "
+                                    "p20170202 with table friendly_vendor_match_stg_20170202")
+
+def test_copy_records_from_date(mysql_writer, monkeypatch):
+    """
+        copies recompute the activity flags for the new date
+    """
+    statements = []
+
+    def execute(sql, param_list):
+        statements.append((sql, param_list))
+        return len(param_list) - 4
+
+    monkeypatch.setattr(mysql_writer, "_execute", execute)
+    mysql_writer.set_worker_id(worker_id=3)
+
+    assert mysql_writer.copy_records_from_date(from_date_string="2017-02-02",
+                                               date_string="2017-02-03",
+                                               doximity_user_ids=[]) == 0
+    assert mysql_writer.copy_records_from_date(from_date_string="2017-02-02",
+                                               date_string="2017-02-03",
+                                               doximity_user_ids=[5, 7]) == 2
+
+    sql, param_list = statements[0]
+    assert "datediff(%s, doximity_last_active_date) <= 30" in sql
+    assert "_friendly_vendor_page, _friendly_vendor_row, 3" in sql
+    assert sql.count("%s") == len(param_list)
+    assert param_list == ["2017-02-03", "2017-02-03", "2017-02-03", "2017-02-02", 5, 7]
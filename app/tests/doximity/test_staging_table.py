@@ -0,0 +1,45 @@
+"""
+    test_staging_table.py
+
+    unit tests for staging_table.py
+"""
+from frivenmeld.doximity.staging_table import partition_name
+from frivenmeld.doximity.staging_table import secondary_indexes
+from frivenmeld.doximity.staging_table import staging_table_name
+
+def _index_row(key_name, non_unique, seq_in_index, column_name):
+    """
+        row as returned by SHOW INDEX
+    """
+    return {'Key_name': key_name,
+            'Non_unique': non_unique,
+            'Seq_in_index': seq_in_index,
+            'Column_name': column_name,
+            'Sub_part': None}
+
+def test_names():
+    """
+        staging tables and partitions are named after the date
+    """
+    assert staging_table_name(target_table="data_engineer.friendly_vendor_match",
+                              date_string="2017-02-02",
+                              worker_id=3,
+                              run_id=12) == "data_engineer.friendly_vendor_match_stg_20170202_w3_12"
+    assert partition_name("2017-02-02") == "p20170202"
+
+def test_secondary_indexes():
+    """
+        SHOW INDEX rows become add key clauses, without the primary key
+    """
+    rows = [_index_row('PRIMARY', 0, 1, 'friendly_vendor_match_id'),
+            _index_row('report_date', 1, 1, 'report_date'),
+            _index_row('report_date', 1, 2, '_worker_id'),
+            _index_row('report_date_2', 0, 3, 'friendly_vendor_user_id'),
+            _index_row('report_date_2', 0, 1, 'report_date'),
+            _index_row('report_date_2', 0, 2, 'doximity_user_id')]
+
+    assert secondary_indexes(rows) == [
+        ('report_date', "add key `report_date` (`report_date`, `_worker_id`)"),
+        ('report_date_2', "add unique key `report_date_2` "
+                          "(`report_date`, `doximity_user_id`, `friendly_vendor_user_id`)"),
+    ]
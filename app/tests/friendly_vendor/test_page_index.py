@@ -0,0 +1,84 @@
+"""
+    test_page_index.py
+
+    unit tests for page_index.py
+"""
+from frivenmeld.friendly_vendor.page_index import PageIndex
+
+# page 3 and 4 only hold "Jones"
+PAGES = [["Adams", "Baker"],
+         ["Brown", "Jones"],
+         ["Jones", "Jones"],
+         ["Jones", "Jones"],
+         ["Kelly", "Smith"],
+         ["Smith", "Young"]]
+
+class FakeApi():
+    """
+        serves PAGES and counts the page requests
+    """
+
+    def __init__(self):
+        self.requests = 0
+
+    def get_user_page_count(self):
+        """
+            number of pages
+        """
+        return len(PAGES)
+
+    def get_user_page(self, page_number):
+        """
+            (page, total pages, users) like FriendlyVendorApi
+        """
+        self.requests += 1
+        users = [{'lastname': lastname} for lastname in PAGES[page_number - 1]]
+        return page_number, len(PAGES), users
+
+def test_get_page_range():
+    """
+        boundary pages are part of the range
+    """
+    page_index = PageIndex(friven_api=FakeApi())
+    assert page_index.get_page_range("jones", "kelly", 1, 6) == (2, 4)
+    assert page_index.get_page_range("smith", None, 1, 6) == (5, 6)
+    assert page_index.get_page_range(None, "brown", 1, 6) == (1, 1)
+    assert page_index.get_page_range("bb", "bc", 1, 6) is None
+    assert page_index.get_page_range("zzz", None, 1, 6) is None
+    assert page_index.get_page_range(None, "a", 1, 6) is None
+    assert page_index.get_page_range("jones", None, 5, 6) == (5, 6)
+
+def test_boundaries_are_cached():
+    """
+        each page is fetched once
+    """
+    api = FakeApi()
+    page_index = PageIndex(friven_api=api)
+    page_index.get_page_range("jones", "kelly", 1, 6)
+    requests = api.requests
+    page_index.get_page_range("jones", "kelly", 1, 6)
+    assert api.requests == requests <= len(PAGES)
+
+def test_split_lastnames():
+    """
+        a lastname that spans partitions is not split
+    """
+    page_index = PageIndex(friven_api=FakeApi())
+    assert page_index.split_lastnames([(1, 2), (3, 4), (5, 6)]) == [(None, "jones"),
+                                                                    ("jones", "kelly"),
+                                                                    ("kelly", None)]
+    assert page_index.split_lastnames([(1, 2), (3, 3), (4, 4), (5, 6)]) == [(None, "jones"),
+                                                                            ("jones", "kelly"),
+                                                                            ("kelly", None)]
+    assert page_index.split_lastnames([(1, 6)]) == [(None, None)]
+
+def test_get_next_lastname():
+    """
+        the first lastname after a page, past the
+        pages a lastname fills
+    """
+    page_index = PageIndex(friven_api=FakeApi())
+    assert page_index.get_next_lastname(page=1) == "brown"
+    assert page_index.get_next_lastname(page=2) == "kelly"
+    assert page_index.get_next_lastname(page=5) == "young"
+    assert page_index.get_next_lastname(page=6) is None
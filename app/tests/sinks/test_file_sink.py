@@ -0,0 +1,102 @@
+"""
+    test_file_sink.py
+
+    unit tests for file_sink.py and null_sink.py
+"""
+import csv
+import gzip
+import json
+import pytest
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.sinks.file_sink import FILE_SINKS
+from frivenmeld.sinks.file_sink import CsvSink
+from frivenmeld.sinks.file_sink import ColumnarSink
+from frivenmeld.sinks.file_sink import JsonlSink
+from frivenmeld.sinks.file_sink import read_row_groups
+from frivenmeld.sinks.null_sink import NullSink
+from frivenmeld.sinks.sink import OUTPUT_FIELDS
+
+def _match_records(count):
+    """
+        count match records
+    """
+    return [(index, index + 100, 1, 0, 1, 1, 0,
+             '2017-02-02', '2017-01-02', '2017-01-04', 7, index)
+            for index in range(count)]
+
+def _write(sink, match_records, num_connections=0):
+    """
+        writes the records in batches of 2
+    """
+    sink.init_queue(batchsize=2)
+    sink.set_worker_id(worker_id=3)
+    if num_connections:
+        sink.start_background(max_in_flight=2, num_connections=num_connections)
+    sink.add_records(match_records)
+    sink.finish()
+
+def test_csv_sink(tmpdir):
+    """
+        header and one line per record
+    """
+    path = str(tmpdir.join("out.csv.gz"))
+    _write(CsvSink(path=path), _match_records(5))
+
+    with gzip.open(path, "rt") as csv_file:
+        rows = list(csv.reader(csv_file))
+    assert rows[0] == list(OUTPUT_FIELDS)
+    assert rows[1] == ['0', '100', '1', '0', '1', '1', '0',
+                       '2017-02-02', '2017-01-02', '2017-01-04', '7', '0', '3']
+    assert len(rows) == 6
+
+def test_jsonl_sink(tmpdir):
+    """
+        one object per record
+    """
+    path = str(tmpdir.join("out.jsonl.gz"))
+    _write(JsonlSink(path=path), _match_records(3))
+
+    with gzip.open(path, "rt") as jsonl_file:
+        rows = [json.loads(line) for line in jsonl_file]
+    assert len(rows) == 3
+    assert rows[2]['friendly_vendor_user_id'] == 102
+    assert rows[2]['_worker_id'] == 3
+
+def test_columnar_sink(tmpdir):
+    """
+        one row group per batch
+    """
+    path = str(tmpdir.join("out.cols.gz"))
+    _write(ColumnarSink(path=path), _match_records(5))
+
+    row_groups = list(read_row_groups(path))
+    assert [len(row_group['doximity_user_id']) for row_group in row_groups] == [2, 2, 1]
+    assert row_groups[1]['doximity_user_id'] == [2, 3]
+    assert row_groups[2]['_worker_id'] == [3]
+
+@pytest.mark.parametrize("sink_name", sorted(FILE_SINKS))
+def test_parallel_file_sinks(tmpdir, sink_name):
+    """
+        batches from several threads all reach the file
+    """
+    sink_class = FILE_SINKS[sink_name]
+    path = str(tmpdir.join("out" + sink_class.extension))
+    _write(sink_class(path=path), _match_records(20), num_connections=3)
+
+    with gzip.open(path, "rt") as output_file:
+        text = output_file.read()
+    for index in range(20):
+        assert str(index + 100) in text
+
+def test_null_sink():
+    """
+        serializes and times every batch
+    """
+    mcollector = MetricsCollector()
+    sink = NullSink()
+    sink.set_metrics_collector(metrics_collector=mcollector)
+    _write(sink, _match_records(5))
+
+    assert sink.get_serialized_bytes() > 5 * len(OUTPUT_FIELDS)
+    mcollector.mark_end_time()
+    mcollector.print_summary()
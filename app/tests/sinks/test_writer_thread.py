@@ -0,0 +1,240 @@
+"""
+    test_writer_thread.py
+
+    unit tests for writer_thread.py
+"""
+import threading
+import time
+import pytest
+from frivenmeld.sinks.writer_thread import WriterThread
+from frivenmeld.sinks.writer_thread import WriterPool
+from frivenmeld.sinks.writer_thread import WriterThreadException
+from frivenmeld.doximity.mysql_writer import MysqlWriter
+from frivenmeld.doximity.mysql_writer import MysqlWriterException
+from frivenmeld.metrics_collector import MetricsCollector
+
+def test_batches_flushed_in_order():
+    """
+        every submitted batch is flushed, in order, off the main thread
+    """
+    flushed = []
+    thread_names = set()
+
+    def flush(batch):
+        thread_names.add(threading.current_thread().name)
+        flushed.append(batch)
+
+    writer_thread = WriterThread(flush_function=flush, max_in_flight=1)
+    writer_thread.start()
+    for index in range(5):
+        writer_thread.submit([index])
+    writer_thread.finish()
+
+    assert flushed == [[0], [1], [2], [3], [4]]
+    assert thread_names == {"WriterThread"}
+
+def test_error_propagates():
+    """
+        a failed flush is raised on the main thread
+    """
+    def flush(batch):
+        raise ValueError("boom {}".format(batch))
+
+    writer_thread = WriterThread(flush_function=flush, max_in_flight=2)
+    writer_thread.start()
+    writer_thread.submit([1])
+    with pytest.raises(WriterThreadException):
+        writer_thread.finish()
+
+class BatchRecorder():
+    """
+        batch listener that keeps the batches it is told about
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def batch_written(self, match_records):
+        """
+            called by the Sink in add order
+        """
+        self.batches.append(list(match_records))
+
+def _mysql_writer(mcollector):
+    """
+        dry run MysqlWriter with a BatchRecorder
+    """
+    writer = MysqlWriter(host=None,
+                         port=None,
+                         database=None,
+                         username=None,
+                         password=None)
+    writer.init_queue(batchsize=2)
+    writer.set_dry_run(is_dry_run=True)
+    writer.set_metrics_collector(metrics_collector=mcollector)
+    recorder = BatchRecorder()
+    writer.add_batch_listener(recorder)
+    return writer, recorder
+
+def _records(count):
+    """
+        match records in descending unique key order
+    """
+    return [tuple(range(index, index + 12)) for index in reversed(range(count))]
+
+def test_background_mysql_writer(monkeypatch):
+    """
+        MysqlWriter in the background on one connection
+        writes the batches as they were added
+    """
+    mcollector = MetricsCollector()
+    writer, recorder = _mysql_writer(mcollector)
+    inserted = []
+    monkeypatch.setattr(writer, "_insert_batch", inserted.append)
+
+    writer.start_background(max_in_flight=2)
+    records = _records(5)
+    for match_record in records:
+        writer.add_record(match_record=match_record)
+    writer.finish()
+
+    assert inserted == [records[0:2], records[2:4], records[4:5]]
+    assert recorder.batches == inserted
+    throughput = mcollector.get_state()['throughput']
+    assert throughput['writer_insert'][0] == 5
+    # no per connection throughput on one connection
+    assert not [name for name in throughput if name.startswith("writer_insert_")]
+
+def test_pool_completes_in_order():
+    """
+        batches flushed out of order are completed in submit order
+    """
+    release_first = threading.Event()
+    completed = []
+
+    def flush(batch):
+        if batch == [0]:
+            # the first batch finishes last
+            release_first.wait(timeout=5)
+        elif batch == [3]:
+            release_first.set()
+
+    writer_pool = WriterPool(flush_function=flush,
+                             max_in_flight=4,
+                             num_threads=3,
+                             on_complete=completed.append)
+    writer_pool.start()
+    for index in range(6):
+        writer_pool.submit([index])
+    writer_pool.finish()
+
+    assert completed == [[0], [1], [2], [3], [4], [5]]
+
+def test_pool_error_propagates():
+    """
+        a failed batch is raised and later batches are not completed
+    """
+    completed = []
+
+    def flush(batch):
+        if batch == [1]:
+            raise ValueError("boom")
+
+    writer_pool = WriterPool(flush_function=flush,
+                             max_in_flight=1,
+                             num_threads=2,
+                             on_complete=completed.append)
+    writer_pool.start()
+    writer_pool.submit([0])
+    writer_pool.submit([1])
+    with pytest.raises(WriterThreadException):
+        writer_pool.finish()
+    assert completed == [[0]]
+
+def test_shared_stop_event():
+    """
+        a WriterThread drops its batches once another
+        thread of its pool failed
+    """
+    flushed = []
+    stop_event = threading.Event()
+    writer_thread = WriterThread(flush_function=flushed.append,
+                                 max_in_flight=2,
+                                 stop_event=stop_event)
+    writer_thread.start()
+    writer_thread.submit([0])
+    # another thread's flush failed
+    stop_event.set()
+    writer_thread.submit([1])
+    writer_thread.finish()
+    assert [1] not in flushed
+
+def test_add_record_raises_after_error(monkeypatch):
+    """
+        a failed background write is raised by the next add_record()
+    """
+    writer = MysqlWriter(host=None,
+                         port=None,
+                         database=None,
+                         username=None,
+                         password=None)
+    writer.init_queue(batchsize=100)
+    writer.set_dry_run(is_dry_run=True)
+    written = threading.Event()
+
+    def write_records(match_records):
+        written.set()
+        raise ValueError("boom {}".format(match_records))
+
+    monkeypatch.setattr(writer, "_write_records", write_records)
+    writer.start_background(max_in_flight=2, num_connections=2)
+    writer.add_record(match_record=tuple(range(12)))
+    writer.run_inserts()
+    written.wait(timeout=5)
+    # long before the buffer is full again
+    with pytest.raises(MysqlWriterException):
+        for _ in range(50):
+            writer.add_record(match_record=tuple(range(12)))
+            time.sleep(0.01)
+    with pytest.raises(MysqlWriterException):
+        writer.finish()
+
+def test_parallel_mysql_writer(monkeypatch):
+    """
+        MysqlWriter on several connections writes each batch
+        sorted by the unique key, records every connection's
+        throughput and tells the listeners in add order
+    """
+    mcollector = MetricsCollector()
+    writer, recorder = _mysql_writer(mcollector)
+    first_written = threading.Event()
+    inserted = []
+
+    def insert_batch(match_records):
+        if match_records[0][0] == 6:
+            # the first batch finishes after the others
+            first_written.wait(timeout=5)
+        inserted.append(match_records)
+        if len(inserted) == 3:
+            first_written.set()
+
+    monkeypatch.setattr(writer, "_insert_batch", insert_batch)
+    writer.start_background(max_in_flight=4, num_connections=3)
+    records = _records(8)
+    for match_record in records:
+        writer.add_record(match_record=match_record)
+    writer.finish()
+
+    batches = [records[index:index + 2] for index in range(0, 8, 2)]
+    assert sorted(inserted) == sorted(sorted(batch) for batch in batches)
+    assert inserted[-1] == sorted(batches[0])
+    # in add order and in the order the records were added
+    assert recorder.batches == batches
+
+    throughput = mcollector.get_state()['throughput']
+    assert throughput['writer_insert'][0] == 8
+    per_connection = {name: values[0] for name, values in throughput.items()
+                      if name.startswith("writer_insert_")}
+    assert set(per_connection) <= {"writer_insert_WriterThread-{}".format(index)
+                                   for index in range(3)}
+    assert sum(per_connection.values()) == 8
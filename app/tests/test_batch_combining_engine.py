@@ -0,0 +1,112 @@
+"""
+    test_batch_combining_engine.py
+
+    unit tests for batch_combining_engine.py
+"""
+import datetime
+import pytest
+from frivenmeld.batch_combining_engine import BatchCombiningEngine
+from frivenmeld.combining_engine import CombiningEngine
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.normalizer import RecordNormalizer
+
+# pylint: disable=too-few-public-methods
+class CapturingWriter():
+    """
+        Mocks MysqlWriter, keeping the records
+    """
+    def __init__(self):
+        self.records = []
+
+    def add_record(self, match_record):
+        """
+            mimicks real add_record()
+        """
+        self.records.append(match_record)
+
+    def add_records(self, match_records):
+        """
+            mimicks real add_records()
+        """
+        self.records.extend(match_records)
+
+def _make_groups():
+    """
+        returns two lastname-groups of normalized users
+    """
+    normalizer = RecordNormalizer()
+    groups = []
+    for lastname in ['Nistler', 'Queen']:
+        friven_list = [
+            normalizer.normalize_friven_user({'firstname': 'Kyle',
+                                              'id': len(lastname),
+                                              'last_active_date': '2017-01-05',
+                                              'lastname': lastname,
+                                              'practice_location': 'arab',
+                                              'specialty': 'Family Medicine',
+                                              'user_type_classification': 'Contributor',
+                                              'friendly_vendor_page': 1,
+                                              'friendly_vendor_row': 2}),
+            normalizer.normalize_friven_user({'firstname': 'Rona',
+                                              'id': 72515,
+                                              'last_active_date': '2016-01-10',
+                                              'lastname': lastname,
+                                              'practice_location': 'birmingham',
+                                              'specialty': 'Cardiology',
+                                              'user_type_classification': 'Lurker',
+                                              'friendly_vendor_page': 1,
+                                              'friendly_vendor_row': 3})]
+        mysql_list = [
+            normalizer.normalize_mysql_user({'classification': 'popular',
+                                             'firstname': 'Kyle',
+                                             'id': 916915,
+                                             'last_active_date': datetime.date(2016, 12, 30),
+                                             'lastname': lastname,
+                                             'location': 'arab',
+                                             'specialty': 'Family Medicine'}),
+            normalizer.normalize_mysql_user({'classification': 'lurker',
+                                             'firstname': 'rona',
+                                             'id': 5,
+                                             'last_active_date': datetime.date(2017, 1, 30),
+                                             'lastname': lastname,
+                                             'location': 'Arab',
+                                             'specialty': 'Cardiology'})]
+        groups.append((friven_list, mysql_list))
+    return groups
+
+@pytest.mark.parametrize("batch_size", [1, 3, 1000])
+def test_matches_per_record_engine(batch_size):
+    """
+        the batch engine writes the same records as CombiningEngine
+    """
+    expected_writer = CapturingWriter()
+    engine = CombiningEngine(metrics_collector=MetricsCollector(),
+                             report_date="2017-02-02",
+                             mysql_writer=expected_writer)
+
+    batch_writer = CapturingWriter()
+    batch_engine = BatchCombiningEngine(metrics_collector=MetricsCollector(),
+                                        report_date="2017-02-02",
+                                        mysql_writer=batch_writer,
+                                        batch_size=batch_size)
+
+    for friven_list, mysql_list in _make_groups():
+        engine.combine(friven_user_list=friven_list, mysql_user_list=mysql_list)
+        batch_engine.combine(friven_user_list=friven_list, mysql_user_list=mysql_list)
+    engine.flush()
+    batch_engine.flush()
+
+    assert len(expected_writer.records) == 4
+    assert batch_writer.records == expected_writer.records
+
+def test_flush_empty():
+    """
+        flushing with nothing buffered does nothing
+    """
+    writer = CapturingWriter()
+    batch_engine = BatchCombiningEngine(metrics_collector=MetricsCollector(),
+                                        report_date="2017-02-02",
+                                        mysql_writer=writer,
+                                        batch_size=10)
+    batch_engine.flush()
+    assert writer.records == []
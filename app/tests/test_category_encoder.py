@@ -0,0 +1,58 @@
+"""
+    test_category_encoder.py
+
+    unit tests for category_encoder.py
+"""
+from frivenmeld.category_encoder import CategoryEncoder
+from frivenmeld.metrics_collector import MetricsCollector
+
+def test_encode():
+    """
+        equal normalized values share a code
+    """
+    encoder = CategoryEncoder(name="specialty")
+    code = encoder.encode("Family Medicine")
+    assert encoder.encode("family_medicine ") == code
+    assert encoder.encode("Cardiology") != code
+    assert encoder.decode(code) == "family medicine"
+
+def test_stats():
+    """
+        hits and misses are counted
+    """
+    encoder = CategoryEncoder(name="location")
+    for _ in range(3):
+        encoder.encode("arab")
+    encoder.encode("Arab")
+
+    stats = encoder.get_stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['hit_rate'] == 0.5
+    assert stats['distinct_values'] == 1
+
+def test_bounded_cache():
+    """
+        the raw value cache never grows past max_cache_size
+        but codes stay stable
+    """
+    encoder = CategoryEncoder(name="location", max_cache_size=2)
+    first_code = encoder.encode("a")
+    encoder.encode("b")
+    encoder.encode("c")
+
+    stats = encoder.get_stats()
+    assert stats['cache_size'] == 2
+    assert stats['evictions'] == 1
+    assert encoder.encode("a") == first_code
+
+def test_metrics_summary():
+    """
+        cache stats show up in the summary
+    """
+    encoder = CategoryEncoder(name="location")
+    encoder.encode("arab")
+    mcollector = MetricsCollector()
+    mcollector.register_cache(name="location_encoder", cache=encoder)
+    mcollector.mark_end_time()
+    mcollector.print_summary()
@@ -0,0 +1,83 @@
+"""
+    test_checkpoint.py
+
+    unit tests for checkpoint.py
+"""
+import os
+import pytest
+from frivenmeld.checkpoint import Checkpoint
+from frivenmeld.checkpoint import CheckpointException
+from frivenmeld.doximity.mysql_writer import MysqlWriter
+
+def _match_record(page):
+    """
+        match record from the given vendor page
+    """
+    return (1, 2, 1, 1, 1, 1, 1, '2017-02-02', '2017-01-02', '2017-01-03', page, 0)
+
+def _checkpoint(tmpdir, start_page=1, end_page=10):
+    """
+        checkpoint for worker 3
+    """
+    return Checkpoint(checkpoint_dir=str(tmpdir),
+                      report_date='2017-02-02',
+                      worker_id=3,
+                      start_page=start_page,
+                      end_page=end_page)
+
+def test_checkpoint(tmpdir):
+    """
+        the page before the last written record is complete
+    """
+    checkpoint = _checkpoint(tmpdir)
+    assert not checkpoint.load()
+    assert checkpoint.get_last_complete_page() == 0
+
+    checkpoint.batch_written([_match_record(1), _match_record(2), _match_record(4)])
+    assert checkpoint.get_last_complete_page() == 3
+
+    # same page again does not go backwards
+    checkpoint.batch_written([_match_record(4)])
+    assert checkpoint.get_last_complete_page() == 3
+
+    resumed = _checkpoint(tmpdir)
+    assert resumed.load()
+    assert resumed.get_last_complete_page() == 3
+    assert not resumed.is_complete()
+
+    checkpoint.mark_complete()
+    assert _checkpoint(tmpdir).load()
+    assert not os.path.exists(checkpoint.get_path() + ".tmp")
+
+def test_checkpoint_other_range(tmpdir):
+    """
+        a checkpoint from a different page range is refused
+    """
+    _checkpoint(tmpdir).batch_written([_match_record(5)])
+
+    with pytest.raises(CheckpointException):
+        _checkpoint(tmpdir, end_page=20).load()
+
+def test_writer_notifies_listener(tmpdir):
+    """
+        the writer reports each written batch
+    """
+    checkpoint = _checkpoint(tmpdir)
+    writer = MysqlWriter(host="localhost",
+                         port=3306,
+                         database="test",
+                         username="test",
+                         password="test")
+    writer.set_dry_run(is_dry_run=True)
+    writer.init_queue(batchsize=2)
+    writer.add_batch_listener(listener=checkpoint)
+
+    writer.add_records([_match_record(1), _match_record(2), _match_record(2)])
+    assert checkpoint.get_last_complete_page() == 1
+
+    writer.add_record(_match_record(6))
+    writer.finish()
+    assert checkpoint.get_last_complete_page() == 5
+
+    # nothing is deleted in dry run mode
+    assert writer.remove_records_after_page(date_string='2017-02-02', page=5) == 0
@@ -4,6 +4,8 @@ import pytest
 from frivenmeld.combining_engine import CombiningEngine
 from frivenmeld.metrics_collector import MetricsCollector
 from frivenmeld.doximity.mysql_writer import MysqlWriter
+from frivenmeld.match_record import match_record_as_dict
+from frivenmeld.normalizer import RecordNormalizer
 
 
 
@@ -27,7 +29,14 @@ def metrics_collector():
     return collector
 
 @pytest.fixture()
-def friven_list():
+def normalizer():
+
+    # shared by both sides, like the loaders share it,
+    # so both get the same category codes
+    return RecordNormalizer()
+
+@pytest.fixture()
+def friven_list(normalizer):
 
     friven_user_list = [ 
         {
@@ -62,10 +71,10 @@ def friven_list():
             'friendly_vendor_row': 412
         }
     ]
-    return friven_user_list
+    return [normalizer.normalize_friven_user(user) for user in friven_user_list]
 
 @pytest.fixture()
-def mysql_list():
+def mysql_list(normalizer):
 
     mysql_user_list = [
         {
@@ -94,11 +103,15 @@ def mysql_list():
             'specialty': 'Family Medicine'
         }
     ]
-    return mysql_user_list
+    return [normalizer.normalize_mysql_user(user) for user in mysql_user_list]
+
 
 
+def test_combine(metrics_collector, mysql_writer, friven_list, mysql_list, monkeypatch):
 
-def test_combine(metrics_collector, mysql_writer, friven_list, mysql_list):
+    records = []
+    monkeypatch.setattr(mysql_writer, "add_record",
+                        lambda match_record: records.append(match_record))
 
     combiner = CombiningEngine(metrics_collector=metrics_collector,
                                report_date = "2017-02-02",
@@ -107,4 +120,12 @@ def test_combine(metrics_collector, mysql_writer, friven_list, mysql_list):
     combiner.combine(friven_user_list=friven_list,
                      mysql_user_list=mysql_list)
 
- 
+    # both Kyles match the Doximity Kyle
+    flags = [(record['friendly_vendor_user_id'],
+              record['classification_match'],
+              record['location_match'],
+              record['specialty_match'])
+             for record in map(match_record_as_dict, records)]
+    assert flags == [(93519, 0, 1, 1),
+                     (1111, 0, 0, 1)]
+    assert all(record[0] == 916915 for record in records)
@@ -0,0 +1,50 @@
+"""
+    test_date_cache.py
+
+    unit tests for date_cache.py
+"""
+import datetime
+from frivenmeld.date_cache import BoundedMemo
+from frivenmeld.date_cache import DateCache
+from frivenmeld.metrics_collector import MetricsCollector
+
+def test_date_cache():
+    """
+        parse / is_active / format give the uncached answers
+    """
+    date_cache = DateCache(report_date=datetime.date(2017, 2, 2))
+
+    for _ in range(3):
+        assert date_cache.parse("2017-01-03") == datetime.date(2017, 1, 3)
+        assert date_cache.is_active(datetime.date(2017, 1, 3)) == 1
+        assert date_cache.is_active(datetime.date(2017, 1, 2)) == 0
+        assert date_cache.format(datetime.date(2017, 1, 2)) == "2017-01-02"
+
+    stats = date_cache.get_stats()
+    assert stats['misses'] == 4
+    assert stats['hits'] == 8
+    assert stats['parse_misses'] == 1
+
+def test_bounded_memo():
+    """
+        the memo drops the oldest entry when full
+    """
+    memo = BoundedMemo(function=len, max_size=2)
+    assert memo.get("a") == 1
+    assert memo.get("bb") == 2
+    assert memo.get("ccc") == 3
+    assert len(memo) == 2
+    assert memo.evictions == 1
+    assert memo.get("a") == 1
+    assert memo.misses == 4
+
+def test_metrics_summary():
+    """
+        date cache stats show up in the summary
+    """
+    date_cache = DateCache(report_date=datetime.date(2017, 2, 2))
+    date_cache.parse("2017-01-03")
+    mcollector = MetricsCollector()
+    mcollector.register_cache(name="date_cache", cache=date_cache)
+    mcollector.mark_end_time()
+    mcollector.print_summary()
@@ -0,0 +1,125 @@
+"""
+    test_driver.py
+
+    unit tests for driver.py
+"""
+import sqlite3
+import threading
+import pytest
+from frivenmeld import driver
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.work_queue import WorkQueueException
+
+class FakePageIndex():
+    """
+        thirty pages, every page ends a lastname
+    """
+    # pylint: disable=unused-argument
+    def __init__(self, friven_api):
+        pass
+
+    def get_total_pages(self):
+        """
+            mimicks real get_total_pages()
+        """
+        return 30
+
+    def get_next_lastname(self, page):
+        """
+            mimicks real get_next_lastname()
+        """
+        return None if page == 30 else "name{:02}".format(page + 1)
+
+def _fake_run_job(queue_path, calls):
+    """
+        pages 11-20 fail on their first attempt,
+        pages 21-30 lose their lease
+    """
+    # pylint: disable=unused-argument
+    def run_job(arg_object, config, total_pages=None):
+        calls.append((arg_object.start_page, arg_object.end_lastname, total_pages))
+        if arg_object.start_page == 11 and calls.count(calls[-1]) == 1:
+            raise ValueError("first attempt fails")
+        if arg_object.start_page == 21:
+            connection = sqlite3.connect(queue_path)
+            connection.execute("update work_chunk set owner = 'other' where start_page = 21")
+            connection.commit()
+            connection.close()
+
+        mcollector = MetricsCollector()
+        mcollector.increment_matches(count=10)
+        return mcollector
+    return run_job
+
+def test_run_queue_worker(tmpdir, monkeypatch):
+    """
+        failed chunks are released and retried, lost
+        leases are not counted, and the reads are bounded
+    """
+    queue_path = str(tmpdir.join("queue.sqlite"))
+    calls = []
+    monkeypatch.setattr(driver, "PageIndex", FakePageIndex)
+    monkeypatch.setattr(driver, "run_job", _fake_run_job(queue_path, calls))
+    arg_object = driver.parse_args(["--work-queue", queue_path,
+                                    "--sink", "null",
+                                    "--report-date", "2017-02-02"])
+
+    mcollector = driver.run_queue_worker(arg_object=arg_object,
+                                         config={'FRIENDLY_VENDOR_API_URL': "http://dud"})
+
+    assert calls == [(1, "name11", 30), (11, "name21", 30), (11, "name21", 30),
+                     (21, None, 30)]
+    state = mcollector.get_state()
+    assert state['num_matches'] == 20
+    assert state['observations']['work_queue_failed_attempts'][0] == 1
+    assert state['observations']['work_queue_lost_leases'][0] == 1
+
+def test_run_queue_worker_fails(tmpdir, monkeypatch):
+    """
+        the worker goes through all chunks, then
+        fails the run if a chunk failed for good
+    """
+    calls = []
+
+    # pylint: disable=unused-argument
+    def run_job(arg_object, config, total_pages=None):
+        calls.append(arg_object.start_page)
+        if arg_object.start_page == 1:
+            raise ValueError("always fails")
+        return MetricsCollector()
+
+    monkeypatch.setattr(driver, "PageIndex", FakePageIndex)
+    monkeypatch.setattr(driver, "run_job", run_job)
+    arg_object = driver.parse_args(["--work-queue", str(tmpdir.join("queue.sqlite")),
+                                    "--sink", "null",
+                                    "--max-attempts", "2",
+                                    "--report-date", "2017-02-02"])
+
+    with pytest.raises(WorkQueueException):
+        driver.run_queue_worker(arg_object=arg_object,
+                                config={'FRIENDLY_VENDOR_API_URL': "http://dud"})
+    assert calls == [1, 1, 11, 21]
+
+def test_main_profiles_failed_run(tmpdir, monkeypatch):
+    """
+        the profile is written and the thread hook
+        removed when the run raises
+    """
+    profile_dir = tmpdir.join("profile")
+    arg_object = driver.parse_args(["--sink", "null",
+                                    "--profile", str(profile_dir),
+                                    "--profile-modes", "cpu,stacks"])
+
+    # pylint: disable=unused-argument
+    def run_job(arg_object, config, total_pages=None):
+        raise ValueError("run fails")
+
+    monkeypatch.setattr(driver, "parse_args", lambda: arg_object)
+    monkeypatch.setattr(driver, "init_logging", lambda loglevel: None)
+    monkeypatch.setattr(driver, "load_config", dict)
+    monkeypatch.setattr(driver, "run_job", run_job)
+
+    with pytest.raises(ValueError):
+        driver.main()
+    assert profile_dir.join("summary.txt").check()
+    assert threading.getprofile() is None
@@ -0,0 +1,170 @@
+"""
+    test_fan_out_melder.py
+
+    unit tests for fan_out_melder.py
+"""
+import queue
+import threading
+import time
+from frivenmeld.fan_out_melder import FanOutMelder
+from frivenmeld.fan_out_melder import Vendor
+from frivenmeld.timed_queue import END_OF_DATA
+
+class FakeLoader():
+    """
+        Mocks a loader, serving users with these lastnames
+
+        delay: seconds before the users after the first
+        dies: never ends the queue and is not alive
+    """
+    def __init__(self, lastnames, delay=0, dies=False):
+        self._lastnames = lastnames
+        self._delay = delay
+        self._dies = dies
+        self._queue = queue.Queue()
+        self._done = threading.Event()
+        self.initial_lastname = None
+        self.stopped = 0
+
+    def set_initial_lastname(self, lastname):
+        """
+            mimicks real set_initial_lastname()
+        """
+        self.initial_lastname = lastname
+
+    def start(self):
+        """
+            mimicks real start()
+        """
+        if self._delay:
+            self._queue.put({'id': 0, 'sort_key': self._lastnames[0]})
+            threading.Thread(target=self._load, args=(1,), daemon=True).start()
+        else:
+            self._load(0)
+
+    def _load(self, first_index):
+        """
+            puts the users
+        """
+        time.sleep(self._delay)
+        for index, lastname in enumerate(self._lastnames[first_index:], first_index):
+            self._queue.put({'id': index, 'sort_key': lastname})
+        if not self._dies:
+            self._queue.put(END_OF_DATA)
+        self._done.set()
+
+    def is_alive(self):
+        """
+            mimicks real is_alive()
+        """
+        return not self._done.is_set()
+
+    def stop(self):
+        """
+            mimicks real stop()
+        """
+        self.stopped += 1
+
+    def get_queue(self):
+        """
+            mimicks real get_queue()
+        """
+        return self._queue
+
+# pylint: disable=too-few-public-methods
+class CapturingEngine():
+    """
+        Mocks a combining engine, keeping the groups
+    """
+    def __init__(self, combined=None):
+        """
+            combined: list shared by engines, gets
+            the lastname of every group in order
+        """
+        self.groups = []
+        self._combined = combined if combined is not None else []
+
+    def combine(self, friven_user_list, mysql_user_list):
+        """
+            mimicks real combine()
+        """
+        self.groups.append((friven_user_list[0]['sort_key'],
+                            len(friven_user_list),
+                            len(mysql_user_list)))
+        self._combined.append(friven_user_list[0]['sort_key'])
+
+def test_fan_out_meld():
+    """
+        every vendor gets its groups from one Doximity scan
+    """
+    mysql_loader = FakeLoader(["adams", "baker", "baker", "jones", "smith", "young"])
+    vendors = [Vendor(name="first",
+                      loader=FakeLoader(["baker", "jones", "jones", "kelly"]),
+                      combining_engine=CapturingEngine()),
+               Vendor(name="second",
+                      loader=FakeLoader(["adams", "baker", "smith", "young", "zed"]),
+                      combining_engine=CapturingEngine()),
+               Vendor(name="empty",
+                      loader=FakeLoader([]),
+                      combining_engine=CapturingEngine())]
+    melder = FanOutMelder(vendors=vendors,
+                          mysql_loader=mysql_loader,
+                          vendor_timeout=0.01,
+                          mysql_timeout=0.01)
+    melder.meld()
+
+    assert mysql_loader.initial_lastname == "adams"
+    assert vendors[0].combining_engine.groups == [("baker", 1, 2), ("jones", 2, 1)]
+    assert vendors[1].combining_engine.groups == [("adams", 1, 1),
+                                                  ("baker", 1, 2),
+                                                  ("smith", 1, 1),
+                                                  ("young", 1, 1)]
+    assert not vendors[2].combining_engine.groups
+    assert [vendor.loader.stopped for vendor in vendors] == [1, 1, 1]
+    assert mysql_loader.stopped == 1
+
+def test_slow_vendor():
+    """
+        a slow vendor does not hold up the others and is not dropped
+    """
+    mysql_loader = FakeLoader(["adams", "baker", "jones", "smith"])
+    combined = []
+    vendors = [Vendor(name="slow",
+                      loader=FakeLoader(["adams", "jones", "smith"], delay=0.3),
+                      combining_engine=CapturingEngine(combined)),
+               Vendor(name="fast",
+                      loader=FakeLoader(["baker", "smith"]),
+                      combining_engine=CapturingEngine(combined))]
+    melder = FanOutMelder(vendors=vendors,
+                          mysql_loader=mysql_loader,
+                          vendor_timeout=0.01,
+                          mysql_timeout=0.01)
+    melder.meld()
+
+    assert vendors[0].combining_engine.groups == [("adams", 1, 1),
+                                                  ("jones", 1, 1),
+                                                  ("smith", 1, 1)]
+    assert vendors[1].combining_engine.groups == [("baker", 1, 1), ("smith", 1, 1)]
+    # the fast vendor was done before the slow one got past adams
+    assert combined[:2] == ["baker", "smith"]
+
+def test_dead_vendor():
+    """
+        a vendor whose loader died is dropped
+    """
+    mysql_loader = FakeLoader(["adams", "baker", "jones"])
+    vendors = [Vendor(name="dead",
+                      loader=FakeLoader(["adams", "baker"], dies=True),
+                      combining_engine=CapturingEngine()),
+               Vendor(name="alive",
+                      loader=FakeLoader(["jones"]),
+                      combining_engine=CapturingEngine())]
+    melder = FanOutMelder(vendors=vendors,
+                          mysql_loader=mysql_loader,
+                          vendor_timeout=0.01,
+                          mysql_timeout=0.01)
+    melder.meld()
+
+    assert vendors[0].combining_engine.groups == [("adams", 1, 1), ("baker", 1, 1)]
+    assert vendors[1].combining_engine.groups == [("jones", 1, 1)]
+    assert [vendor.loader.stopped for vendor in vendors] == [1, 1]
@@ -0,0 +1,136 @@
+"""
+    test_fuzzy_combining_engine.py
+
+    unit tests for fuzzy_combining_engine.py
+"""
+import datetime
+from frivenmeld.fuzzy_combining_engine import FuzzyCombiningEngine
+from frivenmeld.fuzzy_combining_engine import MAX_CANDIDATES
+from frivenmeld.fuzzy_combining_engine import similarity
+from frivenmeld.match_record import match_record_as_dict
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.normalizer import RecordNormalizer
+
+# pylint: disable=too-few-public-methods
+class CapturingWriter():
+    """
+        Mocks MysqlWriter, keeping the records
+    """
+    def __init__(self):
+        self.records = []
+
+    def add_record(self, match_record):
+        """
+            mimicks real add_record()
+        """
+        self.records.append(match_record)
+
+def _friven_user(normalizer, user_id, firstname, location, lastname='Nistler'):
+    """
+        returns a normalized friendly vendor user
+    """
+    return normalizer.normalize_friven_user({'firstname': firstname,
+                                             'id': user_id,
+                                             'last_active_date': '2017-01-05',
+                                             'lastname': lastname,
+                                             'practice_location': location,
+                                             'specialty': 'Family Medicine',
+                                             'user_type_classification': 'Contributor',
+                                             'friendly_vendor_page': 1,
+                                             'friendly_vendor_row': user_id})
+
+def _mysql_user(normalizer, user_id, firstname, location):
+    """
+        returns a normalized doximity user
+    """
+    return normalizer.normalize_mysql_user({'classification': 'popular',
+                                            'firstname': firstname,
+                                            'id': user_id,
+                                            'last_active_date': datetime.date(2016, 12, 30),
+                                            'lastname': 'Nistler',
+                                            'location': location,
+                                            'specialty': 'Family Medicine'})
+
+def test_similarity():
+    """
+        bigram similarity
+    """
+    assert similarity("michael", "michael") == 1.0
+    assert similarity("katherine", "katharine") == 0.75
+    assert similarity("michael", "judy") == 0.0
+
+def test_fuzzy_combine():
+    """
+        nicknames, typos and duplicate names are matched
+    """
+    normalizer = RecordNormalizer()
+    friven_list = [_friven_user(normalizer, 1, 'Bob', 'arab'),
+                   _friven_user(normalizer, 2, 'Katherine', 'boston'),
+                   _friven_user(normalizer, 3, 'Judy', 'arab'),
+                   _friven_user(normalizer, 4, 'Zed', 'arab')]
+    mysql_list = [_mysql_user(normalizer, 10, 'Robert', 'arab'),
+                  _mysql_user(normalizer, 20, 'Katharine', 'boston'),
+                  _mysql_user(normalizer, 30, 'Judy', 'attalla'),
+                  _mysql_user(normalizer, 31, 'Judy', 'arab')]
+
+    writer = CapturingWriter()
+    mcollector = MetricsCollector()
+    engine = FuzzyCombiningEngine(metrics_collector=mcollector,
+                                  report_date="2017-02-02",
+                                  mysql_writer=writer,
+                                  threshold=0.7)
+    engine.combine(friven_user_list=friven_list, mysql_user_list=mysql_list)
+
+    records = [match_record_as_dict(record) for record in writer.records]
+    pairs = {(record['friendly_vendor_user_id'], record['doximity_user_id'])
+             for record in records}
+    # duplicate 'Judy' goes to the one in the same location
+    assert pairs == {(1, 10), (2, 20), (3, 31)}
+
+    mcollector.mark_end_time()
+    mcollector.print_summary()
+
+def _combine(friven_list, mysql_list):
+    """
+        returns the (friven id, mysql id) pairs
+        and the MetricsCollector of a combine
+    """
+    writer = CapturingWriter()
+    mcollector = MetricsCollector()
+    engine = FuzzyCombiningEngine(metrics_collector=mcollector,
+                                  report_date="2017-02-02",
+                                  mysql_writer=writer,
+                                  threshold=0.7)
+    engine.combine(friven_user_list=friven_list, mysql_user_list=mysql_list)
+    records = [match_record_as_dict(record) for record in writer.records]
+    pairs = {(record['friendly_vendor_user_id'], record['doximity_user_id'])
+             for record in records}
+    return pairs, mcollector
+
+def test_lastname_typo():
+    """
+        only firstnames are fuzzy, lastnames must be identical
+    """
+    normalizer = RecordNormalizer()
+    friven_list = [_friven_user(normalizer, 1, 'Robert', 'arab', lastname='Nistlar')]
+    mysql_list = [_mysql_user(normalizer, 10, 'Robert', 'arab')]
+
+    pairs, _ = _combine(friven_list, mysql_list)
+    assert not pairs
+
+def test_candidate_truncation():
+    """
+        large candidate sets keep the closest
+        firstnames and are counted
+    """
+    normalizer = RecordNormalizer()
+    friven_list = [_friven_user(normalizer, 1, 'Michael', 'arab')]
+    mysql_list = [_mysql_user(normalizer, user_id, 'Mary', 'arab')
+                  for user_id in range(100, 100 + MAX_CANDIDATES * 2)]
+    mysql_list.append(_mysql_user(normalizer, 10, 'Michaela', 'boston'))
+
+    pairs, mcollector = _combine(friven_list, mysql_list)
+    assert pairs == {(1, 10)}
+    truncated = mcollector.get_report()['observations']['fuzzy_truncated_candidates']
+    assert truncated['count'] == 1
+    assert truncated['total'] == MAX_CANDIDATES + 1
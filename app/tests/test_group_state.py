@@ -0,0 +1,88 @@
+"""
+    test_group_state.py
+
+    unit tests for group_state.py
+"""
+import datetime
+import os
+from frivenmeld.group_state import GroupState
+from frivenmeld.group_state import group_fingerprint
+from frivenmeld.normalizer import RecordNormalizer
+
+def _make_group(normalizer, last_active_date=datetime.date(2016, 12, 30), specialty='Cardiology'):
+    """
+        returns one lastname-group of normalized users
+    """
+    friven_list = [normalizer.normalize_friven_user({'firstname': 'Kyle',
+                                                     'id': 93519,
+                                                     'last_active_date': '2017-01-05',
+                                                     'lastname': 'Nistler',
+                                                     'practice_location': 'arab',
+                                                     'specialty': 'Family Medicine',
+                                                     'user_type_classification': 'Contributor',
+                                                     'friendly_vendor_page': 23,
+                                                     'friendly_vendor_row': 411})]
+    mysql_list = [normalizer.normalize_mysql_user({'classification': 'popular',
+                                                   'firstname': 'Kyle',
+                                                   'id': 916915,
+                                                   'last_active_date': last_active_date,
+                                                   'lastname': 'Nistler',
+                                                   'location': 'arab',
+                                                   'specialty': specialty}),
+                  normalizer.normalize_mysql_user({'classification': 'lurker',
+                                                   'firstname': 'Judy',
+                                                   'id': 900062,
+                                                   'last_active_date': datetime.date(2016, 12, 25),
+                                                   'lastname': 'Nistler',
+                                                   'location': 'attalla',
+                                                   'specialty': 'Neurology'})]
+    return friven_list, mysql_list
+
+def _fingerprint(normalizer, friven_list, mysql_list):
+    """
+        fingerprint with the normalizer's encoders
+    """
+    return group_fingerprint(friven_user_list=friven_list,
+                             mysql_user_list=mysql_list,
+                             encoders=normalizer.get_encoders())
+
+def test_group_fingerprint():
+    """
+        stable across runs and user order,
+        changes with any attribute
+    """
+    normalizer = RecordNormalizer()
+    friven_list, mysql_list = _make_group(normalizer)
+    fingerprint = _fingerprint(normalizer, friven_list, mysql_list)
+
+    # a new run encodes the categories in a different order
+    other_normalizer = RecordNormalizer()
+    other_normalizer.get_encoders()['specialty'].encode('Dermatology')
+    friven_list, mysql_list = _make_group(other_normalizer)
+    assert _fingerprint(other_normalizer, friven_list, mysql_list[::-1]) == fingerprint
+
+    friven_list, mysql_list = _make_group(normalizer, specialty='Dermatology')
+    assert _fingerprint(normalizer, friven_list, mysql_list) != fingerprint
+    friven_list, mysql_list = _make_group(normalizer, last_active_date=datetime.date(2017, 1, 2))
+    assert _fingerprint(normalizer, friven_list, mysql_list) != fingerprint
+
+def test_save_and_load(tmpdir):
+    """
+        the next run sees this run's groups only
+    """
+    path = os.path.join(str(tmpdir), "state.sqlite")
+    group_state = GroupState(path=path)
+    assert group_state.load() == (None, None)
+    assert not group_state.is_unchanged(sort_key="nistler", fingerprint="a")
+    group_state.save(report_date="2017-02-02", settings="exact")
+
+    group_state = GroupState(path=path)
+    assert group_state.load() == ("2017-02-02", "exact")
+    assert group_state.is_unchanged(sort_key="nistler", fingerprint="a")
+    assert not group_state.is_unchanged(sort_key="queen", fingerprint="b")
+    group_state.save(report_date="2017-02-03", settings="exact")
+
+    group_state = GroupState(path=path)
+    assert group_state.load() == ("2017-02-03", "exact")
+    assert group_state.is_unchanged(sort_key="queen", fingerprint="b")
+    assert group_state.is_unchanged(sort_key="nistler", fingerprint="a")
@@ -0,0 +1,148 @@
+"""
+    test_incremental_combining_engine.py
+
+    unit tests for incremental_combining_engine.py
+"""
+import datetime
+from frivenmeld.combining_engine import CombiningEngine
+from frivenmeld.group_state import group_fingerprint
+from frivenmeld.incremental_combining_engine import IncrementalCombiningEngine
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.normalizer import RecordNormalizer
+
+def _make_group(normalizer, specialty='Cardiology'):
+    """
+        returns one lastname-group of normalized users
+        with one match
+    """
+    friven_list = [normalizer.normalize_friven_user({'firstname': 'Kyle',
+                                                     'id': 93519,
+                                                     'last_active_date': '2017-01-05',
+                                                     'lastname': 'Nistler',
+                                                     'practice_location': 'arab',
+                                                     'specialty': 'Family Medicine',
+                                                     'user_type_classification': 'Contributor',
+                                                     'friendly_vendor_page': 23,
+                                                     'friendly_vendor_row': 411})]
+    mysql_list = [normalizer.normalize_mysql_user({'classification': 'popular',
+                                                   'firstname': 'Kyle',
+                                                   'id': 916915,
+                                                   'last_active_date': datetime.date(2016, 12, 30),
+                                                   'lastname': 'Nistler',
+                                                   'location': 'arab',
+                                                   'specialty': specialty}),
+                  normalizer.normalize_mysql_user({'classification': 'lurker',
+                                                   'firstname': 'Judy',
+                                                   'id': 900062,
+                                                   'last_active_date': datetime.date(2016, 12, 25),
+                                                   'lastname': 'Nistler',
+                                                   'location': 'attalla',
+                                                   'specialty': 'Neurology'})]
+    return friven_list, mysql_list
+
+class CopyingWriter():
+    """
+        Mocks MysqlWriter, keeping the records
+        and the copied user ids
+    """
+    def __init__(self):
+        self.records = []
+        self.copies = []
+
+    def add_record(self, match_record):
+        """
+            mimicks real add_record()
+        """
+        self.records.append(match_record)
+
+    def copy_records_from_date(self, from_date_string, date_string, doximity_user_ids):
+        """
+            mimicks real copy_records_from_date()
+        """
+        self.copies.append((from_date_string, date_string, list(doximity_user_ids)))
+        return len(doximity_user_ids)
+
+# pylint: disable=too-few-public-methods
+class FakeGroupState():
+    """
+        GroupState with one unchanged group
+    """
+    def __init__(self, unchanged_fingerprint):
+        self.unchanged_fingerprint = unchanged_fingerprint
+        self.current = {}
+
+    def is_unchanged(self, sort_key, fingerprint):
+        """
+            mimicks real is_unchanged()
+        """
+        self.current[sort_key] = fingerprint
+        return fingerprint == self.unchanged_fingerprint
+
+def _engine(previous_report_date, unchanged_fingerprint, copy_batchsize=1000):
+    """
+        returns (IncrementalCombiningEngine, writer, group state, metrics)
+    """
+    mcollector = MetricsCollector()
+    writer = CopyingWriter()
+    group_state = FakeGroupState(unchanged_fingerprint=unchanged_fingerprint)
+    engine = CombiningEngine(metrics_collector=mcollector,
+                             report_date="2017-02-03",
+                             mysql_writer=writer)
+    return (IncrementalCombiningEngine(combining_engine=engine,
+                                       group_state=group_state,
+                                       encoders=NORMALIZER.get_encoders(),
+                                       metrics_collector=mcollector,
+                                       mysql_writer=writer,
+                                       report_date="2017-02-03",
+                                       previous_report_date=previous_report_date,
+                                       copy_batchsize=copy_batchsize),
+            writer,
+            group_state,
+            mcollector)
+
+NORMALIZER = RecordNormalizer()
+UNCHANGED_GROUP = _make_group(NORMALIZER)
+CHANGED_GROUP = _make_group(NORMALIZER, specialty='Family Medicine')
+UNCHANGED_FINGERPRINT = group_fingerprint(friven_user_list=UNCHANGED_GROUP[0],
+                                          mysql_user_list=UNCHANGED_GROUP[1],
+                                          encoders=NORMALIZER.get_encoders())
+
+def test_unchanged_groups_are_copied():
+    """
+        only the changed group is combined
+    """
+    engine, writer, group_state, mcollector = _engine(previous_report_date="2017-02-02",
+                                                      unchanged_fingerprint=UNCHANGED_FINGERPRINT)
+    engine.combine(*UNCHANGED_GROUP)
+    engine.combine(*CHANGED_GROUP)
+    assert not writer.copies
+    engine.flush()
+
+    assert writer.copies == [("2017-02-02", "2017-02-03", [916915, 900062])]
+    assert len(writer.records) == 1
+    assert mcollector.get_state()['num_matches'] == 3
+    assert list(group_state.current) == ["nistler"]
+
+def test_copy_batches():
+    """
+        copies are sent every copy_batchsize users
+    """
+    engine, writer, _, _ = _engine(previous_report_date="2017-02-02",
+                                   unchanged_fingerprint=UNCHANGED_FINGERPRINT,
+                                   copy_batchsize=2)
+    engine.combine(*UNCHANGED_GROUP)
+    assert len(writer.copies) == 1
+    engine.flush()
+    assert len(writer.copies) == 1
+
+def test_no_previous_run():
+    """
+        without a previous report date every group is combined
+    """
+    engine, writer, group_state, _ = _engine(previous_report_date=None,
+                                             unchanged_fingerprint=UNCHANGED_FINGERPRINT)
+    engine.combine(*UNCHANGED_GROUP)
+    engine.flush()
+    assert not writer.copies
+    assert len(writer.records) == 1
+    assert group_state.current == {"nistler": UNCHANGED_FINGERPRINT}
@@ -0,0 +1,53 @@
+"""
+    test_latency_histogram.py
+
+    unit tests for latency_histogram.py
+"""
+from frivenmeld.latency_histogram import LatencyHistogram
+
+def test_percentiles():
+    """
+        percentiles are the upper bound of their bucket
+    """
+    histogram = LatencyHistogram()
+    assert histogram.get_percentile(50) == 0.0
+
+    for _ in range(90):
+        histogram.add(0.0009)
+    for _ in range(10):
+        histogram.add(0.1)
+
+    assert histogram.get_count() == 100
+    # 0.0009 is in the (512us, 1024us] bucket
+    assert histogram.get_percentile(50) == 0.001024
+    assert histogram.get_percentile(90) == 0.001024
+    # the bucket bound is above the maximum
+    assert histogram.get_percentile(99) == 0.1
+
+    summary = histogram.get_summary()
+    assert summary['count'] == 100
+    assert abs(summary['mean'] - 0.01081) < 1e-9
+    assert summary['max'] == 0.1
+
+def test_overflow():
+    """
+        latencies past the last bucket report the maximum
+    """
+    histogram = LatencyHistogram()
+    histogram.add(100.0)
+    histogram.add(250.0)
+    assert histogram.get_percentile(99) == 250.0
+
+def test_merge_state():
+    """
+        merged histograms add up
+    """
+    merged = LatencyHistogram()
+    for seconds in (0.001, 0.002, 0.5):
+        histogram = LatencyHistogram()
+        histogram.add(seconds)
+        merged.merge_state(histogram.get_state())
+
+    assert merged.get_count() == 3
+    assert merged.get_summary()['max'] == 0.5
+    assert merged.get_percentile(50) == 0.002048
@@ -0,0 +1,28 @@
+"""
+    test_match_record.py
+
+    unit tests for match_record.py
+"""
+from frivenmeld.match_record import FIELD_INDEX
+from frivenmeld.match_record import MATCH_RECORD_FIELDS
+from frivenmeld.match_record import UNIQUE_KEY
+from frivenmeld.match_record import match_record_as_dict
+
+def test_match_record_as_dict():
+    """
+        tuples convert back to named fields
+    """
+    match_record = tuple(range(len(MATCH_RECORD_FIELDS)))
+    as_dict = match_record_as_dict(match_record)
+    assert list(as_dict) == list(MATCH_RECORD_FIELDS)
+    assert as_dict['_friendly_vendor_page'] == FIELD_INDEX['_friendly_vendor_page']
+    assert "_worker_id" not in as_dict
+
+def test_unique_key():
+    """
+        records sort by report_date, doximity_user_id, friendly_vendor_user_id
+    """
+    match_record = tuple(range(len(MATCH_RECORD_FIELDS)))
+    assert UNIQUE_KEY(match_record) == (FIELD_INDEX['report_date'],
+                                        FIELD_INDEX['doximity_user_id'],
+                                        FIELD_INDEX['friendly_vendor_user_id'])
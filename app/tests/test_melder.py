@@ -4,10 +4,13 @@
 import datetime
 import queue
 import logging
+import time
 import pytest
 # pylint: disable=import-error
 from frivenmeld.melder import Melder
 from frivenmeld.combining_engine import CombiningEngine
+from frivenmeld.normalizer import RecordNormalizer
+from frivenmeld.timed_queue import END_OF_DATA
 
 from frivenmeld.loggingsetup import init_logging
 
@@ -30,9 +33,9 @@ def metrics_collector():
             """
             pass
 
-        def add_sample_row(self, row_dict):
+        def add_sample_record(self, match_record):
             """
-                mimicks real add_sample_row()
+                mimicks real add_sample_record()
             """
             pass
 
@@ -74,48 +77,56 @@ def mysql_loader():
 
         def __init__(self):
             self._queue = queue.Queue()
+            self._normalizer = RecordNormalizer()
+
+        def _put(self, user):
+            """
+                normalizes the user like the real loader does
+            """
+            self._queue.put(self._normalizer.normalize_mysql_user(user))
 
         def _load_queue(self):
             """
                 Adds simulated data to the queue
             """
-            self._queue.put({'classification': 'controversial',
-                             'firstname': 'Anthony',
-                             'id': 765624,
-                             'last_active_date': datetime.date(2016, 12, 29),
-                             'lastname': 'Nistler',
-                             'location': 'adamsville',
-                             'specialty': 'Dermatology'})
-            self._queue.put({'classification': 'contributor',
-                             'firstname': 'Judy',
-                             'id': 900062,
-                             'last_active_date': datetime.date(2016, 12, 25),
-                             'lastname': 'Nistler',
-                             'location': 'attalla',
-                             'specialty': 'Neurology'})
-            self._queue.put({'classification': 'popular',
-                             'firstname': 'Kyle',
-                             'id': 916915,
-                             'last_active_date': datetime.date(2016, 12, 30),
-                             'lastname': 'Nistler',
-                             'location': 'arab',
-                             'specialty': 'Family Medicine'})
-
-            self._queue.put({'classification': 'popular',
-                             'firstname': 'Kyle',
-                             'id': 916915,
-                             'last_active_date': datetime.date(2016, 12, 30),
-                             'lastname': 'Queen',
-                             'location': 'arab',
-                             'specialty': 'Family Medicine'})
-
-            self._queue.put({'classification': 'popular',
-                             'firstname': 'Kyle',
-                             'id': 916915,
-                             'last_active_date': datetime.date(2016, 12, 30),
-                             'lastname': 'Yarrow',
-                             'location': 'arab',
-                             'specialty': 'Family Medicine'})
+            self._put({'classification': 'controversial',
+                        'firstname': 'Anthony',
+                        'id': 765624,
+                        'last_active_date': datetime.date(2016, 12, 29),
+                        'lastname': 'Nistler',
+                        'location': 'adamsville',
+                        'specialty': 'Dermatology'})
+            self._put({'classification': 'contributor',
+                        'firstname': 'Judy',
+                        'id': 900062,
+                        'last_active_date': datetime.date(2016, 12, 25),
+                        'lastname': 'Nistler',
+                        'location': 'attalla',
+                        'specialty': 'Neurology'})
+            self._put({'classification': 'popular',
+                        'firstname': 'Kyle',
+                        'id': 916915,
+                        'last_active_date': datetime.date(2016, 12, 30),
+                        'lastname': 'Nistler',
+                        'location': 'arab',
+                        'specialty': 'Family Medicine'})
+
+            self._put({'classification': 'popular',
+                        'firstname': 'Kyle',
+                        'id': 916915,
+                        'last_active_date': datetime.date(2016, 12, 30),
+                        'lastname': 'Queen',
+                        'location': 'arab',
+                        'specialty': 'Family Medicine'})
+
+            self._put({'classification': 'popular',
+                        'firstname': 'Kyle',
+                        'id': 916915,
+                        'last_active_date': datetime.date(2016, 12, 30),
+                        'lastname': 'Yarrow',
+                        'location': 'arab',
+                        'specialty': 'Family Medicine'})
+            self._queue.put(END_OF_DATA)
 
         def set_initial_lastname(self, lastname):
             """
@@ -158,57 +169,65 @@ def friven_loader():
 
         def __init__(self):
             self._queue = queue.Queue()
+            self._normalizer = RecordNormalizer()
+
+        def _put(self, user):
+            """
+                normalizes the user like the real loader does
+            """
+            self._queue.put(self._normalizer.normalize_friven_user(user))
 
         def _load_queue(self):
-            self._queue.put({'firstname': 'Rona',
-                             'id': 72515,
-                             'friendly_vendor_page': 1,
-                             'friendly_vendor_row': 12,
-                             'last_active_date': '2017-01-10',
-                             'lastname': 'Nistler',
-                             'practice_location': 'birmingham',
-                             'specialty': 'Cardiology',
-                             'user_type_classification': 'Lurker'})
-
-            self._queue.put({'firstname': 'Kyle',
-                             'id': 93519,
-                             'friendly_vendor_page': 1,
-                             'friendly_vendor_row': 13,
-                             'last_active_date': '2017-01-05',
-                             'lastname': 'Nistler',
-                             'practice_location': 'arab',
-                             'specialty': 'Family Medicine',
-                             'user_type_classification': 'Contributor'})
-
-            self._queue.put({'firstname': 'Kyle',
-                             'id': 93519,
-                             'friendly_vendor_page': 1,
-                             'friendly_vendor_row': 14,
-                             'last_active_date': '2017-01-05',
-                             'lastname': 'Opom',
-                             'practice_location': 'arab',
-                             'specialty': 'Family Medicine',
-                             'user_type_classification': 'Contributor'})
-
-            self._queue.put({'firstname': 'Kyle',
-                             'id': 93519,
-                             'friendly_vendor_page': 2,
-                             'friendly_vendor_row': 1,
-                             'last_active_date': '2017-01-05',
-                             'lastname': 'Redlin',
-                             'practice_location': 'arab',
-                             'specialty': 'Family Medicine',
-                             'user_type_classification': 'Contributor'})
-
-            self._queue.put({'firstname': 'Kyle',
-                             'id': 93519,
-                             'friendly_vendor_page': 2,
-                             'friendly_vendor_row': 2,
-                             'last_active_date': '2017-01-05',
-                             'lastname': 'Zoc',
-                             'practice_location': 'arab',
-                             'specialty': 'Family Medicine',
-                             'user_type_classification': 'Contributor'})
+            self._put({'firstname': 'Rona',
+                        'id': 72515,
+                        'friendly_vendor_page': 1,
+                        'friendly_vendor_row': 12,
+                        'last_active_date': '2017-01-10',
+                        'lastname': 'Nistler',
+                        'practice_location': 'birmingham',
+                        'specialty': 'Cardiology',
+                        'user_type_classification': 'Lurker'})
+
+            self._put({'firstname': 'Kyle',
+                        'id': 93519,
+                        'friendly_vendor_page': 1,
+                        'friendly_vendor_row': 13,
+                        'last_active_date': '2017-01-05',
+                        'lastname': 'Nistler',
+                        'practice_location': 'arab',
+                        'specialty': 'Family Medicine',
+                        'user_type_classification': 'Contributor'})
+
+            self._put({'firstname': 'Kyle',
+                        'id': 93519,
+                        'friendly_vendor_page': 1,
+                        'friendly_vendor_row': 14,
+                        'last_active_date': '2017-01-05',
+                        'lastname': 'Opom',
+                        'practice_location': 'arab',
+                        'specialty': 'Family Medicine',
+                        'user_type_classification': 'Contributor'})
+
+            self._put({'firstname': 'Kyle',
+                        'id': 93519,
+                        'friendly_vendor_page': 2,
+                        'friendly_vendor_row': 1,
+                        'last_active_date': '2017-01-05',
+                        'lastname': 'Redlin',
+                        'practice_location': 'arab',
+                        'specialty': 'Family Medicine',
+                        'user_type_classification': 'Contributor'})
+
+            self._put({'firstname': 'Kyle',
+                        'id': 93519,
+                        'friendly_vendor_page': 2,
+                        'friendly_vendor_row': 2,
+                        'last_active_date': '2017-01-05',
+                        'lastname': 'Zoc',
+                        'practice_location': 'arab',
+                        'specialty': 'Family Medicine',
+                        'user_type_classification': 'Contributor'})
+            self._queue.put(END_OF_DATA)
 
         def start(self):
             """
@@ -248,3 +267,21 @@ def test_normal_usage(friven_loader, mysql_loader, mysql_writer, metrics_collect
                     friven_timeout=1,
                     mysql_timeout=1)
     melder.meld()
+
+# pylint: disable=redefined-outer-name
+def test_end_of_data(friven_loader, mysql_loader, mysql_writer, metrics_collector):
+    """
+        the meld ends at END_OF_DATA, not after the timeouts
+    """
+    combining_engine = CombiningEngine(metrics_collector=metrics_collector,
+                                       report_date='2019-02-02',
+                                       mysql_writer=mysql_writer)
+
+    melder = Melder(friven_loader=friven_loader,
+                    mysql_loader=mysql_loader,
+                    combining_engine=combining_engine,
+                    friven_timeout=30,
+                    mysql_timeout=30)
+    start_time = time.perf_counter()
+    melder.meld()
+    assert time.perf_counter() - start_time < 5
@@ -3,7 +3,9 @@
 
    unit tests for test_metrics_collector.py
 """
+import json
 from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.timed_queue import TimedQueue
 
 def test_public_interface():
     """
@@ -20,3 +22,57 @@ def test_public_interface():
     mcollector.mark_end_time()
 
     mcollector.print_summary()
+
+def test_merge_state():
+    """
+        measurements of several collectors add up
+    """
+    merged = MetricsCollector()
+    for worker in range(3):
+        mcollector = MetricsCollector()
+        mcollector.increment_matches(count=10)
+        mcollector.add_sample_row(row_dict={'worker': worker})
+        mcollector.observe(name="group_size", value=worker + 1)
+        mcollector.add_throughput(name="writer_insert", count=100, seconds=0.5)
+        merged.merge_state(mcollector.get_state())
+
+    state = merged.get_state()
+    assert state['num_matches'] == 30
+    assert len(state['sample_rows']) == 3
+    assert state['observations']['group_size'] == [3, 6, 3]
+    assert state['throughput']['writer_insert'] == [300, 1.5]
+
+    merged.mark_end_time()
+    merged.print_summary()
+
+def test_report(tmpdir):
+    """
+        latencies and queues show up in the
+        report and merge across collectors
+    """
+    merged = MetricsCollector()
+    for _ in range(2):
+        mcollector = MetricsCollector()
+        timed_queue = TimedQueue(maxsize=2)
+        timed_queue.put(1)
+        timed_queue.get()
+        mcollector.register_queue(name="friven_queue", timed_queue=timed_queue)
+        mcollector.add_latency(name="friven_page_fetch", seconds=0.25)
+        mcollector.add_throughput(name="friven_loader", count=100, seconds=0.25)
+        merged.merge_state(mcollector.get_state())
+
+    merged.mark_end_time()
+    merged.print_summary()
+
+    report_path = str(tmpdir.join("report.json"))
+    merged.write_report(path=report_path)
+    with open(report_path) as report_file:
+        report = json.load(report_file)
+
+    assert report['latency_seconds']['friven_page_fetch']['count'] == 2
+    assert report['latency_seconds']['friven_page_fetch']['p99'] == 0.25
+    assert report['throughput']['friven_loader'] == {'count': 200,
+                                                    'seconds': 0.5,
+                                                    'per_second': 400.0}
+    assert report['queues']['friven_queue']['puts'] == 2
+    assert report['queues']['friven_queue']['gets'] == 2
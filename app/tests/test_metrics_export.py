@@ -0,0 +1,92 @@
+"""
+    test_metrics_export.py
+
+    unit tests for metrics_export.py
+"""
+import json
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.metrics_export import format_prometheus
+from frivenmeld.metrics_export import main
+from frivenmeld.metrics_export import merge_reports
+from frivenmeld.timed_queue import TimedQueue
+
+def _get_worker_report(worker_id):
+    """
+        report of a worker that wrote 10 matches
+    """
+    mcollector = MetricsCollector()
+    mcollector.set_labels({'worker_id': str(worker_id), 'report_date': "2017-02-02"})
+    mcollector.increment_matches(count=10)
+    mcollector.add_throughput(name="writer_insert", count=10, seconds=0.5)
+    mcollector.add_latency(name="writer_insert", seconds=0.003)
+    mcollector.observe(name="group_size", value=worker_id)
+    mcollector.register_queue(name="mysql_queue", timed_queue=TimedQueue(maxsize=1))
+    mcollector.add_queue_sample(name="mysql_queue",
+                                sample={'seconds': 1.0, 'depth': worker_id, 'put_seconds': 0.0,
+                                        'get_seconds': 0.0, 'memory_bytes': 100})
+    mcollector.mark_end_time()
+    return mcollector.get_report()
+
+def test_format_prometheus():
+    """
+        one series per report, HELP and TYPE once per family
+    """
+    text = format_prometheus([_get_worker_report(1), _get_worker_report(2)])
+    lines = text.splitlines()
+
+    assert lines.count("# TYPE frivenmeld_matches_total counter") == 1
+    assert 'frivenmeld_matches_total{worker_id="1",report_date="2017-02-02"} 10.0' in lines
+    assert 'frivenmeld_matches_total{worker_id="2",report_date="2017-02-02"} 10.0' in lines
+    assert ('frivenmeld_stage_records_total{worker_id="1",report_date="2017-02-02",'
+            'stage="writer_insert"} 10.0') in lines
+    # 3ms is in the 4.096ms bucket, buckets are cumulative
+    assert ('frivenmeld_latency_seconds_bucket{worker_id="1",report_date="2017-02-02",'
+            'operation="writer_insert",le="0.002048"} 0.0') in lines
+    assert ('frivenmeld_latency_seconds_bucket{worker_id="1",report_date="2017-02-02",'
+            'operation="writer_insert",le="0.004096"} 1.0') in lines
+    assert ('frivenmeld_latency_seconds_bucket{worker_id="1",report_date="2017-02-02",'
+            'operation="writer_insert",le="+Inf"} 1.0') in lines
+    assert ('frivenmeld_queue_depth_max{worker_id="2",report_date="2017-02-02",'
+            'queue="mysql_queue"} 2.0') in lines
+
+def test_merge_reports():
+    """
+        counters and histograms add up, labels are joined
+    """
+    merged = merge_reports([_get_worker_report(1), _get_worker_report(2)])
+
+    assert merged['labels'] == {'worker_id': "1,2", 'report_date': "2017-02-02"}
+    assert merged['num_matches'] == 20
+    assert merged['throughput']['writer_insert'] == {'count': 20,
+                                                     'seconds': 1.0,
+                                                     'per_second': 20.0}
+    assert merged['latency_seconds']['writer_insert']['count'] == 2
+    assert merged['latency_seconds']['writer_insert']['p99'] == 0.003
+    assert merged['observations']['group_size'] == {'count': 2, 'total': 3,
+                                                    'mean': 1.5, 'max': 2}
+    assert merged['queues']['mysql_queue']['puts'] == 0
+    assert len(merged['queue_samples']['mysql_queue']) == 2
+
+    # a merged report can be merged and exported again
+    assert merge_reports([merged])['num_matches'] == 20
+    assert "frivenmeld_matches_total" in format_prometheus([merged])
+
+def test_main(tmpdir):
+    """
+        merges report files
+    """
+    paths = []
+    for worker_id in (1, 2):
+        path = str(tmpdir.join("w{}.json".format(worker_id)))
+        with open(path, "w") as report_file:
+            json.dump(_get_worker_report(worker_id), report_file)
+        paths.append(path)
+
+    json_path = str(tmpdir.join("all.json"))
+    prometheus_path = str(tmpdir.join("all.prom"))
+    main(["--json", json_path, "--prometheus", prometheus_path] + paths)
+
+    with open(json_path) as json_file:
+        assert json.load(json_file)['num_matches'] == 20
+    with open(prometheus_path) as prometheus_file:
+        assert prometheus_file.read().count("frivenmeld_matches_total{") == 2
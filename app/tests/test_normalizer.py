@@ -0,0 +1,50 @@
+"""
+    test_normalizer.py
+
+    unit tests for normalizer.py
+"""
+import datetime
+from frivenmeld.normalizer import RecordNormalizer
+from frivenmeld.normalizer import make_match_key
+from frivenmeld.normalizer import make_sort_key
+from frivenmeld.category_encoder import normalize_value
+
+def test_make_keys():
+    """
+        keys are lower cased, stripped and interned
+    """
+    assert make_sort_key(" Nistler ") == "nistler"
+    assert make_match_key(firstname="Kyle ", lastname=" Nistler") == "kyle::nistler"
+    assert normalize_value(" Family_Medicine") == "family medicine"
+
+    # interned values are the same object
+    assert make_sort_key("Nistler") is make_sort_key("NISTLER ")
+
+def test_both_sources_share_keys():
+    """
+        the same person from both sources ends up with equal keys
+    """
+    normalizer = RecordNormalizer()
+
+    friven_user = normalizer.normalize_friven_user({'firstname': 'Kyle',
+                                                    'id': 93519,
+                                                    'last_active_date': '2017-01-05',
+                                                    'lastname': 'Nistler',
+                                                    'practice_location': 'arab',
+                                                    'specialty': 'Family Medicine',
+                                                    'user_type_classification': 'Popular'})
+
+    mysql_user = normalizer.normalize_mysql_user({'classification': 'popular',
+                                                  'firstname': 'kyle',
+                                                  'id': 916915,
+                                                  'last_active_date': datetime.date(2016, 12, 30),
+                                                  'lastname': 'NISTLER ',
+                                                  'location': 'Arab',
+                                                  'specialty': 'family_medicine'})
+
+    for key in ['sort_key', 'match_key', 'location_code', 'specialty_code', 'classification_code']:
+        assert friven_user[key] == mysql_user[key]
+
+    # the categorical strings are replaced by the codes
+    assert 'practice_location' not in friven_user
+    assert 'location' not in mysql_user
@@ -0,0 +1,172 @@
+"""
+    test_orchestrator.py
+
+    unit tests for orchestrator.py
+"""
+import argparse
+import os
+import pytest
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.orchestrator import Orchestrator
+from frivenmeld.orchestrator import OrchestratorException
+from frivenmeld.orchestrator import split_pages
+from frivenmeld.friendly_vendor.page_index import PageIndex
+
+def fake_job(arg_object, config):
+    """
+        "matches" one record per page; the failing workers fail
+        on their first attempt (they leave a marker file), the
+        dying workers' processes exit on their first attempt
+    """
+    marker = os.path.join(config['marker_dir'], "worker{}".format(arg_object.worker_id))
+    if arg_object.worker_id in config['dying_workers'] and not os.path.exists(marker):
+        open(marker, "w").close()
+        # like an OOM kill: no exception, the process is gone
+        os._exit(1) # pylint: disable=protected-access
+    if arg_object.worker_id in config['failing_workers'] and not os.path.exists(marker):
+        open(marker, "w").close()
+        raise ValueError("first attempt fails")
+    if arg_object.worker_id in config['failing_workers'] and config['always_fail']:
+        raise ValueError("always fails")
+
+    mcollector = MetricsCollector()
+    mcollector.increment_matches(count=arg_object.end_page - arg_object.start_page + 1)
+    mcollector.add_throughput(name="worker", count=1, seconds=0.1)
+    mcollector.add_sample_row(row_dict={'delete_existing': arg_object.delete_existing,
+                                        'end_lastname': arg_object.end_lastname})
+    return mcollector
+
+def _arg_object(workers, partition_by="pages"):
+    """
+        the driver arguments the Orchestrator uses
+    """
+    return argparse.Namespace(workers=workers,
+                              partition_by=partition_by,
+                              max_attempts=2,
+                              worker_id=0,
+                              start_page=1,
+                              end_page=10,
+                              checkpoint_dir=None,
+                              resume=False,
+                              delete_existing=False,
+                              cleanup_stale=False,
+                              sink="mysql",
+                              staging=None,
+                              write_mode="insert",
+                              first_lastname=None,
+                              end_lastname=None)
+
+def _config(tmpdir, failing_workers, always_fail, dying_workers=()):
+    """
+        fake_job's settings
+    """
+    return {'FRIENDLY_VENDOR_API_URL': "http://dud",
+            'marker_dir': str(tmpdir),
+            'failing_workers': failing_workers,
+            'dying_workers': dying_workers,
+            'always_fail': always_fail}
+
+class FakeApi():
+    """
+        ten pages, pages 4-6 only hold "Jones"
+    """
+
+    def get_user_page(self, page_number):
+        """
+            (page, total pages, users) like FriendlyVendorApi
+        """
+        lastname = "Jones"
+        if page_number < 4:
+            lastname = "Adams{:02}".format(page_number)
+        elif page_number > 6:
+            lastname = "Smith{:02}".format(page_number)
+        return page_number, 10, [{'lastname': lastname}]
+
+def test_split_pages():
+    """
+        balanced, contiguous partitions
+    """
+    assert split_pages(first_page=1, last_page=10, num_partitions=3) == [(1, 4), (5, 7), (8, 10)]
+    assert split_pages(first_page=5, last_page=6, num_partitions=4) == [(5, 5), (6, 6)]
+    assert split_pages(first_page=1, last_page=150, num_partitions=1) == [(1, 150)]
+
+def test_orchestrator(tmpdir):
+    """
+        failed partitions are retried and the metrics merged
+    """
+    config = _config(tmpdir, failing_workers=[2], always_fail=False)
+    orchestrator = Orchestrator(job_function=fake_job,
+                                arg_object=_arg_object(workers=3),
+                                config=config)
+    state = orchestrator.run().get_state()
+
+    assert state['num_matches'] == 10
+    assert state['throughput']['worker'][0] == 3
+    # only the retry deletes what the first attempt wrote
+    assert sorted(row['delete_existing'] for row in state['sample_rows']) == [False, False, True]
+
+def test_orchestrator_worker_dies(tmpdir):
+    """
+        a dead worker process only fails its own
+        partition's attempt, which is retried
+    """
+    config = _config(tmpdir, failing_workers=[], always_fail=False, dying_workers=[1])
+    orchestrator = Orchestrator(job_function=fake_job,
+                                arg_object=_arg_object(workers=3),
+                                config=config)
+    state = orchestrator.run().get_state()
+
+    assert state['num_matches'] == 10
+    assert state['throughput']['worker'][0] == 3
+    assert sorted(row['delete_existing'] for row in state['sample_rows']) == [False, False, True]
+
+def test_orchestrator_gives_up(tmpdir):
+    """
+        a partition that fails max_attempts times fails the job
+    """
+    config = _config(tmpdir, failing_workers=[1], always_fail=True)
+    orchestrator = Orchestrator(job_function=fake_job,
+                                arg_object=_arg_object(workers=2),
+                                config=config)
+    with pytest.raises(OrchestratorException):
+        orchestrator.run()
+
+def test_orchestrator_checkpointed_retry():
+    """
+        a retry with a checkpoint resumes and
+        keeps the rows of the failed attempt
+    """
+    arg_object = _arg_object(workers=4)
+    arg_object.checkpoint_dir = "/tmp/ck"
+    arg_object.delete_existing = True
+    arg_object.cleanup_stale = True
+    orchestrator = Orchestrator(job_function=fake_job,
+                                arg_object=arg_object,
+                                config=_config("", failing_workers=[], always_fail=False))
+
+    first = orchestrator.get_partition_args(worker_id=1, partition=(1, 3, None, None), attempt=1)
+    assert not first.resume
+    assert first.delete_existing
+    assert first.cleanup_stale
+
+    retry = orchestrator.get_partition_args(worker_id=1, partition=(1, 3, None, None), attempt=2)
+    assert retry.resume
+    assert not retry.delete_existing
+    assert not retry.cleanup_stale
+    # the original arguments are untouched
+    assert arg_object.delete_existing
+
+# pylint: disable=protected-access
+def test_orchestrator_by_lastname():
+    """
+        the partitions start at a new lastname
+    """
+    orchestrator = Orchestrator(job_function=fake_job,
+                                arg_object=_arg_object(workers=3, partition_by="lastnames"),
+                                config=_config("", failing_workers=[], always_fail=False))
+    orchestrator._page_index = PageIndex(friven_api=FakeApi())
+
+    # split_pages: 1-4, 5-7, 8-10, but page 4 starts "jones"
+    assert orchestrator.get_partitions() == [(1, 3, None, "jones"),
+                                             (4, 7, "jones", "smith08"),
+                                             (8, 10, "smith08", None)]
@@ -0,0 +1,79 @@
+"""
+    test_profiler.py
+
+    unit tests for profiler.py
+"""
+import os
+import threading
+import time
+import pytest
+from frivenmeld.profiler import PROFILE_MODES
+from frivenmeld.profiler import Profiler
+from frivenmeld.profiler import StackSampler
+from frivenmeld.profiler import parse_profile_modes
+
+def _busy_work():
+    """
+        something for the profiles to find
+    """
+    return sorted(str(number) for number in range(20000))
+
+# pylint: disable=too-few-public-methods
+class BusyThread(threading.Thread):
+    """
+        a loader-like thread
+    """
+    def run(self):
+        _busy_work()
+
+def test_parse_profile_modes():
+    """
+        known modes only
+    """
+    assert parse_profile_modes("cpu, stacks") == ["cpu", "stacks"]
+    with pytest.raises(ValueError):
+        parse_profile_modes("cpu,gpu")
+    with pytest.raises(ValueError):
+        parse_profile_modes("")
+
+def test_stack_sampler():
+    """
+        folded stacks start with the thread name
+    """
+    stack_sampler = StackSampler(interval=60)
+    busy_thread = threading.Thread(target=time.sleep, args=(0.2,), name="Sleeper")
+    busy_thread.start()
+    stack_sampler.sample()
+    busy_thread.join()
+
+    assert stack_sampler.get_num_samples() == 1
+    stacks = stack_sampler.get_stacks()
+    assert any(stack.startswith("Sleeper;") for stack in stacks)
+    assert all(share <= 1.0 for _, share in stack_sampler.get_top_functions(5))
+
+def test_profiler(tmpdir):
+    """
+        writes a profile per thread, the allocation
+        sites, the stacks and a summary
+    """
+    output_dir = str(tmpdir.join("profile"))
+    profiler = Profiler(output_dir=output_dir, modes=PROFILE_MODES, stack_interval=0.001)
+    profiler.start()
+    busy_thread = BusyThread()
+    busy_thread.start()
+    _busy_work()
+    busy_thread.join()
+    profiler.stop()
+
+    files = os.listdir(output_dir)
+    assert "profile_MainThread.pstats" in files
+    assert "profile_BusyThread-{}.pstats".format(busy_thread.name) in files
+    assert "memory_top.txt" in files
+    assert "stacks.folded" in files
+
+    with open(os.path.join(output_dir, "summary.txt")) as summary_file:
+        summary = summary_file.read()
+    assert "=== CPU BusyThread-" in summary
+    assert "_busy_work" in summary
+    assert "=== Memory" in summary
+    assert "=== Sampled stacks" in summary
@@ -0,0 +1,84 @@
+"""
+    test_queue_sampler.py
+
+    unit tests for queue_sampler.py
+"""
+import sys
+from frivenmeld.metrics_collector import MetricsCollector
+from frivenmeld.queue_sampler import QueueSampler
+from frivenmeld.queue_sampler import estimate_size
+from frivenmeld.timed_queue import TimedQueue
+
+def test_estimate_size():
+    """
+        containers include their values
+    """
+    user = {'id': 1, 'lastname': 'smith'}
+    assert estimate_size(user) > sys.getsizeof(user)
+    assert estimate_size([(1, 'a'), (2, 'b')]) == (sys.getsizeof([(1, 'a'), (2, 'b')])
+                                                   + 2 * estimate_size((1, 'a')))
+
+def test_sample():
+    """
+        samples record depth, memory and the blocked
+        time since the previous sample
+    """
+    mcollector = MetricsCollector()
+    timed_queue = TimedQueue(maxsize=10)
+    mcollector.register_queue(name="friven_queue", timed_queue=timed_queue)
+    queue_sampler = QueueSampler(metrics_collector=mcollector, interval=60)
+
+    queue_sampler.sample()
+    timed_queue.put({'lastname': 'smith'})
+    timed_queue.put({'lastname': 'jones'})
+    queue_sampler.sample()
+
+    samples = mcollector.get_report()['queue_samples']['friven_queue']
+    assert [sample['depth'] for sample in samples] == [0, 2]
+    assert samples[0]['memory_bytes'] == 0
+    assert samples[1]['memory_bytes'] == 2 * estimate_size({'lastname': 'smith'})
+    assert samples[1]['put_seconds'] >= 0.0
+
+    queue_sampler.start()
+    queue_sampler.stop()
+    assert len(mcollector.get_report()['queue_samples']['friven_queue']) == 3
+
+    mcollector.mark_end_time()
+    mcollector.print_summary()
+
+def test_thinning():
+    """
+        at max_samples pairs of samples are merged
+        and the interval doubles
+    """
+    mcollector = MetricsCollector()
+    mcollector.register_queue(name="mysql_queue", timed_queue=TimedQueue(maxsize=1))
+    queue_sampler = QueueSampler(metrics_collector=mcollector, interval=1, max_samples=4)
+
+    for _ in range(4):
+        queue_sampler.sample()
+    assert len(mcollector.get_report()['queue_samples']['mysql_queue']) == 2
+
+    queue_sampler.sample()
+    assert len(mcollector.get_report()['queue_samples']['mysql_queue']) == 3
+
+def test_thin_queue_samples():
+    """
+        merged samples keep the later depth
+        and add up the blocked time
+    """
+    mcollector = MetricsCollector()
+    for seconds in range(3):
+        mcollector.add_queue_sample(name="writer_insert_queue",
+                                    sample={'seconds': seconds,
+                                            'depth': seconds,
+                                            'put_seconds': 1.0,
+                                            'get_seconds': 0.5,
+                                            'memory_bytes': 100})
+    mcollector.thin_queue_samples()
+
+    samples = mcollector.get_state()['queue_samples']['writer_insert_queue']
+    assert samples == [{'seconds': 1, 'depth': 1, 'put_seconds': 2.0,
+                        'get_seconds': 1.0, 'memory_bytes': 100},
+                       {'seconds': 2, 'depth': 2, 'put_seconds': 1.0,
+                        'get_seconds': 0.5, 'memory_bytes': 100}]
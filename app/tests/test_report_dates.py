@@ -0,0 +1,59 @@
+"""
+    test_report_dates.py
+
+    unit tests for report_dates.py
+"""
+import pytest
+from frivenmeld.match_record import match_record_as_dict
+from frivenmeld.report_dates import ReportDateFanOut
+from frivenmeld.report_dates import parse_report_dates
+
+# pylint: disable=too-few-public-methods
+class CapturingSink():
+    """
+        Mocks a Sink, keeping the records
+    """
+    def __init__(self):
+        self.records = []
+
+    def add_records(self, match_records):
+        """
+            mimicks real add_records()
+        """
+        self.records.extend(match_records)
+
+def test_parse_report_dates():
+    """
+        dates and inclusive ranges, sorted and unique
+    """
+    assert parse_report_dates("2017-02-03") == ["2017-02-03"]
+    assert parse_report_dates("2017-02-27:2017-03-02,2017-02-01,2017-02-28") == [
+        "2017-02-01", "2017-02-27", "2017-02-28", "2017-03-01", "2017-03-02"]
+    with pytest.raises(ValueError):
+        parse_report_dates("2017-02-03:2017-02-01")
+    with pytest.raises(ValueError):
+        parse_report_dates("2017-02-30")
+
+def test_fan_out():
+    """
+        every report date gets the record with its own activity flags
+    """
+    sink = CapturingSink()
+    fan_out = ReportDateFanOut(sink=sink, report_dates=["2017-02-01", "2017-02-15", "2017-03-20"])
+    match_record = (916915, 93519, 1, 1, 0, 1, 1, "2017-02-01",
+                    "2017-01-10", "2017-02-09", 23, 411)
+    fan_out.add_record(match_record=match_record)
+    fan_out.add_records(match_records=[match_record])
+
+    assert len(sink.records) == 6
+    assert sink.records[0] == match_record
+    records = [match_record_as_dict(record) for record in sink.records[:3]]
+    assert [(record['report_date'],
+             record['is_doximity_user_active'],
+             record['is_friendly_vendor_user_active']) for record in records] == [
+                 ("2017-02-01", 1, 1),
+                 ("2017-02-15", 0, 1),
+                 ("2017-03-20", 0, 0)]
+    for record in records:
+        assert record['_friendly_vendor_row'] == 411
+        assert record['doximity_last_active_date'] == "2017-01-10"
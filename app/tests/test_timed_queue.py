@@ -0,0 +1,43 @@
+"""
+    test_timed_queue.py
+
+    unit tests for timed_queue.py
+"""
+import queue
+import pytest
+from frivenmeld.timed_queue import END_OF_DATA
+from frivenmeld.timed_queue import EndOfData
+from frivenmeld.timed_queue import TimedQueue
+from frivenmeld.timed_queue import get_item
+
+def test_timed_queue():
+    """
+        counts the puts and gets and the time they block
+    """
+    timed_queue = TimedQueue(maxsize=1)
+    timed_queue.put("a")
+    with pytest.raises(queue.Full):
+        timed_queue.put("b", timeout=0.05)
+    assert timed_queue.get() == "a"
+    with pytest.raises(queue.Empty):
+        timed_queue.get(timeout=0.05)
+
+    stats = timed_queue.get_stats()
+    assert stats['puts'] == 2
+    assert stats['gets'] == 2
+    assert stats['put_seconds'] >= 0.05
+    assert stats['get_seconds'] >= 0.05
+    assert stats['depth'] == 0
+    assert stats['maxsize'] == 1
+
+def test_get_item():
+    """
+        END_OF_DATA ends every following get_item()
+    """
+    timed_queue = TimedQueue(maxsize=2)
+    timed_queue.put("a")
+    timed_queue.put(END_OF_DATA)
+    assert get_item(timed_queue, timeout=1) == "a"
+    for _ in range(2):
+        with pytest.raises(EndOfData):
+            get_item(timed_queue, timeout=1)
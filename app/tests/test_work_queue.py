@@ -0,0 +1,110 @@
+"""
+    test_work_queue.py
+
+    unit tests for work_queue.py
+"""
+import os
+from frivenmeld.work_queue import WorkQueue
+from frivenmeld.work_queue import LeaseKeeper
+from frivenmeld.work_queue import STATUS_COMPLETE
+from frivenmeld.work_queue import STATUS_FAILED
+from frivenmeld.work_queue import STATUS_LEASED
+from frivenmeld.work_queue import STATUS_PENDING
+
+class FakeClock():
+    """
+        a clock the test moves forward
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def _work_queue(tmpdir, clock, max_attempts=2):
+    """
+        a queue file in tmpdir
+    """
+    return WorkQueue(path=os.path.join(str(tmpdir), "queue.sqlite"),
+                     max_attempts=max_attempts,
+                     clock=clock)
+
+def test_add_chunks(tmpdir):
+    """
+        adding the same pages twice adds nothing
+    """
+    work_queue = _work_queue(tmpdir, FakeClock())
+    assert work_queue.add_chunks("2017-02-02", first_page=1, last_page=25, chunk_pages=10) == 3
+    assert work_queue.add_chunks("2017-02-02", first_page=1, last_page=25, chunk_pages=10) == 0
+    assert work_queue.get_progress("2017-02-02") == {STATUS_PENDING: 3}
+
+def test_claim_and_complete(tmpdir):
+    """
+        chunks are claimed in page order, once
+    """
+    work_queue = _work_queue(tmpdir, FakeClock())
+    work_queue.add_chunks("2017-02-02", first_page=1, last_page=25, chunk_pages=10)
+
+    chunks = [work_queue.claim("2017-02-02", owner="a", lease_seconds=60) for _ in range(3)]
+    assert [(chunk.start_page, chunk.end_page) for chunk in chunks] == [(1, 10),
+                                                                        (11, 20),
+                                                                        (21, 25)]
+    assert work_queue.claim("2017-02-02", owner="b", lease_seconds=60) is None
+
+    assert not work_queue.complete(chunks[0], owner="b")
+    for chunk in chunks:
+        assert work_queue.complete(chunk, owner="a")
+    assert work_queue.get_progress("2017-02-02") == {STATUS_COMPLETE: 3}
+
+def test_lease_expiry(tmpdir):
+    """
+        an expired lease is dispatched again, and
+        its old owner can not complete it
+    """
+    clock = FakeClock()
+    work_queue = _work_queue(tmpdir, clock)
+    work_queue.add_chunks("2017-02-02", first_page=1, last_page=5, chunk_pages=10)
+
+    chunk = work_queue.claim("2017-02-02", owner="a", lease_seconds=60)
+    clock.now += 50
+    assert work_queue.renew(chunk, owner="a", lease_seconds=60)
+    clock.now += 50
+    assert work_queue.claim("2017-02-02", owner="b", lease_seconds=60) is None
+
+    clock.now += 20
+    retry = work_queue.claim("2017-02-02", owner="b", lease_seconds=60)
+    assert (retry.start_page, retry.attempt) == (1, 2)
+    assert not work_queue.renew(chunk, owner="a", lease_seconds=60)
+    assert not work_queue.complete(chunk, owner="a")
+    assert work_queue.complete(retry, owner="b")
+
+def test_release(tmpdir):
+    """
+        a chunk fails after max_attempts
+    """
+    work_queue = _work_queue(tmpdir, FakeClock(), max_attempts=2)
+    work_queue.add_chunks("2017-02-02", first_page=1, last_page=5, chunk_pages=10)
+
+    chunk = work_queue.claim("2017-02-02", owner="a", lease_seconds=60)
+    work_queue.release(chunk, owner="a", error=ValueError("first"))
+    chunk = work_queue.claim("2017-02-02", owner="b", lease_seconds=60)
+    assert work_queue.get_progress("2017-02-02") == {STATUS_LEASED: 1}
+    work_queue.release(chunk, owner="b", error=ValueError("second"))
+
+    assert work_queue.claim("2017-02-02", owner="c", lease_seconds=60) is None
+    assert work_queue.get_progress("2017-02-02") == {STATUS_FAILED: 1}
+
+def test_lease_keeper(tmpdir):
+    """
+        the keeper renews until it is stopped
+    """
+    work_queue = _work_queue(tmpdir, FakeClock())
+    work_queue.add_chunks("2017-02-02", first_page=1, last_page=5, chunk_pages=10)
+    chunk = work_queue.claim("2017-02-02", owner="a", lease_seconds=0.03)
+
+    lease_keeper = LeaseKeeper(work_queue=work_queue, chunk=chunk, owner="a", lease_seconds=0.03)
+    lease_keeper.start()
+    lease_keeper.stop()
+    assert not lease_keeper.is_alive()
+    assert work_queue.complete(chunk, owner="a")